@@ -0,0 +1,616 @@
+#  Copyright (c) 2021  SBA - MIT License
+
+from array import array
+from bisect import bisect_left, bisect_right
+from .bin_tree import ValueNode, CT, _SPLIT
+from . import bin_tree
+from typing import Optional, Tuple
+
+# typecode of the link columns: node indices are limited to 2**31 - 1
+_LINK = 'i'
+
+
+class ArrayTree(bin_tree.BinTree):
+    """
+    AVL tree storing its nodes in parallel columns instead of objects.
+
+    A node is an integer index into the ``_keys`` list, the ``_values``
+    list (mappings only), the ``_left`` and ``_right`` link arrays and
+    the ``_weight`` balance array. Index 0 is a sentinel standing for no
+    node, so an entry costs two list slots, two 32 bit links and one
+    byte. Removed slots are chained through ``_left`` in a free-list and
+    reused by the next insertions.
+
+    The balancing is the one of avl_tree.AVLBase, written over indices.
+    The node_class argument only tells whether values are stored: it is
+    Node for a set and ValueNode for a mapping.
+
+    split, join and join3 cannot move nodes between the columns of two
+    trees, so they copy the elements and cost O(n).
+    """
+
+    @property
+    def _node_key(self):
+        return self._keys.__getitem__
+
+    @property
+    def _node_value(self):
+        return self._values.__getitem__
+
+    @property
+    def _node_left(self):
+        return self._left.__getitem__
+
+    @property
+    def _node_right(self):
+        return self._right.__getitem__
+
+    @property
+    def _node_item(self):
+        keys, values = self._keys, self._values
+        return lambda node: (keys[node], values[node])
+
+    def _new_node(self, key, value=None) -> int:
+        """Protected method allocating a node, from the free-list first."""
+        node = self._free
+        if node:
+            self._free = self._left[node]
+            self._keys[node] = key
+            if self._values is not None:
+                self._values[node] = value
+            self._left[node] = self._right[node] = self._weight[node] = 0
+            return node
+        self._keys.append(key)
+        if self._values is not None:
+            self._values.append(value)
+        self._left.append(0)
+        self._right.append(0)
+        self._weight.append(0)
+        return len(self._keys) - 1
+
+    def _free_node(self, node: int) -> None:
+        """Protected method releasing a node to the free-list."""
+        self._keys[node] = None
+        if self._values is not None:
+            self._values[node] = None
+        self._left[node] = self._free
+        self._free = node
+
+    def _rotate_left(self, node: int) -> int:
+        left, right, weight = self._left, self._right, self._weight
+        child = right[node]
+        w = weight[node] - 1
+        cw = weight[child]
+        if cw > 0:
+            w -= cw
+        cw -= 1
+        if w < 0:
+            cw += w
+        weight[node], weight[child] = w, cw
+        right[node] = left[child]
+        left[child] = node
+        return child
+
+    def _rotate_right(self, node: int) -> int:
+        left, right, weight = self._left, self._right, self._weight
+        child = left[node]
+        w = weight[node] + 1
+        cw = weight[child]
+        if cw < 0:
+            w -= cw
+        cw += 1
+        if w > 0:
+            cw += w
+        weight[node], weight[child] = w, cw
+        left[node] = right[child]
+        right[child] = node
+        return child
+
+    def _adjust(self, node: int, side: int, delta: int) -> Tuple[int, int]:
+        """Protected method porting AVLBase.adjust to node indices."""
+        weight = self._weight
+        w = weight[node] + delta if side else weight[node] - delta
+        weight[node] = w
+        if w == 2:
+            child = self._right[node]
+            cw = weight[child]
+            # on a removal the height is unchanged if child is balanced
+            delta = -1 if delta < 0 and cw != 0 else 0
+            if cw < 0:
+                self._right[node] = self._rotate_right(child)
+            return self._rotate_left(node), delta
+        elif w == -2:
+            child = self._left[node]
+            cw = weight[child]
+            delta = -1 if delta < 0 and cw != 0 else 0
+            if cw > 0:
+                self._left[node] = self._rotate_left(child)
+            return self._rotate_right(node), delta
+        elif delta > 0:
+            return node, delta if w else 0
+        else:
+            return node, 0 if w else delta
+
+    def _fix_path(self, path, child: int, delta: int) -> Tuple[int, int]:
+        left, right = self._left, self._right
+        root = path[0][0] if path else child
+        while path:
+            parent, side = path.pop()
+            if side:
+                right[parent] = child
+            else:
+                left[parent] = child
+            if not delta:
+                return root, 0
+            child, delta = self._adjust(parent, side, delta)
+        return child, delta
+
+    def _insert(self, node: int, *args) -> Tuple[int, int]:
+        key = args[0]
+        if (self._tail or self._head) and self._insert_end(key, args):
+            return self.root, 1
+        keys, left, right = self._keys, self._left, self._right
+        path = []
+        candidate = successor = 0
+        child = node
+        while child:
+            if key < keys[child]:
+                path.append((child, 0))
+                successor = child
+                child = left[child]
+            else:
+                path.append((child, 1))
+                candidate = child
+                child = right[child]
+        if candidate and not keys[candidate] < key:
+            if key != key:  # NaN: less than no key, but equal to none
+                raise ValueError('unordered key: {!r}'.format(key))
+            if len(args) > 1:
+                self._values[candidate] = args[1]
+            return node, 0
+        if not node and key != key:
+            raise ValueError('unordered key: {!r}'.format(key))
+        result = self._link(path, *args)
+        if not (candidate and successor):
+            self.root = result[0]
+            self._cache_ends(candidate, successor)
+        return result
+
+    def _link(self, path, *args) -> Tuple[int, int]:
+        self._len += 1
+        self._version += 1
+        return self._fix_path(path, self._new_node(*args), 1)
+
+    def _remove(self, node: int, key: CT) -> Tuple[int, int]:
+        keys, left, right = self._keys, self._left, self._right
+        path = []
+        found = -1
+        child = node
+        while child:
+            if key < keys[child]:
+                path.append((child, 0))
+                child = left[child]
+            else:
+                found = len(path)
+                path.append((child, 1))
+                child = right[child]
+        if found < 0 or keys[path[found][0]] < key or key != key:
+            raise KeyError(key)
+        return self._unlink(path, found)
+
+    def _unlink(self, path, found: int) -> Tuple[int, int]:
+        keys, left, right = self._keys, self._left, self._right
+        target = path[found][0]
+        if not left[target] or not right[target]:
+            del path[found:]
+            child = left[target] or right[target]
+        else:
+            if self._weight[target] >= 0:
+                # the walk went on with the successor
+                other = path.pop()[0]
+                child = right[other]
+            else:
+                del path[found:]
+                path.append((target, 0))
+                other = left[target]
+                while right[other]:
+                    path.append((other, 1))
+                    other = right[other]
+                child = left[other]
+            keys[target] = keys[other]
+            if self._values is not None:
+                self._values[target] = self._values[other]
+            target = other
+        self._free_node(target)
+        self._len -= 1
+        self._version += 1
+        return self._fix_path(path, child, -1)
+
+    def _set_value(self, node: int, value) -> None:
+        self._values[node] = value
+
+    def _find(self, node: int, key: CT) -> Optional[int]:
+        keys, left, right = self._keys, self._left, self._right
+        candidate = 0
+        while node:
+            if key < keys[node]:
+                node = left[node]
+            else:
+                candidate = node
+                node = right[node]
+        if not candidate or keys[candidate] < key or key != key:
+            return None
+        return candidate
+
+    def _find_many(self, keys: list) -> list:
+        nodes, left, right = self._keys, self._left, self._right
+        found = [None] * len(keys)
+        if not self.root or not keys:
+            return found
+        stack = [(self.root, 0, len(keys))]
+        while stack:
+            node, lo, hi = stack.pop()
+            if hi - lo <= _SPLIT:
+                top = node
+                for index in range(lo, hi):
+                    key = keys[index]
+                    node = top
+                    candidate = 0
+                    while node:
+                        if key < nodes[node]:
+                            node = left[node]
+                        else:
+                            candidate = node
+                            node = right[node]
+                    if candidate and not nodes[candidate] < key \
+                            and key == key:
+                        found[index] = candidate
+                continue
+            key = nodes[node]
+            i = j = bisect_left(keys, key, lo, hi)
+            if i < hi and not key < keys[i]:
+                j = bisect_right(keys, key, i, hi)
+                found[i:j] = [node] * (j - i)
+            if lo < i and left[node]:
+                stack.append((left[node], lo, i))
+            if j < hi and right[node]:
+                stack.append((right[node], j, hi))
+        return found
+
+    def _floor(self, key: CT, strict: bool) -> Optional[int]:
+        keys, left, right = self._keys, self._left, self._right
+        node = self.root
+        found = None
+        while node:
+            if (not keys[node] < key) if strict else key < keys[node]:
+                node = left[node]
+            else:
+                found = node
+                node = right[node]
+        return found
+
+    def _ceiling(self, key: CT, strict: bool) -> Optional[int]:
+        keys, left, right = self._keys, self._left, self._right
+        node = self.root
+        found = None
+        while node:
+            if (not key < keys[node]) if strict else keys[node] < key:
+                node = right[node]
+            else:
+                found = node
+                node = left[node]
+        return found
+
+    def _last(self, side: int) -> int:
+        """Protected method returning the first (side 0) or last node."""
+        links = self._right if side else self._left
+        node = self.root
+        while links[node]:
+            node = links[node]
+        return node
+
+    def _pop_last(self, side: int):
+        """
+        Protected method removing and returning the first (side 0) or the
+        last element.
+
+        :raises KeyError: if the tree is empty
+        """
+        node = self.root
+        if not node:
+            raise KeyError('pop from an empty tree')
+        path = []
+        if side:
+            links = self._right
+            while links[node]:
+                path.append((node, 1))
+                node = links[node]
+            child = self._left[node]
+        else:
+            links = self._left
+            while links[node]:
+                path.append((node, 0))
+                node = links[node]
+            child = self._right[node]
+        element = self._export(node)
+        self._free_node(node)
+        self._len -= 1
+        self._version += 1
+        self.root = self._fix_path(path, child, -1)[0]
+        return element
+
+    def pop_min(self):
+        return self._pop_last(0)
+
+    def pop_max(self):
+        return self._pop_last(1)
+
+    def _elements(self) -> list:
+        """Protected method returning the sorted list of the node items."""
+        return list(map(self._node_key if self._values is None
+                        else self._node_item, self._walk()))
+
+    def split(self, key: CT) -> Tuple['ArrayTree', 'ArrayTree']:
+        elements = self._elements()
+        index = self._rank(self._search_key(key))
+        self.clear()
+        left, right = self._empty(), self._empty()
+        left._load_sorted(elements[:index])
+        right._load_sorted(elements[index:])
+        return left, right
+
+    def _join_elements(self, pivot: list, other: 'ArrayTree') -> None:
+        """
+        Protected method appending pivot and the elements of other.
+
+        :raises ValueError: if the keys are not in increasing order
+        """
+        keys = []
+        if self.root:
+            keys.append(self._keys[self._last(1)])
+        keys.extend(map(self._sort_key, pivot) if self._sort_key else pivot)
+        if other.root:
+            keys.append(other._keys[other._last(0)])
+        if any(not x < y for x, y in zip(keys, keys[1:])):
+            raise ValueError('keys of joined trees must be increasing')
+        self._load_sorted(self._elements() + pivot + other._elements())
+        other.clear()
+
+    def _graft(self, items: list, side: int) -> None:
+        """
+        Nodes cannot be moved between columns: the items are inserted one
+        at a time, past the cached end path, in amortized O(1) each.
+        """
+        if side == 0:
+            items = reversed(items)
+        if self._values is None:
+            for key in items:
+                self.root = self._insert(self.root, key)[0]
+        else:
+            for key, value in items:
+                self.root = self._insert(self.root, key, value)[0]
+
+    def join(self, other: 'ArrayTree') -> None:
+        self._check_join(other)
+        self._join_elements([], other)
+
+    def join3(self, pivot, other: 'ArrayTree') -> None:
+        self._check_join(other)
+        self._join_elements(self._node_items([pivot]), other)
+
+    def _walk(self, reverse: bool = False):
+        version = self._version
+        stack = []
+        node = self.root
+        first, second = ((self._right, self._left) if reverse
+                         else (self._left, self._right))
+        while True:
+            while node:
+                stack.append(node)
+                node = first[node]
+            if not stack:
+                return
+            node = stack.pop()
+            yield node
+            if self._version != version:
+                raise RuntimeError('tree changed during iteration')
+            node = second[node]
+
+    def _node_batches(self, size: int, reverse: bool):
+        version = self._version
+        stack = []
+        push, pop = stack.append, stack.pop
+        batch = []
+        add = batch.append
+        counts = range(size)
+        node = self.root
+        first, second = ((self._right, self._left) if reverse
+                         else (self._left, self._right))
+        while True:
+            for _ in counts:
+                while node:
+                    push(node)
+                    node = first[node]
+                if not stack:
+                    break
+                node = pop()
+                add(node)
+                node = second[node]
+            if batch:
+                yield batch
+            if len(batch) < size:
+                return
+            if self._version != version:
+                raise RuntimeError('tree changed during iteration')
+            batch = []
+            add = batch.append
+
+    def _range(self, lo, hi, inclusive, reverse):
+        version = self._version
+        keys, left, right = self._keys, self._left, self._right
+        inc_lo, inc_hi = inclusive
+        stack = []
+        node = self.root
+        if reverse:
+            while node:
+                if hi is None or keys[node] < hi or (
+                        inc_hi and not hi < keys[node]):
+                    stack.append(node)
+                    node = right[node]
+                else:
+                    node = left[node]
+            while stack:
+                node = stack.pop()
+                if lo is not None and (keys[node] < lo if inc_lo
+                                       else not lo < keys[node]):
+                    return
+                yield node
+                if self._version != version:
+                    raise RuntimeError('tree changed during iteration')
+                node = left[node]
+                while node:
+                    stack.append(node)
+                    node = right[node]
+        else:
+            while node:
+                if lo is None or lo < keys[node] or (
+                        inc_lo and not keys[node] < lo):
+                    stack.append(node)
+                    node = left[node]
+                else:
+                    node = right[node]
+            while stack:
+                node = stack.pop()
+                if hi is not None and (hi < keys[node] if inc_hi
+                                       else not keys[node] < hi):
+                    return
+                yield node
+                if self._version != version:
+                    raise RuntimeError('tree changed during iteration')
+                node = right[node]
+                while node:
+                    stack.append(node)
+                    node = left[node]
+
+    def _height(self, node: int) -> int:
+        left, right = self._left, self._right
+        height = 0
+        level = [node] if node else []
+        while level:
+            height += 1
+            level = [child for _ in level for child in (left[_], right[_])
+                     if child]
+        return height
+
+    def _print(self) -> None:
+        """Protected debugging method printing the tree by levels."""
+        left, right = self._left, self._right
+        level = [self.root] if self.root else []
+        while level:
+            print('\t'.join(str(self._keys[_]) for _ in level))
+            level = [child for _ in level for child in (left[_], right[_])
+                     if child]
+
+    def _stats_mixin(self) -> type:
+        return ArrayStatsEngine
+
+    def is_valid(self) -> bool:
+        left, right, weight = self._left, self._right, self._weight
+
+        def height(node: int) -> int:
+            if not node:
+                return 0
+            hl, hr = height(left[node]), height(right[node])
+            if hl < 0 or hr < 0 or weight[node] != hr - hl or not (
+                    -1 <= hr - hl <= 1):
+                return -1
+            return 1 + max(hl, hr)
+
+        free = 0
+        node = self._free
+        while node:
+            free += 1
+            node = left[node]
+        keys = list(map(self._node_key, self._walk()))
+        return (height(self.root) >= 0 and len(keys) == self._len
+                and len(self._keys) == self._len + free + 1
+                and all(x < y for x, y in zip(keys, keys[1:])))
+
+    def _load_sorted(self, items) -> None:
+        """
+        Protected method replacing the content with a sorted list.
+
+        The nodes are allocated in key order, so that the columns are
+        built with list and array operations and only the links are set
+        node by node.
+        """
+        n = len(items)
+        self._keys = [None]
+        if issubclass(self.nodeClass, ValueNode):
+            self._keys.extend(key for key, _ in items)
+            self._values = [None]
+            self._values.extend(value for _, value in items)
+        else:
+            self._keys.extend(items)
+            self._values = None
+        left = self._left = array(_LINK, [0]) * (n + 1)
+        right = self._right = array(_LINK, [0]) * (n + 1)
+        weight = self._weight = array('b', [0]) * (n + 1)
+        self._free = 0
+        # same shape as BinTree._build: node lo + (hi - lo) // 2 is the
+        # root of the nodes in [lo, hi), and a subtree of size s has a
+        # height of s.bit_length()
+        stack = [(1, n + 1, 0, 0)] if n else []
+        while stack:
+            lo, hi, parent, side = stack.pop()
+            node = (lo + hi) // 2
+            if side:
+                right[parent] = node
+            else:
+                left[parent] = node
+            weight[node] = ((hi - node - 1).bit_length()
+                            - (node - lo).bit_length())
+            if lo < node:
+                stack.append((lo, node, node, 0))
+            if node + 1 < hi:
+                stack.append((node + 1, hi, node, 1))
+        self.root = left[0]
+        left[0] = 0
+        self._len = n
+        self._version += 1
+        self._bind_getters()
+
+    def clear(self) -> None:
+        self._load_sorted([])
+
+
+class ArrayStatsEngine(bin_tree.StatsEngine):
+    """
+    Stats engine of the array trees: without node objects, the engine
+    methods count the re-balancing work themselves.
+    """
+    def _instrument(self, stats) -> None:
+        if stats is None:
+            del self._plain_node_class
+        else:
+            self._plain_node_class = self.nodeClass
+
+    def _rotate_left(self, node: int) -> int:
+        self._stats.rotations += 1
+        return super()._rotate_left(node)
+
+    def _rotate_right(self, node: int) -> int:
+        self._stats.rotations += 1
+        return super()._rotate_right(node)
+
+    def _adjust(self, node: int, side: int, delta: int) -> Tuple[int, int]:
+        self._stats.adjusts += 1
+        return super()._adjust(node, side, delta)
+
+
+class TreeSet(ArrayTree, bin_tree.TreeSet):
+    """AVL TreeSet storing its nodes in columns, see ArrayTree."""
+
+
+class TreeDict(ArrayTree, bin_tree.TreeDict):
+    """AVL TreeDict storing its nodes in columns, see ArrayTree."""
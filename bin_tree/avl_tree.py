@@ -1,16 +1,24 @@
 #  Copyright (c) 2021  SBA - MIT License
 
-from .bin_tree import Node, ValueNode
+from .bin_tree import Node, ValueNode, SizedBase, PersistentBase
 from . import bin_tree
-from typing import cast, Tuple
+from typing import cast, Optional, Tuple
 
 
-class AVLNode(Node):
+class AVLBase(Node):
+    """
+    AVL balancing logic.
+
+    This class declares no slot of its own so that it can be combined
+    with ValueNode. Concrete classes must provide a ``weight`` slot.
+    """
+    __slots__ = ()
+
     def __init__(self, key):
         super().__init__(key)
         self.weight = 0
 
-    def rotate_left(self) -> 'AVLNode':
+    def rotate_left(self) -> 'AVLBase':
         node = self.right
         self.weight -= 1
         if node.weight > 0:
@@ -18,9 +26,9 @@ class AVLNode(Node):
         node.weight -= 1
         if self.weight < 0:
             node.weight += self.weight
-        return cast('AVLNode', super().rotate_left())
+        return cast('AVLBase', super().rotate_left())
 
-    def rotate_right(self) -> 'AVLNode':
+    def rotate_right(self) -> 'AVLBase':
         node = self.left
         self.weight += 1
         if node.weight < 0:
@@ -28,58 +36,174 @@ class AVLNode(Node):
         node.weight += 1
         if self.weight > 0:
             node.weight += self.weight
-        return cast('AVLNode', super().rotate_right())
+        return cast('AVLBase', super().rotate_right())
 
     def side(self) -> int:
         return 1 if self.weight >= 0 else -1
 
-    def adjust(self, child, delta) -> Tuple['AVLNode', int]:
-        if child == self.left:
-            self.weight -= delta
-        else:
-            self.weight += delta
-        if delta > 0 and self.weight == 0:
-            delta = 0
-        if delta < 0 and self.weight != 0:
-            delta = 0
-        if self.weight == 2:
-            if self.right.weight < 0:
-                self.right = self.right.rotate_right()
-            return self.rotate_left(), 0
-        elif self.weight == -2:
-            if self.left.weight > 0:
-                self.left = self.left.rotate_left()
-            return self.rotate_right(), 0
+    def adjust(self, side, delta) -> Tuple['AVLBase', int]:
+        weight = self.weight + delta if side else self.weight - delta
+        self.weight = weight
+        if weight == 2:
+            node = self.right
+            # on a removal the height is unchanged if node is balanced
+            delta = -1 if delta < 0 and node.weight != 0 else 0
+            if node.weight < 0:
+                self.right = node.rotate_right()
+            return self.rotate_left(), delta
+        elif weight == -2:
+            node = self.left
+            delta = -1 if delta < 0 and node.weight != 0 else 0
+            if node.weight > 0:
+                self.left = node.rotate_left()
+            return self.rotate_right(), delta
+        elif delta > 0:
+            return self, delta if weight else 0
         else:
-            return self, delta
+            return self, 0 if weight else delta
 
     def is_valid(self) -> bool:
         def height(node: bin_tree.Node) -> int:
             if node is None:
                 return 0
-            return 1 + max(height(node.child[_]) for _ in range(2))
+            return 1 + max(height(node.left), height(node.right))
 
-        for i in range(2):
-            if self.child[i] and not self.child[i].is_valid():
+        for child in (self.left, self.right):
+            if child and not child.is_valid():
                 return False
         if not -1 <= self.weight <= 1:
             return False
-        return self.weight == height(self.child[1]) - height(self.child[0])
+        return self.weight == height(self.right) - height(self.left)
 
     def fix_init(self, left: int, right: int) -> int:
         self.weight = right - left
         return super().fix_init(left, right)
 
 
-class AVLValueNode(ValueNode, AVLNode):
-    pass
+class AVLNode(AVLBase):
+    __slots__ = ('weight',)
+
+
+class AVLValueNode(ValueNode, AVLBase):
+    __slots__ = ('weight',)
+
+
+class AVLTree(bin_tree.BinTree):
+    """Tree level AVL algorithms, the balancing height being the height."""
+
+    def _tree_height(self, node: Optional[AVLBase]) -> int:
+        height = 0
+        while node is not None:
+            height += 1
+            node = node.left if node.weight < 0 else node.right
+        return height
+
+    def _child_height(self, node: AVLBase, height: int, side: int) -> int:
+        if side:
+            return height - 1 if node.weight >= 0 else height - 2
+        return height - 1 if node.weight <= 0 else height - 2
+
+    def _join(self, left: Optional[AVLBase], hl: int, node: AVLBase,
+              right: Optional[AVLBase], hr: int) -> Tuple[AVLBase, int]:
+        if -1 <= hl - hr <= 1:
+            node.left, node.right = left, right
+            return node, node.fix_init(hl, hr)
+        # graft the lower tree on the spine of the higher one, where the
+        # height is hl + 1 or hl, and re-balance as after an insertion
+        path = []
+        if hl > hr:
+            child, height = left, hl
+            while height > hr + 1:
+                path.append((child, 1))
+                height = self._child_height(child, height, 1)
+                child = child.right
+            node.left, node.right = child, right
+            node.fix_init(height, hr)
+        else:
+            child, height = right, hr
+            while height > hl + 1:
+                path.append((child, 0))
+                height = self._child_height(child, height, 0)
+                child = child.left
+            node.left, node.right = left, child
+            node.fix_init(hl, height)
+        root, delta = self._fix_path(path, node, 1)
+        return root, max(hl, hr) + delta
+
+
+class TreeSet(AVLTree, bin_tree.TreeSet):
+    def __init__(self, items=tuple(), node_class=None, key=None):
+        if node_class is None:
+            node_class = AVLNode if key is None else AVLValueNode
+        super().__init__(items, node_class, key)
+
+
+class TreeDict(AVLTree, bin_tree.TreeDict):
+    def __init__(self, items=(), node_class=AVLValueNode, key=None,
+                 **kwargs):
+        super(TreeDict, self).__init__(items, node_class, key, **kwargs)
+
+
+class AVLSizedNode(SizedBase, AVLBase):
+    __slots__ = ('weight', 'size')
+
+
+class AVLSizedValueNode(ValueNode, SizedBase, AVLBase):
+    __slots__ = ('weight', 'size')
+
+
+class IndexedTreeSet(bin_tree.IndexedTree, TreeSet):
+    """AVL TreeSet with O(log n) rank, select and positional access."""
+    def __init__(self, items=tuple(), node_class=None, key=None):
+        if node_class is None:
+            node_class = AVLSizedNode if key is None else AVLSizedValueNode
+        super().__init__(items, node_class, key)
+
+
+class IndexedTreeDict(bin_tree.IndexedTree, TreeDict):
+    """AVL TreeDict with O(log n) rank, select and positional access."""
+    def __init__(self, items=(), node_class=AVLSizedValueNode, key=None,
+                 **kwargs):
+        super().__init__(items, node_class, key, **kwargs)
+
+
+class AVLPersistentBase(PersistentBase, AVLBase):
+    """
+    AVL balancing of copy-on-write nodes.
+
+    The nodes which a rotation may move are copied first if they are
+    shared: the child on the grown side and its inner child, which may
+    be out of the path when a subtree is grafted by a join, or the
+    sibling of the shortened side and its inner child.
+    """
+    __slots__ = ()
+
+    def adjust(self, side, delta) -> Tuple['AVLBase', int]:
+        child = self._owned_child(side if delta > 0 else 1 - side)
+        if child is not None:
+            child._owned_child(1 - side if delta > 0 else side)
+        return super().adjust(side, delta)
+
+
+class AVLPersistentNode(AVLPersistentBase):
+    __slots__ = ('weight', 'owner')
+
+
+class AVLPersistentValueNode(ValueNode, AVLPersistentBase):
+    __slots__ = ('weight', 'owner')
 
 
-class TreeSet(bin_tree.TreeSet):
-    def __init__(self, items=tuple(), node_class=AVLNode):
-        super().__init__(items, node_class)
+class PersistentTreeSet(bin_tree.PersistentTree, TreeSet):
+    """AVL TreeSet with O(1) snapshots, see PersistentTree."""
+    def __init__(self, items=tuple(), node_class=None, key=None):
+        if node_class is None:
+            node_class = (AVLPersistentNode if key is None
+                          else AVLPersistentValueNode)
+        super().__init__(items, node_class, key)
 
 
-class TreeDict(bin_tree.TreeDict):
-    def __init__(self, items=(), node_class=AVLValueNode, **kwargs):
-        super(TreeDict, self).__init__(items, node_class, **kwargs)
+class PersistentTreeDict(bin_tree.PersistentTree, TreeDict):
+    """AVL TreeDict with O(1) snapshots, see PersistentTree."""
+    def __init__(self, items=(), node_class=AVLPersistentValueNode,
+                 key=None, **kwargs):
+        super().__init__(items, node_class, key, **kwargs)
@@ -0,0 +1,414 @@
+#  Copyright (c) 2021  SBA - MIT License
+
+"""
+Benchmarks of the tree flavors, run with ``python -m bin_tree.bench``.
+
+Every operation is timed for every flavor, size and key distribution,
+and reported in operations per second. The memory used by a tree is
+measured with tracemalloc. A plain dict kept with a sorted list of its
+keys (bisect) gives the baseline.
+
+With ``--threads``, the lookups are also split between threads sharing
+one tree, to measure how the readers scale: the ``concurrent`` flavor
+takes a read lock per lookup, which only runs in parallel on a
+free-threaded CPython.
+
+The results can be saved as JSON (``--json``) and a later run compared
+with them (``--compare``): the exit status is 1 if an operation got
+slower than the threshold.
+"""
+
+import argparse
+import bisect
+import gc
+import json
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from functools import partial
+from itertools import accumulate, islice
+from typing import Callable, Dict, List, Optional
+
+from . import (array_tree, avl_tree, bin_tree, btree, concurrent_tree,
+               red_black_tree, splay_tree)
+from . import __version__
+
+
+class BisectDict(dict):
+    """
+    Baseline: a dict and the sorted list of its keys.
+
+    Lookups are hashed, but every insertion or deletion of a key moves
+    on average half of the list.
+    """
+    def __init__(self, items=()):
+        super().__init__(items)
+        self._keys = sorted(super().keys())
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            bisect.insort(self._keys, key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        keys = self._keys
+        del keys[bisect.bisect_left(keys, key)]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def get_many(self, keys, default=None):
+        return list(map(self.get, keys, [default] * len(keys)))
+
+    def iter_batches(self, size=1024):
+        keys = self._keys
+        return (keys[i:i + size] for i in range(0, len(keys), size))
+
+    def irange(self, lo=None, hi=None):
+        keys = self._keys
+        start = 0 if lo is None else bisect.bisect_left(keys, lo)
+        stop = len(keys) if hi is None else bisect.bisect_left(keys, hi)
+        return map(keys.__getitem__, range(start, stop))
+
+
+FLAVORS = {
+    'bin': bin_tree.TreeDict,
+    'avl': avl_tree.TreeDict,
+    'rb': red_black_tree.TreeDict,
+    'array': array_tree.TreeDict,
+    'btree': btree.TreeDict,
+    'splay': splay_tree.TreeDict,
+    'concurrent': concurrent_tree.ConcurrentTreeDict,
+    'dict': BisectDict,
+}
+
+DISTRIBUTIONS = ('random', 'sorted', 'zipf')
+
+# length of a range scan
+SCAN = 100
+# number of keys of a get_many batch
+BATCH = 1000
+
+
+def make_keys(distribution: str, size: int, seed: int = 0) -> List[int]:
+    """
+    Returns the keys of a workload, in the order of the operations.
+
+    :param distribution: ``random`` for distinct keys in random order,
+        ``sorted`` for increasing keys, ``zipf`` for keys drawn with a
+        Zipf law (s = 1.1), hence repeated: a few keys are hot
+    :param size: the number of keys
+    :param seed: seed of the random generator
+    """
+    rng = random.Random(seed)
+    if distribution == 'sorted':
+        return list(range(0, 4 * size, 4))
+    keys = rng.sample(range(4 * size), size)
+    if distribution == 'random':
+        return keys
+    if distribution == 'zipf':
+        weights = list(accumulate(1 / r ** 1.1 for r in range(1, size + 1)))
+        total = weights[-1]
+        # random.choices with cum_weights, which needs Python 3.6
+        return [keys[bisect.bisect(weights, rng.random() * total,
+                                   0, size - 1)] for _ in range(size)]
+    raise ValueError('unknown distribution: {}'.format(distribution))
+
+
+def _insert(factory, keys):
+    tree = factory()
+    start = time.perf_counter()
+    for k in keys:
+        tree[k] = k
+    return time.perf_counter() - start
+
+
+def _lookup(factory, keys):
+    tree = factory(zip(keys, keys))
+    start = time.perf_counter()
+    for k in keys:
+        tree[k]
+    return time.perf_counter() - start
+
+
+def _get_many(factory, keys):
+    tree = factory(zip(keys, keys))
+    start = time.perf_counter()
+    for i in range(0, len(keys), BATCH):
+        tree.get_many(keys[i:i + BATCH])
+    return time.perf_counter() - start
+
+
+def _delete(factory, keys):
+    tree = factory(zip(keys, keys))
+    keys = list(dict.fromkeys(keys))
+    start = time.perf_counter()
+    for k in keys:
+        del tree[k]
+    return time.perf_counter() - start
+
+
+def _iterate(factory, keys):
+    tree = factory(zip(keys, keys))
+    start = time.perf_counter()
+    for _ in tree:
+        pass
+    return time.perf_counter() - start
+
+
+def _iterate_batches(factory, keys):
+    tree = factory(zip(keys, keys))
+    start = time.perf_counter()
+    for _ in tree.iter_batches():
+        pass
+    return time.perf_counter() - start
+
+
+def _bulk_load(factory, keys):
+    items = list(zip(keys, keys))
+    start = time.perf_counter()
+    factory(items)
+    return time.perf_counter() - start
+
+
+def _range_scan(factory, keys):
+    tree = factory(zip(keys, keys))
+    start = time.perf_counter()
+    for k in keys[::SCAN]:
+        for _ in islice(tree.irange(k), SCAN):
+            pass
+    return time.perf_counter() - start
+
+
+def readers(factory, keys, threads: int) -> float:
+    """
+    Returns the time taken by threads sharing a tree to look up all the
+    keys, each thread looking up its share.
+    """
+    tree = factory(zip(keys, keys))
+    barrier = threading.Barrier(threads + 1)
+
+    def lookup(share):
+        barrier.wait()
+        for k in share:
+            tree[k]
+
+    workers = [threading.Thread(target=lookup, args=(keys[i::threads],))
+               for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def _distinct(keys):
+    return len(set(keys))
+
+
+# name -> (function returning the elapsed time, number of operations)
+OPERATIONS = {
+    'insert': (_insert, len),
+    'lookup': (_lookup, len),
+    'get_many': (_get_many, len),
+    'delete': (_delete, _distinct),
+    'iterate': (_iterate, _distinct),
+    'batches': (_iterate_batches, _distinct),
+    'bulk_load': (_bulk_load, len),
+    'range_scan': (_range_scan, lambda keys: len(keys[::SCAN])),
+}
+
+
+def memory(factory, keys) -> int:
+    """Returns the bytes allocated by a container built from keys."""
+    items = list(zip(keys, keys))
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tree = factory(items)
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del tree
+    return used
+
+
+def _timed(function, factory, keys) -> float:
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()  # like timeit, keeps collections out of the measure
+    try:
+        return function(factory, keys)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def run(flavors=tuple(FLAVORS), sizes=(1000, 10000, 100000, 1000000),
+        distributions=DISTRIBUTIONS, operations=tuple(OPERATIONS),
+        repeat: int = 3, seed: int = 0,
+        report: Optional[Callable[[Dict], None]] = None,
+        fanout: Optional[int] = None, threads=()) -> List[Dict]:
+    """
+    Runs the benchmarks.
+
+    :param repeat: the best of repeat runs is kept for every measure
+    :param fanout: fanout of the btree flavor, its default if None
+    :param report: called with each result as soon as it is known
+    :param threads: numbers of threads sharing the lookups of a
+        ``readers`` measure, made for each of them
+    :return: the results, dicts with the flavor, size, distribution,
+        operation and either seconds and ops_per_sec, or bytes and
+        bytes_per_key for the ``memory`` operation; the ``readers``
+        results also have the number of threads
+    """
+    results = []
+    for size in sizes:
+        for distribution in distributions:
+            keys = make_keys(distribution, size, seed)
+            for flavor in flavors:
+                factory = FLAVORS[flavor]
+                if fanout and flavor == 'btree':
+                    factory = partial(factory, fanout=fanout)
+                base = {'flavor': flavor, 'size': size,
+                        'distribution': distribution}
+                for operation in operations:
+                    function, count = OPERATIONS[operation]
+                    seconds = min(_timed(function, factory, keys)
+                                  for _ in range(repeat))
+                    result = dict(base, operation=operation,
+                                  seconds=seconds,
+                                  ops_per_sec=count(keys) / seconds
+                                  if seconds else float('inf'))
+                    results.append(result)
+                    if report:
+                        report(result)
+                for number in threads:
+                    seconds = min(_timed(partial(readers, threads=number),
+                                         factory, keys)
+                                  for _ in range(repeat))
+                    result = dict(base, operation='readers', threads=number,
+                                  seconds=seconds,
+                                  ops_per_sec=len(keys) / seconds
+                                  if seconds else float('inf'))
+                    results.append(result)
+                    if report:
+                        report(result)
+                used = memory(factory, keys)
+                result = dict(base, operation='memory', bytes=used,
+                              bytes_per_key=used / _distinct(keys))
+                results.append(result)
+                if report:
+                    report(result)
+    return results
+
+
+def _row(result: Dict) -> str:
+    if result['operation'] == 'memory':
+        measure = '{:>12.1f} B/key'.format(result['bytes_per_key'])
+    else:
+        measure = '{:>12,.0f} ops/s'.format(result['ops_per_sec'])
+    operation = result['operation']
+    if 'threads' in result:
+        operation += '/{}'.format(result['threads'])
+    return '{flavor:<10} {size:>8} {distribution:<7} '.format(**result) + \
+        '{:<11}'.format(operation) + measure
+
+
+def _key(result: Dict):
+    return (result['flavor'], result['size'], result['distribution'],
+            result['operation'], result.get('threads'))
+
+
+def compare(old: List[Dict], new: List[Dict], threshold: float = 0.1
+            ) -> List[Dict]:
+    """
+    Compares two runs.
+
+    :param old: the reference results
+    :param new: the results to check
+    :param threshold: relative loss above which a result is a regression
+    :return: the new results also in old, with the ratio of the new speed
+        to the old one (the old size to the new one for memory), and a
+        regression flag
+    """
+    reference = {_key(r): r for r in old}
+    compared = []
+    for result in new:
+        previous = reference.get(_key(result))
+        if previous is None:
+            continue
+        if result['operation'] == 'memory':
+            ratio = previous['bytes'] / result['bytes'] \
+                if result['bytes'] else 1.0
+        else:
+            ratio = result['ops_per_sec'] / previous['ops_per_sec']
+        compared.append(dict(result, ratio=ratio,
+                             regression=ratio < 1 - threshold))
+    return compared
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m bin_tree.bench',
+        description='Benchmarks of the bin_tree flavors against dict+bisect')
+    parser.add_argument('--flavors', nargs='+', choices=list(FLAVORS),
+                        default=list(FLAVORS))
+    parser.add_argument('--sizes', nargs='+', type=lambda s: int(float(s)),
+                        default=[1000, 10000, 100000, 1000000],
+                        help='numbers of keys, 1e5 accepted')
+    parser.add_argument('--distributions', nargs='+', choices=DISTRIBUTIONS,
+                        default=list(DISTRIBUTIONS))
+    parser.add_argument('--operations', nargs='+', choices=list(OPERATIONS),
+                        default=list(OPERATIONS))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='keep the best of REPEAT runs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fanout', type=int,
+                        help='fanout of the btree flavor')
+    parser.add_argument('--threads', nargs='+', type=int, default=[],
+                        help='measure the lookups shared by THREADS threads')
+    parser.add_argument('--json', metavar='FILE',
+                        help='save the results as JSON')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare with the results of a previous run')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative loss reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.flavors, args.sizes, args.distributions,
+                  args.operations, args.repeat, args.seed,
+                  report=lambda result: print(_row(result), flush=True),
+                  fanout=args.fanout, threads=args.threads)
+    if args.json:
+        with open(args.json, 'w') as fd:
+            json.dump({'version': __version__,
+                       'python': platform.python_version(),
+                       'implementation': platform.python_implementation(),
+                       'machine': platform.machine(),
+                       'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'args': vars(args),
+                       'results': results}, fd, indent=1)
+    if args.compare:
+        with open(args.compare) as fd:
+            old = json.load(fd)['results']
+        regressions = 0
+        print()
+        for result in compare(old, results, args.threshold):
+            regressions += result['regression']
+            print('{} {:>7.2f}x{}'.format(
+                _row(result), result['ratio'],
+                '  REGRESSION' if result['regression'] else ''))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
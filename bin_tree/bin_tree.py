@@ -1,13 +1,28 @@
 #  Copyright (c) 2021  SBA - MIT License
 
-from collections import MutableMapping, Mapping, MutableSet
+from collections.abc import (MutableMapping, Mapping, MutableSet, KeysView,
+                             ValuesView, ItemsView, Set, Iterable, Sequence)
 from abc import ABCMeta, abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import partial
+from itertools import accumulate, islice
+from operator import attrgetter, itemgetter, lt, gt
+from types import MemberDescriptorType
+import pickle
+import struct
+import sys
 from typing import Any, TypeVar, Tuple, Optional, cast
 # Python<3.8 has no support for Protocol: hack to avoid the error
 try:
     from typing import Protocol
 except ImportError:
     Protocol = object
+# NumPy is optional: the batched lookups return arrays for arrays of keys
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class Comparable(Protocol, metaclass=ABCMeta):
@@ -23,45 +38,46 @@ class Node:
     Default node class.
 
     This class contains what is required to add and remove nodes, as
-    well as iterate a subtree, but does not attempt to balance the tree
+    well as iterate a subtree, but does not attempt to balance the tree.
+    Nodes use ``__slots__`` and inline ``left`` and ``right`` fields to
+    keep the per entry memory cost low.
     """
+    __slots__ = ('key', 'left', 'right')
+
     def __init__(self, key: CT):
         self.key = key
-        self.child = [cast('Node', None), cast('Node', None)]
-
-    @property
-    def left(self) -> 'Node':
-        return self.child[0]
-
-    @left.setter
-    def left(self, x: 'Node'):
-        self.child[0] = x
+        self.left = self.right = None  # type: Optional[Node]
 
     @property
-    def right(self) -> 'Node':
-        return self.child[1]
+    def child(self) -> Tuple['Node', 'Node']:
+        """The (left, right) pair of children, indexable by side."""
+        return self.left, self.right
 
-    @right.setter
-    def right(self, x: 'Node'):
-        self.child[1] = x
+    def set_child(self, side: int, node: 'Node') -> None:
+        """Set the left child if side is 0 else the right one."""
+        if side:
+            self.right = node
+        else:
+            self.left = node
 
     # noinspection PyUnusedLocal
-    def adjust(self, child: 'Node', delta: int):
+    def adjust(self, side: int, delta: int):
         """
         Balance the tree after an insertion or a removal.
 
         This implementation does nothing: it is intended to be overridden
-        in subclasses
+        in subclasses. A returned delta of 0 means that nothing has to
+        be done on the ancestors.
 
-        :param child: the child that was updated
-        :type child: Node or a subclass of Node
+        :param side: the side of the child that was updated (0 for left)
+        :type side: integer
         :param delta: used by subclasses
         :type delta: integer
         :return: returns the new root of the subtree (self in that
-            implementation) and the new delta
+            implementation) and the new delta (0 in that implementation)
         :rtype: Tuple[Node, int]
         """
-        return self, delta
+        return self, 0
 
     # noinspection PyMethodMayBeStatic
     def side(self) -> int:
@@ -73,8 +89,12 @@ class Node:
 
     def last_child(self, side: int) -> 'Node':
         child = self
-        while child.child[side] is not None:
-            child = child.child[side]
+        if side:
+            while child.right is not None:
+                child = child.right
+        else:
+            while child.left is not None:
+                child = child.left
         return child
 
     def _rotate(self, side: int) -> 'Node':
@@ -84,9 +104,14 @@ class Node:
         :return: the new root of the subtree (the previous right child)
         :rtype: Node
         """
-        node = self.child[1 - side]
-        self.child[1 - side] = node.child[side]
-        node.child[side] = self
+        if side:
+            node = self.left
+            self.left = node.right
+            node.right = self
+        else:
+            node = self.right
+            self.right = node.left
+            node.left = self
         return node
 
     def rotate_left(self) -> 'Node':
@@ -108,13 +133,35 @@ class Node:
         return self._rotate(1)
 
     def __iter__(self):
-        if self.child[0]:
-            for k in iter(self.child[0]):
-                yield k
-        yield self
-        if self.child[1]:
-            for k in iter(self.child[1]):
-                yield k
+        return self._walk(False)
+
+    def __reversed__(self):
+        return self._walk(True)
+
+    def _walk(self, reverse: bool):
+        """In-order walk of the subtree nodes using an explicit stack."""
+        stack = []
+        node = self
+        if reverse:
+            while True:
+                while node is not None:
+                    stack.append(node)
+                    node = node.right
+                if not stack:
+                    return
+                node = stack.pop()
+                yield node
+                node = node.left
+        else:
+            while True:
+                while node is not None:
+                    stack.append(node)
+                    node = node.left
+                if not stack:
+                    return
+                node = stack.pop()
+                yield node
+                node = node.right
 
     def is_valid(self) -> bool:
         """Debugging method to test whether a node is valid.
@@ -130,6 +177,8 @@ class Node:
 
 
 class ValueNode(Node):
+    __slots__ = ('value',)
+
     def __init__(self, key, value=None):
         if value is None and isinstance(key, tuple) and len(key) == 2:
             value = key[1]
@@ -138,6 +187,414 @@ class ValueNode(Node):
         self.value = value
 
 
+class SizedBase(Node):
+    """
+    Node mixin maintaining the number of nodes of its subtree.
+
+    This class declares no slot of its own: concrete classes must provide
+    a ``size`` slot. It is used by IndexedTree for order statistics.
+    """
+    __slots__ = ()
+
+    def __init__(self, key):
+        super().__init__(key)
+        self.size = 1
+
+    def _rotate(self, side: int) -> 'Node':
+        node = super()._rotate(side)
+        node.size = self.size
+        self.size = 1 + (self.left.size if self.left else 0) + (
+            self.right.size if self.right else 0)
+        return node
+
+    def is_valid(self) -> bool:
+        size = 1 + (self.left.size if self.left else 0) + (
+            self.right.size if self.right else 0)
+        return size == self.size and super().is_valid()
+
+    def fix_init(self, left: int, right: int) -> int:
+        self.size = 1 + (self.left.size if self.left else 0) + (
+            self.right.size if self.right else 0)
+        return super().fix_init(left, right)
+
+
+class PersistentBase(Node):
+    """
+    Node mixin for the copy-on-write trees made by PersistentTree.
+
+    This class declares no slot of its own: concrete classes must provide
+    an ``owner`` slot, holding the token of the tree that may change the
+    node in place. Other nodes are shared with snapshots and are copied
+    before any change.
+    """
+    __slots__ = ()
+
+    def __init__(self, key):
+        super().__init__(key)
+        self.owner = None
+
+    def _copy(self, owner) -> 'PersistentBase':
+        """Returns a copy of the node, which belongs to owner."""
+        cls = self.__class__
+        names = _slot_names.get(cls)
+        if names is None:
+            names = _slot_names[cls] = tuple(
+                name for klass in cls.__mro__
+                for name in klass.__dict__.get('__slots__', ()))
+        node = cls.__new__(cls)
+        for name in names:
+            setattr(node, name, getattr(self, name))
+        node.owner = owner
+        return node
+
+    def _owned_child(self, side: int) -> Optional['PersistentBase']:
+        """
+        Returns the child on a side, first replaced by a copy if it does
+        not belong to the owner of this node.
+        """
+        child = self.right if side else self.left
+        if child is not None and child.owner is not self.owner:
+            child = child._copy(self.owner)
+            self.set_child(side, child)
+        return child
+
+
+# persistent node class -> names of its slots
+_slot_names = {}
+
+
+_key = attrgetter('key')
+_value = attrgetter('value')
+_item = attrgetter('key', 'value')
+_first = itemgetter(0)
+
+
+_missing = object()
+# default number of elements in a batch of iter_batches
+_BATCH = 1024
+# number of keys of a batched lookup under which each key is searched
+_SPLIT = 16
+# Measured cost of building a node during a bulk load, relative to one
+# level of an insertion descent: used to choose between merging a batch
+# and inserting it key by key.
+_MERGE_RATIO = 10
+
+
+# Binary format of dump, made to be memory mapped by the frozen trees:
+# a 16 bytes header (magic, format, number of columns, flags, number of
+# rows), then the columns, each starting on a multiple of 8 bytes with
+# an 8 bytes code. Int and float columns hold little endian 8 bytes
+# numbers. Str, bytes and other columns hold rows + 1 offsets, then the
+# utf-8, raw or pickled elements one after the other.
+_HEADER = struct.Struct('<4sBBBxQ')
+_CODE = struct.Struct('<c7x')
+_MAGIC = b'BTRE'
+_FORMAT = 1
+_KEYED = 1  # flag: the rows are sorted by a key function
+_INT64 = range(-2 ** 63, 2 ** 63)
+_ENCODERS = {b's': str.encode, b'b': bytes,
+             b'p': partial(pickle.dumps, protocol=pickle.HIGHEST_PROTOCOL)}
+_DECODERS = {b's': partial(str, encoding='utf-8'), b'b': bytes,
+             b'p': pickle.loads}
+
+
+def _column_code(column: list) -> bytes:
+    types = set(map(type, column))
+    if types <= {int} and (not column or (min(column) in _INT64
+                                          and max(column) in _INT64)):
+        return b'q'
+    if types == {float}:
+        return b'd'
+    if types == {str}:
+        return b's'
+    if types == {bytes}:
+        return b'b'
+    return b'p'
+
+
+def _write_numbers(fp, numbers: array) -> None:
+    if sys.byteorder == 'big':
+        numbers.byteswap()
+    fp.write(numbers)
+
+
+def _write_column(fp, column: list) -> None:
+    code = _column_code(column)
+    fp.write(_CODE.pack(code))
+    if code in (b'q', b'd'):
+        _write_numbers(fp, array(code.decode(), column))
+        return
+    data = list(map(_ENCODERS[code], column))
+    offsets = array('q', [0])
+    offsets.extend(accumulate(map(len, data)))
+    _write_numbers(fp, offsets)
+    fp.write(b''.join(data))
+    fp.write(bytes(-offsets[-1] % 8))
+
+
+def _write_dump(fp, columns: list, flags: int) -> None:
+    fp.write(_HEADER.pack(_MAGIC, _FORMAT, len(columns), flags,
+                          len(columns[0])))
+    for column in columns:
+        _write_column(fp, column)
+
+
+def _numbers(data, typecode: str):
+    """Returns a sequence of the little endian numbers in data."""
+    if sys.byteorder == 'big':
+        numbers = array(typecode, data)
+        numbers.byteswap()
+        return numbers
+    return memoryview(data).cast(typecode)
+
+
+class _Column(Sequence):
+    """Sequence of the variable size elements of a column."""
+    __slots__ = ('_offsets', '_blob', '_decode')
+
+    def __init__(self, offsets, blob, decode):
+        self._offsets, self._blob, self._decode = offsets, blob, decode
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            rows = range(len(self))[index]
+            if rows.step != 1:
+                return list(map(self.__getitem__, rows))
+            start = rows.start
+            return _Column(self._offsets[start:start + len(rows) + 1],
+                           self._blob, self._decode)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('column index out of range')
+        return self._decode(self._blob[self._offsets[index]:
+                                       self._offsets[index + 1]])
+
+    def tolist(self) -> list:
+        offsets, blob = self._offsets.tolist(), self._blob
+        return list(map(self._decode, map(
+            blob.__getitem__, map(slice, offsets, islice(offsets, 1, None)))))
+
+
+def _read_exact(fp, size: int) -> bytes:
+    data = fp.read(size)
+    if len(data) != size:
+        raise ValueError('truncated tree file')
+    return data
+
+
+def _read_header(read) -> Tuple[int, int, int]:
+    """
+    Reads the header of a dump.
+
+    :param read: function returning the next bytes of the dump
+    :return: the number of columns, the flags and the number of rows
+    """
+    magic, version, width, flags, count = _HEADER.unpack(read(_HEADER.size))
+    if magic != _MAGIC or version != _FORMAT:
+        raise ValueError('not a tree file')
+    return width, flags, count
+
+
+def _read_column(read, count: int):
+    """
+    Reads a column of a dump.
+
+    :param read: function returning the next bytes of the dump, as bytes
+        or as a memoryview which is then used without copy
+    :return: a sequence of the elements, with a tolist method
+    """
+    code = _CODE.unpack(read(_CODE.size))[0]
+    if code in (b'q', b'd'):
+        return _numbers(read(8 * count), code.decode())
+    if code not in _DECODERS:
+        raise ValueError('corrupted tree file')
+    offsets = _numbers(read(8 * (count + 1)), 'q')
+    size = offsets[-1]
+    return _Column(offsets, memoryview(read(size + -size % 8)),
+                   _DECODERS[code])
+
+
+def _is_numeric_array(keys) -> bool:
+    """Tells whether keys is a NumPy array of numbers."""
+    return (numpy is not None and isinstance(keys, numpy.ndarray)
+            and keys.dtype.kind in 'iuf')
+
+
+def _as_array(keys, results: list, dtype=None):
+    """
+    Returns the results of a batched lookup as a NumPy array if the keys
+    are a NumPy array of numbers, else as the list itself.
+    """
+    if not _is_numeric_array(keys):
+        return results
+    try:
+        converted = numpy.array(results, dtype)
+    except ValueError:  # sequences of different lengths
+        converted = None
+    if converted is None or converted.ndim != 1 or \
+            converted.dtype.kind not in 'biufc':
+        # other results, such as str or tuples, are kept as objects
+        converted = numpy.empty(len(results), object)
+        for index, result in enumerate(results):
+            converted[index] = result
+    return converted
+
+
+def _sorted_probes(keys: list, key=None) -> Tuple[list, list]:
+    """
+    Sorts the keys of a batched lookup.
+
+    :param keys: the keys, a list or a NumPy array of numbers
+    :param key: the key function of the tree, or None
+    :return: the sorted search keys, and the position in keys of each,
+        without the unordered keys such as NaN, which cannot be found
+    """
+    if key is None and _is_numeric_array(keys):
+        order = numpy.argsort(keys, kind='stable')
+        if keys.dtype.kind == 'f':
+            order = order[~numpy.isnan(keys[order])]
+        return keys[order].tolist(), order.tolist()
+    if _is_numeric_array(keys):
+        keys = keys.tolist()
+    search = keys if key is None else list(map(key, keys))
+    order = [i for i, k in enumerate(search) if k == k]
+    order.sort(key=search.__getitem__)
+    return [search[i] for i in order], order
+
+
+def _merge(first: list, second: list, keep_first: bool, keep_second: bool,
+           keep_both: bool, key=None) -> list:
+    """
+    Merges two sorted lists of unique keys in O(n + m).
+
+    :param keep_first: keep the keys only found in first
+    :param keep_second: keep the keys only found in second
+    :param keep_both: keep the keys found in both lists
+    :param key: function computing the sort key of an element, None to
+        compare the elements themselves
+    :return: the sorted list of the kept keys
+    """
+    result = []
+    i = j = 0
+    n, m = len(first), len(second)
+    if key is None:
+        first_keys, second_keys = first, second
+    else:
+        first_keys, second_keys = list(map(key, first)), list(map(key, second))
+    while i < n and j < m:
+        x, y = first_keys[i], second_keys[j]
+        if x < y:
+            if keep_first:
+                result.append(first[i])
+            i += 1
+        elif y < x:
+            if keep_second:
+                result.append(second[j])
+            j += 1
+        else:
+            if keep_both:
+                result.append(first[i])
+            i += 1
+            j += 1
+    if keep_first:
+        result.extend(first[i:])
+    if keep_second:
+        result.extend(second[j:])
+    return result
+
+
+def _sorted_unique(items: list, key=None) -> list:
+    """
+    Sorts a list of elements and removes the elements with repeated keys.
+
+    Strictly increasing or decreasing input is detected in one pass and
+    not sorted again. Otherwise the sort is stable, and the last element
+    wins when a key is repeated.
+
+    :param items: the list, which may be changed in place
+    :param key: function extracting the key of an element, None for the
+        element itself
+    :return: the sorted list
+    """
+    if len(items) < 2:
+        return items
+    keys = items if key is None else list(map(key, items))
+    if all(map(lt, keys, islice(keys, 1, None))):
+        return items
+    if all(map(gt, keys, islice(keys, 1, None))):
+        items.reverse()
+        return items
+    items.sort(key=key)
+    keys = items if key is None else list(map(key, items))
+    result = [item for item, k, nxt in zip(items, keys, islice(keys, 1, None))
+              if k < nxt]
+    result.append(items[-1])
+    return result
+
+
+def _merge_items(old: list, new: list) -> list:
+    """
+    Merges sorted (key, value) pairs in O(n + m), the last pair winning.
+
+    :param old: sorted pairs with unique keys
+    :param new: pairs stably sorted on their keys, possibly duplicated
+    :return: the merged sorted pairs, with unique keys
+    """
+    result = []
+    i, n, m = 0, len(old), len(new)
+    for j, item in enumerate(new):
+        key = item[0]
+        if j + 1 < m and not key < new[j + 1][0]:
+            continue  # a later pair has the same key
+        while i < n and old[i][0] < key:
+            result.append(old[i])
+            i += 1
+        if i < n and not key < old[i][0]:
+            i += 1
+        result.append(item)
+    result.extend(old[i:])
+    return result
+
+
+def _is_subset(first, second) -> bool:
+    """
+    Whether all the keys of first are in second.
+
+    Both iterables must yield sorted unique keys. They are consumed
+    lazily, so the walk stops at the first missing key.
+    """
+    it = iter(second)
+    for x in first:
+        for y in it:
+            if not y < x:
+                break
+        else:
+            return False
+        if x < y:
+            return False
+    return True
+
+
+def _is_disjoint(first, second) -> bool:
+    """Whether two iterables of sorted unique keys have no common key."""
+    it = iter(second)
+    y = next(it, _missing)
+    if y is _missing:
+        return True
+    for x in first:
+        while y < x:
+            y = next(it, _missing)
+            if y is _missing:
+                return True
+        if not x < y:
+            return False
+    return True
+
+
 class BinTree:
     """
     Simple implementation of a Binary Tree.
@@ -145,17 +602,88 @@ class BinTree:
     Keys have to be comparable.This class does not attempt to balance
     its tree. Subclasses are expected to use Node subclasses to provide
     balancing algorithms.
+
+    When a key function is given, it is called once per element and the
+    result is stored as the node key: it is used by all the descents,
+    range queries and bulk loads, and elements with equal sort keys are
+    considered equal. Methods taking a key or a bound also apply it.
     """
 
-    def __init__(self, node_class=Node):
+    # function extracting the sort key of a node item being loaded, None
+    # for the item itself
+    _sort_key = None
+    # functions reading the key, the value and the (key, value) pair
+    # stored in a node, overridden by engines which do not store nodes as
+    # objects
+    _node_key = _key
+    _node_value = _value
+    _node_item = _item
+    _node_left = attrgetter('left')
+    _node_right = attrgetter('right')
+
+    def __init__(self, node_class=Node, key=None):
+        if key is not None and not callable(key):
+            raise TypeError('key must be callable')
         self.nodeClass = node_class
-        self.root = None
-        self._len = 0
+        self.key = key
+        self._version = 0  # changed on every addition or removal
+        # (version, path) to the first and last nodes, for appends
+        self._head = self._tail = None
+        self.clear()
+        self._bind_getters()
+
+    def _bind_getters(self) -> None:
+        """
+        Protected method setting the functions reading what a node holds.
+
+        _key_of reads the key of the element, _value_of and _item_of its
+        value and its (key, value) pair for mappings.
+        """
+        self._key_of = self._node_key
+
+    def _search_key(self, key):
+        """Protected method returning the sort key of a key or a bound."""
+        return key if key is None or self.key is None else self.key(key)
+
+    def _node_items(self, elements) -> list:
+        """
+        Protected method returning a new list of the items to pass to
+        the node class for elements.
+        """
+        return list(elements)
+
+    # noinspection PyMethodMayBeStatic
+    def _fix_path(self, path, child: Optional[Node], delta: int
+                  ) -> Tuple[Optional[Node], int]:
+        """
+        Protected method to link back a changed subtree and re-balance.
+
+        :param path: list of the (node, side) pairs that were followed
+            from the root of the tree down to the changed subtree
+        :param child: the new root of the changed subtree
+        :param delta: 1 for an addition, -1 for a removal
+        :return: the new root of the tree and the final delta
+        :rtype: Tuple[Node, int]
+        """
+        root = path[0][0] if path else child
+        while path:
+            parent, side = path.pop()
+            if side:
+                parent.right = child
+            else:
+                parent.left = child
+            if not delta:
+                return root, 0
+            child, delta = parent.adjust(side, delta)
+        return child, delta
 
     def _insert(self, node: Node, *args) -> Tuple[Node, int]:
         """
         Protected method to insert an element into a subtree.
 
+        The subtree is walked down iteratively with a single comparison
+        per level, and re-balanced back up through Node.adjust.
+
         :param node: root of the subtree
         :type node: node_class
         :param *args: new key or new key value
@@ -165,18 +693,103 @@ class BinTree:
         :rtype: Tuple[Node, int]
         """
         key = args[0]
-        if node is None:
-            self._len += 1
-            node, delta = self.nodeClass(*args), 1
-        elif key == node.key:
-            if issubclass(self.nodeClass, ValueNode):
-                node.value = args[1]
-            delta = 0
+        if (self._tail or self._head) and self._insert_end(key, args):
+            return self.root, 1
+        path = []
+        found = -1
+        successor = None
+        child = node
+        while child is not None:
+            if key < child.key:
+                path.append((child, 0))
+                successor = child
+                child = child.left
+            else:
+                found = len(path)
+                path.append((child, 1))
+                child = child.right
+        candidate = path[found][0] if found >= 0 else None
+        if candidate is not None and not candidate.key < key:
+            if key != key:  # NaN: less than no key, but equal to none
+                raise ValueError('unordered key: {!r}'.format(key))
+            if len(args) > 1:
+                self._update_value(path, found, args[1])
+            return path[0][0], 0
+        if node is None and key != key:
+            raise ValueError('unordered key: {!r}'.format(key))
+        result = self._link(path, *args)
+        if not (candidate and successor):
+            self.root = result[0]
+            self._cache_ends(candidate, successor)
+        return result
+
+    def _insert_end(self, key, args) -> bool:
+        """
+        Protected method appending or prepending from the end paths.
+
+        The path from the root down to the last node is kept after an
+        insertion of a new maximum. A greater key is linked under the last
+        node with that path, then only the part of the path changed by the
+        re-balancing is walked again: amortized O(1) on balanced trees.
+        Same for a key less than the minimum with the path to the first
+        node. The paths are dropped by any other change.
+
+        :return: False if key is not beyond an end of the tree
+        """
+        version = self._version
+        for side in (1, 0):
+            end = self._tail if side else self._head
+            if end is None or end[0] != version:
+                continue
+            path = end[1]
+            last = self._node_key(path[-1][0])
+            if last < key if side else key < last:
+                self.root = self._link(path, *args)[0]
+                self._end_path(side, path)
+                return True
+        return False
+
+    def _end_path(self, side: int, path: list) -> list:
+        """
+        Protected method completing a path down to the first (side 0) or
+        last node of a non empty tree, and caching it.
+
+        :param path: unchanged start of the path, consumed
+        :return: the path, ending with the end node
+        """
+        child_of = self._node_right if side else self._node_left
+        child = child_of(path[-1][0]) if path else self.root
+        while child:
+            path.append((child, side))
+            child = child_of(child)
+        if side:
+            self._tail = (self._version, path)
         else:
-            side = 0 if key < node.key else 1
-            node.child[side], delta = self._insert(node.child[side], *args)
-            node, delta = node.adjust(node.child[side], delta)
-        return node, delta
+            self._head = (self._version, path)
+        return path
+
+    def _cache_ends(self, predecessor, successor) -> None:
+        """
+        Protected method caching the path to the new first or last node
+        after an insertion without predecessor or successor.
+        """
+        if not successor:
+            self._end_path(1, [])
+        if not predecessor:
+            self._end_path(0, [])
+
+    def _link(self, path, *args) -> Tuple[Node, int]:
+        """
+        Protected method adding a node and re-balancing the tree.
+
+        :param path: the (node, side) pairs from the root down to the
+            parent of the new node, side being the free side
+        :param *args: new key or new key value
+        :return: the new root of the tree and the final delta
+        """
+        self._len += 1
+        self._version += 1
+        return self._fix_path(path, self.nodeClass(*args), 1)
 
     def _remove(self, node: Node, key: CT) -> Tuple[Node, int]:
         """
@@ -190,163 +803,2120 @@ class BinTree:
             subclasses to re-balance the tree: 0 if the tree should be
             seen as not changed, -1 if a deletion should be considered
         :rtype: Tuple[Node, int]
+        :raises KeyError: if the key is not in the subtree
         """
-        if node is None:
-            raise KeyError()
-        if key == node.key:
-            if node.child[0] is None:
-                self._len -= 1
-                return node.child[1], -1
-            elif node.child[1] is None:
-                self._len -= 1
-                return node.child[0], -1
+        path = []
+        found = -1
+        child = node
+        while child is not None:
+            if key < child.key:
+                path.append((child, 0))
+                child = child.left
             else:
-                side = int(node.side() == 1)
-                other = node.child[side].last_child(1 - side)
-                node.key = other.key
-                if issubclass(self.nodeClass, ValueNode):
-                    node.value = cast('ValueNode', other).value
-                node.child[side], delta = self._remove(node.child[side], other.key)
-                node, delta = node.adjust(node.child[side], delta)
+                found = len(path)
+                path.append((child, 1))
+                child = child.right
+        if found < 0 or path[found][0].key < key or key != key:
+            raise KeyError(key)
+        return self._unlink(path, found)
+
+    def _unlink(self, path, found: int) -> Tuple[Optional[Node], int]:
+        """
+        Protected method removing a node and re-balancing the tree.
+
+        :param path: the (node, side) pairs from the root down to the
+            node to remove, followed by the path to the leftmost node of
+            its right subtree
+        :param found: the position of the node to remove in path
+        :return: the new root of the tree and the final delta
+        """
+        target = path[found][0]
+        if target.left is None or target.right is None:
+            del path[found:]
+            child = target.left if target.right is None else target.right
         else:
-            side = int(key > node.key)
-            node.child[side], delta = self._remove(node.child[side], key)
-            node, delta = node.adjust(node.child[side], delta)
-        return node, delta
+            if target.side() == 1:
+                # the walk went on with the leftmost node of the right
+                # subtree, which is the successor
+                other = path.pop()[0]
+                child = other.right
+            else:
+                del path[found:]
+                path.append((target, 0))
+                other = target.left
+                while other.right is not None:
+                    path.append((other, 1))
+                    other = other.right
+                child = other.left
+            target.key = other.key
+            if issubclass(self.nodeClass, ValueNode):
+                target.value = cast('ValueNode', other).value
+        self._len -= 1
+        self._version += 1
+        return self._fix_path(path, child, -1)
 
-    def _find(self, node, key: CT) -> Optional['Node']:
-        if node is None:
-            return None
-        if node.key == key:
-            return node
-        return self._find(node.child[key > node.key], key)
+    # noinspection PyMethodMayBeStatic
+    def _set_value(self, node: Node, value) -> None:
+        node.value = value
 
-    def __len__(self) -> int:
-        return self._len
+    def _update_value(self, path, found: int, value) -> None:
+        """
+        Protected method replacing the value of an existing node.
 
-    def __iter__(self):
-        return (it.key for it in iter(self.root)
-                ) if self.root else iter(tuple())
+        :param path: the (node, side) pairs followed from the root
+        :param found: the position of the node in path
+        """
+        self._set_value(path[found][0], value)
 
-    def _height(self, node) -> int:
-        if node is None:
-            return 0
-        return 1 + max(self._height(node.child[i]) for i in range(2))
+    def first(self) -> 'Cursor':
+        """
+        Returns a cursor on the least element.
 
-    def height(self) -> int:
+        The cursor is empty if the tree is empty.
         """
-        Returns the height of the tree.
+        cursor = Cursor(self)
+        cursor._descend_last(0)
+        return cursor
 
-        :return: height of the tree
-        :rtype: int
+    def last(self) -> 'Cursor':
         """
-        return self._height(self.root)
+        Returns a cursor on the greatest element.
 
-    def dump(self) -> None:
+        The cursor is empty if the tree is empty.
         """
-        Debugging method that tries to dump a tree.
+        cursor = Cursor(self)
+        cursor._descend_last(1)
+        return cursor
+
+    def find(self, key: CT) -> Optional['Cursor']:
         """
-        msgs = [['' for _ in range(len(self))] for _j in range(self.height())]
+        Returns a cursor on an element.
 
-        def g(node, level):
-            if node.child[0]:
-                for kk, ll in g(node.child[0], level + 1):
-                    yield kk, ll
-            yield node.key, level
-            if node.child[1]:
-                for kk, ll in g(node.child[1], level + 1):
-                    yield kk, ll
-        for i, (k, l) in enumerate(g(self.root, 0)):
-            msgs[l][i] = str(k)
-        for lst in msgs:
-            print('\t'.join(lst))
+        :param key: the searched key
+        :return: the cursor, or None if key is not in the tree
+        """
+        cursor = Cursor(self)
+        return cursor if cursor.seek(key) else None
 
-    def is_valid(self) -> bool:
-        if self._len != len(tuple(self)):
-            return False
-        if self.root and not self.root.is_valid():
-            return False
-        return True
+    def _check_cursor(self, cursor: 'Cursor') -> None:
+        if cursor._tree is not self:
+            raise ValueError('cursor of another tree')
+        cursor._check()
 
-    def _load(self, items):
-        if isinstance(items, Mapping):
-            items = items.items()
-        items = sorted(items)
-        self.root = self._build(items, 0)[0]
-        self._len = len(items)
+    def _insert_near(self, cursor: 'Cursor', key, *args) -> 'Cursor':
+        """
+        Protected method inserting or updating an element from a cursor.
 
-    def _build(self, items, hint) -> Tuple[Optional['Node'], int]:
-        nb = len(items)
-        if nb == 0:
-            return None, 0
-        elif nb == 1:
-            return self.nodeClass(items[0]), 1
+        The cursor climbs until its subtree may hold key and the search
+        goes on from there. After the re-balancing, it only walks down
+        again from the highest node that did not move.
+
+        :param key: the sort key
+        :param *args: the arguments of the node class
+        :return: the cursor, moved to the element
+        """
+        self._check_cursor(cursor)
+        cursor._climb(key)
+        if cursor._node is None:
+            if key != key:
+                raise ValueError('unordered key: {!r}'.format(key))
+            self.root = self._link([], *args)[0]
+            cursor._reset()
+            return cursor
+        side = cursor._descend(key)
+        if side < 0:
+            if len(args) > 1:
+                self._set_value(cursor._node, args[1])
+            return cursor
+        if key != key:
+            raise ValueError('unordered key: {!r}'.format(key))
+        path = cursor._path + [(cursor._node, side)]
+        root = self.root
+        self.root = self._link(path, *args)[0]
+        cursor._version = self._version
+        if self.root == root:
+            cursor._truncate(len(path))
         else:
-            split = nb // 2
-            node = self.nodeClass(items[split])
-            left = self._build(items[:split], hint - 1)
-            right = self._build(items[split + 1:], hint - 1)
-            node.child = [left[0], right[0]]
-            return node, node.fix_init(left[1], right[1])
+            cursor._reset()
+        cursor._pending = key
+        return cursor
 
+    def delete_at(self, cursor: 'Cursor') -> None:
+        """
+        Removes the element of a cursor and moves it to the next one.
 
-class TreeDict(BinTree, MutableMapping):
-    """
-    Simple MutableMapping implemented as a Binary Tree.
+        The cost is the height of the element plus the re-balancing,
+        instead of a descent from the root.
 
-    Keys have to be comparable.This class does not attempt to balance
-    its tree. Subclasses are expected to use Node subclasses to provide
-    balancing algorithms.
-    """
+        :raises ValueError: if the cursor is empty
+        """
+        self._check_cursor(cursor)
+        node = cursor._current()
+        key = self._node_key(node)
+        found = len(cursor._path)
+        path = cursor._path + [(node, 1)]
+        child = self._node_right(node)
+        while child:
+            path.append((child, 0))
+            child = self._node_left(child)
+        root = self.root
+        self.root = self._unlink(path, found)[0]
+        cursor._version = self._version
+        # the nodes above both the target and the highest re-balanced
+        # node keep their place and their bounds
+        depth = min(len(path), found - 1)
+        if depth >= 0 and self.root == root:
+            cursor._truncate(depth)
+        else:
+            cursor._reset()
+        cursor._seek(key)
 
-    def __init__(self, items=(), node_class=ValueNode, **kwargs):
-        if not issubclass(node_class, ValueNode):
-            raise TypeError('node_class must be a subclass of ValueNode')
-        super().__init__(node_class)
-        if isinstance(items, Mapping):
-            items = items.items()
-        self._load(items)
-        for k, v in kwargs.items():
-            self.root, _ = self._insert(self.root, k, v)
+    def _find(self, node, key: CT) -> Optional['Node']:
+        candidate = None
+        while node is not None:
+            if key < node.key:
+                node = node.left
+            else:
+                candidate = node
+                node = node.right
+        if candidate is None or candidate.key < key or key != key:
+            return None
+        return candidate
 
-    def __delitem__(self, key: CT) -> None:
-        self.root, _ = self._remove(self.root, key)
+    def _find_many(self, keys: list) -> list:
+        """
+        Protected method finding sorted keys in one walk of the tree.
 
-    def __getitem__(self, key: CT):
-        node = cast(ValueNode, self._find(self.root, key))
-        if node is None:
-            raise KeyError
-        return node.value
+        The keys are split at every node between its subtrees by
+        bisection, so that the paths shared by several keys are followed
+        once. The keys of a subtree left with at most _SPLIT keys are
+        searched one at a time, as by _find, which costs less than
+        splitting them further.
 
-    def __setitem__(self, k: CT, v) -> None:
-        self.root = self._insert(self.root, k, v)[0]
+        :param keys: sorted search keys, possibly repeated
+        :return: the node of each key, or None if it is missing
+        """
+        found = [None] * len(keys)
+        if self.root is None or not keys:
+            return found
+        stack = [(self.root, 0, len(keys))]
+        while stack:
+            node, lo, hi = stack.pop()
+            if hi - lo <= _SPLIT:
+                top = node
+                for index in range(lo, hi):
+                    key = keys[index]
+                    node = top
+                    candidate = None
+                    while node is not None:
+                        if key < node.key:
+                            node = node.left
+                        else:
+                            candidate = node
+                            node = node.right
+                    if candidate is not None and not candidate.key < key \
+                            and key == key:
+                        found[index] = candidate
+                continue
+            key = node.key
+            i = j = bisect_left(keys, key, lo, hi)
+            if i < hi and not key < keys[i]:
+                j = bisect_right(keys, key, i, hi)
+                found[i:j] = [node] * (j - i)
+            if lo < i and node.left is not None:
+                stack.append((node.left, lo, i))
+            if j < hi and node.right is not None:
+                stack.append((node.right, j, hi))
+        return found
 
+    def _update_many(self, keys: list, values: list) -> list:
+        """
+        Protected method replacing the values of sorted keys in one walk
+        of the tree, the last value winning for a repeated key.
 
-class TreeSet(BinTree, MutableSet):
-    """
-    Simple MutableSet implemented as a binary tree.
+        :param keys: sorted search keys, possibly repeated
+        :param values: the new values, as stored in the nodes
+        :return: the positions of the keys missing from the tree
+        """
+        missing = []
+        for index, node in enumerate(self._find_many(keys)):
+            if node is None:
+                missing.append(index)
+            else:
+                self._set_value(node, values[index])
+        return missing
 
-    Keys have to be comparable.This class does not attempt to balance
-    its tree. Subclasses are expected to use Node subclasses to provide
-    balancing algorithms.
-    """
-    def __init__(self, items=tuple(), node_class=Node):
-        super(TreeSet, self).__init__(node_class)
-        self._load(items)
+    def _lookup_many(self, keys) -> list:
+        """
+        Protected method finding a batch of keys, sorted then looked up
+        in one walk of the tree.
 
-    def add(self, key: CT) -> None:
+        :return: the node of each key or None, in the order of keys
         """
-        Inserts a new element in the tree
+        search, order = _sorted_probes(keys, self.key)
+        nodes = [None] * len(keys)
+        for position, node in zip(order, self._find_many(search)):
+            nodes[position] = node
+        return nodes
 
-        :param key: new key
-        :type key: a comparable type
-        :return: None
-        :rtype: NoneType
+    def contains_many(self, keys):
         """
-        self.root, _ = self._insert(self.root, key)
+        Tells whether each key of a batch is in the tree.
 
-    def discard(self, key: CT) -> None:
-        self.root, _ = self._remove(self.root, key)
+        The keys are sorted and looked up in a single walk of the tree,
+        which follows the paths shared by several keys once.
 
-    def __contains__(self, x: CT) -> bool:
-        return self._find(self.root, x) is not None
+        :param keys: an iterable of keys, or a NumPy array of numbers
+        :return: a list of booleans in the order of keys, a NumPy array
+            for a NumPy array of keys
+        """
+        if not _is_numeric_array(keys):
+            keys = list(keys)
+        return _as_array(keys, [node is not None
+                                for node in self._lookup_many(keys)], bool)
+
+    def _floor(self, key: CT, strict: bool) -> Optional[Node]:
+        """Protected method returning the last node at or before key."""
+        node = self.root
+        found = None
+        while node is not None:
+            if (not node.key < key) if strict else key < node.key:
+                node = node.left
+            else:
+                found = node
+                node = node.right
+        return found
+
+    def _ceiling(self, key: CT, strict: bool) -> Optional[Node]:
+        """Protected method returning the first node at or after key."""
+        node = self.root
+        found = None
+        while node is not None:
+            if (not key < node.key) if strict else node.key < key:
+                node = node.right
+            else:
+                found = node
+                node = node.left
+        return found
+
+    def _export(self, node: Optional[Node]):
+        """Converts a node to what is returned by the navigation methods."""
+        return None if node is None else self._key_of(node)
+
+    def floor(self, key: CT):
+        """
+        Returns the greatest element less than or equal to key.
+
+        :param key: the searched key
+        :return: the element, or None if there is no such element
+        """
+        return self._export(self._floor(self._search_key(key), False))
+
+    def lower(self, key: CT):
+        """
+        Returns the greatest element strictly less than key.
+
+        :param key: the searched key
+        :return: the element, or None if there is no such element
+        """
+        return self._export(self._floor(self._search_key(key), True))
+
+    def ceiling(self, key: CT):
+        """
+        Returns the least element greater than or equal to key.
+
+        :param key: the searched key
+        :return: the element, or None if there is no such element
+        """
+        return self._export(self._ceiling(self._search_key(key), False))
+
+    def higher(self, key: CT):
+        """
+        Returns the least element strictly greater than key.
+
+        :param key: the searched key
+        :return: the element, or None if there is no such element
+        """
+        return self._export(self._ceiling(self._search_key(key), True))
+
+    def _end_node(self, side: int):
+        """
+        Protected method returning the first (side 0) or last node of a
+        non empty tree, from the cached end path when it is valid.
+        """
+        end = self._tail if side else self._head
+        if end is None or end[0] != self._version:
+            return self._end_path(side, [])[-1][0]
+        return end[1][-1][0]
+
+    def min(self):
+        """
+        Returns the least element.
+
+        :raises ValueError: if the tree is empty
+        """
+        if not self._len:
+            raise ValueError('min() of an empty tree')
+        return self._export(self._end_node(0))
+
+    def max(self):
+        """
+        Returns the greatest element.
+
+        :raises ValueError: if the tree is empty
+        """
+        if not self._len:
+            raise ValueError('max() of an empty tree')
+        return self._export(self._end_node(1))
+
+    def _pop_last(self, side: int) -> Node:
+        """
+        Protected method removing the first (side 0) or last node.
+
+        The node is found and removed in a single descent.
+
+        :raises KeyError: if the tree is empty
+        """
+        node = self.root
+        if node is None:
+            raise KeyError('pop from an empty tree')
+        path = []
+        if side:
+            while node.right is not None:
+                path.append((node, 1))
+                node = node.right
+            child = node.left
+        else:
+            while node.left is not None:
+                path.append((node, 0))
+                node = node.left
+            child = node.right
+        self._len -= 1
+        self._version += 1
+        self.root = self._fix_path(path, child, -1)[0]
+        return node
+
+    def pop_min(self):
+        """
+        Removes and returns the least element.
+
+        :raises KeyError: if the tree is empty
+        """
+        return self._export(self._pop_last(0))
+
+    def pop_max(self):
+        """
+        Removes and returns the greatest element.
+
+        :raises KeyError: if the tree is empty
+        """
+        return self._export(self._pop_last(1))
+
+    # noinspection PyMethodMayBeStatic,PyUnusedLocal
+    def _tree_height(self, node: Optional[Node]) -> int:
+        """
+        Protected method returning the balancing height of a subtree.
+
+        This is the height for AVL trees and the black height for
+        red-black trees. This implementation does not use heights and
+        returns 0.
+        """
+        return 0
+
+    # noinspection PyMethodMayBeStatic,PyUnusedLocal
+    def _child_height(self, node: Node, height: int, side: int) -> int:
+        """
+        Protected method returning the balancing height of a child.
+
+        :param node: the parent node
+        :param height: the balancing height of node
+        :param side: 0 for the left child, 1 for the right one
+        """
+        return 0
+
+    # noinspection PyUnusedLocal
+    def _join(self, left: Optional[Node], hl: int, node: Node,
+              right: Optional[Node], hr: int) -> Tuple[Node, int]:
+        """
+        Protected method joining two subtrees with a pivot node.
+
+        All keys of left must be less than node.key, and all keys of right
+        greater. Balancing subclasses override it to graft the smaller
+        subtree on the spine of the taller one in O(|hl - hr| + 1).
+
+        :param left: root of the left subtree
+        :param hl: balancing height of left
+        :param node: the pivot node, whose links are overwritten
+        :param right: root of the right subtree
+        :param hr: balancing height of right
+        :return: the root of the joined subtree and its balancing height
+        """
+        node.left, node.right = left, right
+        node.fix_init(0, 0)
+        return node, 0
+
+    # noinspection PyMethodMayBeStatic
+    def _options(self) -> dict:
+        """
+        Protected method returning the constructor parameters that follow
+        key, in their order, to give to a tree of the same kind.
+        """
+        return {}
+
+    def _empty(self) -> 'BinTree':
+        """Protected method returning an empty tree of the same kind."""
+        return self.__class__((), self.nodeClass, key=self.key,
+                              **self._options())
+
+    def _from_root(self, root: Optional[Node], length: int) -> 'BinTree':
+        """Protected method returning a tree of the same kind over root."""
+        tree = self._empty()
+        tree.root = root
+        tree._len = length
+        return tree
+
+    # noinspection PyMethodMayBeStatic
+    def _left_len(self, left: Optional[Node], right: Optional[Node],
+                  total: int) -> int:
+        """
+        Protected method returning the size of left after a split.
+
+        The two parts are walked in lockstep until the smaller one is
+        exhausted, so it costs O(min(k, n - k)).
+        """
+        walks = [iter(left) if left else iter(()),
+                 iter(right) if right else iter(())]
+        count = 0
+        while True:
+            for i in (0, 1):
+                if next(walks[i], None) is None:
+                    return count if i == 0 else total - count
+            count += 1
+
+    def split(self, key: CT) -> Tuple['BinTree', 'BinTree']:
+        """
+        Splits the tree into the elements before key and the others.
+
+        The nodes are reused: this tree is emptied. On balanced trees the
+        two parts are re-balanced in O(log n). Indexed trees also know
+        the size of each part in O(1); other trees find them by walking
+        the smaller part.
+
+        :param key: the splitting key
+        :return: a tree with the keys less than key and a tree with the
+            keys greater than or equal to key, of the same kind as self
+        """
+        key = self._search_key(key)
+        lefts, rights = [], []
+        node = self.root
+        height = self._tree_height(node)
+        while node is not None:
+            hl = self._child_height(node, height, 0)
+            hr = self._child_height(node, height, 1)
+            if node.key < key:
+                lefts.append((node.left, hl, node))
+                node, height = node.right, hr
+            else:
+                rights.append((node.right, hr, node))
+                node, height = node.left, hl
+        left, hl = None, 0
+        for sub, height, node in reversed(lefts):
+            left, hl = self._join(sub, height, node, left, hl)
+        right, hr = None, 0
+        for sub, height, node in reversed(rights):
+            right, hr = self._join(right, hr, node, sub, height)
+        total = self._len
+        length = self._left_len(left, right, total)
+        self.clear()
+        return (self._from_root(left, length),
+                self._from_root(right, total - length))
+
+    def _check_join(self, other: 'BinTree') -> None:
+        if getattr(other, '_plain_node_class', other.nodeClass) is not \
+                getattr(self, '_plain_node_class', self.nodeClass):
+            raise TypeError('cannot join trees with different node classes')
+        if other.key is not self.key:
+            raise TypeError('cannot join trees with different key functions')
+
+    def _join_node(self, node: Node, other: 'BinTree') -> None:
+        """
+        Protected method joining self, a pivot node and other.
+
+        :raises ValueError: if the keys are not in increasing order
+        """
+        if ((self.root is not None and not self.root.last_child(1).key
+             < node.key) or (other.root is not None
+                             and not node.key < other.root.last_child(0).key)):
+            raise ValueError('keys of joined trees must be increasing')
+        self.root = self._join(self.root, self._tree_height(self.root), node,
+                               other.root, other._tree_height(other.root))[0]
+        self._len += other._len + 1
+        self._version += 1
+        other.clear()
+
+    def join(self, other: 'BinTree') -> None:
+        """
+        Moves all the elements of other at the end of this tree.
+
+        All keys of other must be greater than the keys of self. The nodes
+        are reused and other is emptied. O(log n) on balanced trees.
+
+        :param other: a tree of the same kind
+        :raises ValueError: if the keys are not in increasing order
+        """
+        self._check_join(other)
+        if other.root is None:
+            return
+        if self.root is None:
+            self.root, self._len = other.root, other._len
+            self._version += 1
+            other.clear()
+            return
+        if not self.root.last_child(1).key < other.root.last_child(0).key:
+            raise ValueError('keys of joined trees must be increasing')
+        self._join_node(other._pop_last(0), other)
+
+    def join3(self, pivot, other: 'BinTree') -> None:
+        """
+        Moves a new pivot element and then all the elements of other at
+        the end of this tree.
+
+        The pivot key must be greater than the keys of self and less than
+        the keys of other. Other is emptied. O(log n) on balanced trees.
+
+        :param pivot: the new element: a key for a TreeSet or a
+            (key, value) pair for a TreeDict
+        :param other: a tree of the same kind
+        :raises ValueError: if the keys are not in increasing order
+        """
+        self._check_join(other)
+        self._join_node(self.nodeClass(self._node_items([pivot])[0]), other)
+
+    def extend(self, elements) -> None:
+        """
+        Adds a batch of elements, such as the next run of a time series.
+
+        When the keys of the batch are strictly increasing (or strictly
+        decreasing) and all greater than the maximum, or all less than
+        the minimum, the batch is built as a balanced subtree and grafted
+        on the tree: O(m + log n) on balanced trees. Other batches are
+        added with update.
+
+        :param elements: an iterable of keys for a set, of (key, value)
+            pairs for a mapping
+        """
+        if isinstance(elements, Mapping):
+            elements = elements.items()
+        elements = list(elements)
+        items = self._node_items(elements)
+        keys = (items if self._sort_key is None
+                else list(map(self._sort_key, items)))
+        if not keys:
+            return
+        if all(map(gt, keys, islice(keys, 1, None))):
+            items.reverse()
+            if keys is not items:
+                keys.reverse()
+        elif not all(map(lt, keys, islice(keys, 1, None))):
+            self.update(elements)
+            return
+        if not self._len or self._node_key(self._end_node(1)) < keys[0]:
+            self._graft(items, 1)
+        elif keys[-1] < self._node_key(self._end_node(0)):
+            self._graft(items, 0)
+        else:
+            self.update(elements)
+
+    def _graft(self, items: list, side: int) -> None:
+        """
+        Protected method adding sorted node items beyond the last (side 1)
+        or the first node, built as a subtree and joined to the tree.
+        """
+        other = self._empty()
+        other._load_sorted(items)
+        if side:
+            self.join(other)
+        else:
+            other.join(self)
+            self.root, self._len = other.root, other._len
+            self._version += 1
+
+    def _select_node(self, index: int) -> Node:
+        """
+        Protected method returning the node at a position.
+
+        This implementation walks the tree in O(n). IndexedTree overrides
+        it with an O(log n) version.
+
+        :raises IndexError: if the position is out of range
+        """
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('tree index out of range')
+        return next(islice(self._walk(), index, None))
+
+    def _rank(self, key: CT) -> int:
+        """
+        Protected method returning the number of keys less than key.
+
+        This implementation walks the tree in O(n). IndexedTree overrides
+        it with an O(log n) version.
+        """
+        return sum(1 for _ in self._range(None, key, (True, False), False))
+
+    def rank(self, key: CT) -> int:
+        """
+        Returns the number of elements less than key.
+
+        This is the position of key if it is in the tree. O(log n) on an
+        IndexedTree, O(n) otherwise.
+
+        :param key: the searched key, which needs not be in the tree
+        :rtype: int
+        """
+        return self._rank(self._search_key(key))
+
+    def select(self, index: int):
+        """
+        Returns the element at a position in key order.
+
+        O(log n) on an IndexedTree, O(n) otherwise.
+
+        :param index: the position, negative values count from the end
+        :type index: int
+        :raises IndexError: if the position is out of range
+        """
+        return self._export(self._select_node(index))
+
+    def _positional(self, index, export):
+        """
+        Protected method implementing positional access and slicing.
+
+        :param index: an int or a slice
+        :param export: callable converting a node to the returned element
+        :return: an element for an int or a list of elements for a slice
+        """
+        if not isinstance(index, slice):
+            return export(self._select_node(index))
+        positions = range(*index.indices(self._len))
+        if not positions:
+            return []
+        key = self._node_key(self._select_node(positions[0]))
+        step = positions.step
+        if step > 0:
+            nodes = self._range(key, None, (True, True), False)
+        else:
+            nodes = self._range(None, key, (True, True), True)
+        step = abs(step)
+        return [export(_) for _ in islice(
+            nodes, 0, step * (len(positions) - 1) + 1, step)]
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self):
+        return map(self._key_of, self._walk())
+
+    def __reversed__(self):
+        return map(self._key_of, self._walk(True))
+
+    def _walk(self, reverse: bool = False):
+        """
+        Protected generator over the nodes of the tree in key order.
+
+        Every step costs O(1) amortized thanks to an explicit stack.
+
+        :param reverse: if True, walk the nodes in descending order
+        :raises RuntimeError: if the tree gets an addition or a removal
+            during the iteration
+        """
+        version = self._version
+        stack = []
+        node = self.root
+        if reverse:
+            while True:
+                while node is not None:
+                    stack.append(node)
+                    node = node.right
+                if not stack:
+                    return
+                node = stack.pop()
+                yield node
+                if self._version != version:
+                    raise RuntimeError('tree changed during iteration')
+                node = node.left
+        else:
+            while True:
+                while node is not None:
+                    stack.append(node)
+                    node = node.left
+                if not stack:
+                    return
+                node = stack.pop()
+                yield node
+                if self._version != version:
+                    raise RuntimeError('tree changed during iteration')
+                node = node.right
+
+    def irange(self, lo: Optional[CT] = None, hi: Optional[CT] = None,
+               inclusive: Tuple[bool, bool] = (True, False),
+               reverse: bool = False):
+        """
+        Iterates lazily over the keys between two bounds.
+
+        The first key is found in one O(log n) descent, and the k
+        following ones are then produced in O(k).
+
+        :param lo: lower bound, None for no lower bound
+        :param hi: upper bound, None for no upper bound
+        :param inclusive: whether lo and hi are part of the range
+        :type inclusive: Tuple[bool, bool]
+        :param reverse: if True, iterate in descending order
+        :return: an iterator over the keys
+        """
+        return map(self._key_of, self._range(
+            self._search_key(lo), self._search_key(hi), inclusive, reverse))
+
+    def _range(self, lo, hi, inclusive, reverse):
+        """
+        Protected generator over the nodes with keys between lo and hi.
+
+        :raises RuntimeError: if the tree gets an addition or a removal
+            during the iteration
+        """
+        version = self._version
+        inc_lo, inc_hi = inclusive
+        stack = []
+        node = self.root
+        if reverse:
+            while node is not None:
+                if hi is None or node.key < hi or (
+                        inc_hi and not hi < node.key):
+                    stack.append(node)
+                    node = node.right
+                else:
+                    node = node.left
+            while stack:
+                node = stack.pop()
+                if lo is not None and (node.key < lo if inc_lo
+                                       else not lo < node.key):
+                    return
+                yield node
+                if self._version != version:
+                    raise RuntimeError('tree changed during iteration')
+                node = node.left
+                while node is not None:
+                    stack.append(node)
+                    node = node.right
+        else:
+            while node is not None:
+                if lo is None or lo < node.key or (
+                        inc_lo and not node.key < lo):
+                    stack.append(node)
+                    node = node.left
+                else:
+                    node = node.right
+            while stack:
+                node = stack.pop()
+                if hi is not None and (hi < node.key if inc_hi
+                                       else not node.key < hi):
+                    return
+                yield node
+                if self._version != version:
+                    raise RuntimeError('tree changed during iteration')
+                node = node.right
+                while node is not None:
+                    stack.append(node)
+                    node = node.left
+
+    def _node_batches(self, size: int, reverse: bool):
+        """
+        Protected generator over the nodes of the tree in key order, by
+        lists of at most size nodes, collected without a generator step
+        per node.
+
+        :raises RuntimeError: if the tree gets an addition or a removal
+            during the iteration
+        """
+        version = self._version
+        stack = []
+        push, pop = stack.append, stack.pop
+        batch = []
+        add = batch.append
+        counts = range(size)
+        node = self.root
+        while True:
+            if reverse:
+                for _ in counts:
+                    while node is not None:
+                        push(node)
+                        node = node.right
+                    if not stack:
+                        break
+                    node = pop()
+                    add(node)
+                    node = node.left
+            else:
+                for _ in counts:
+                    while node is not None:
+                        push(node)
+                        node = node.left
+                    if not stack:
+                        break
+                    node = pop()
+                    add(node)
+                    node = node.right
+            if batch:
+                yield batch
+            if len(batch) < size:
+                return
+            if self._version != version:
+                raise RuntimeError('tree changed during iteration')
+            batch = []
+            add = batch.append
+
+    def _batches(self, export, size: int, reverse: bool):
+        """
+        Protected method returning an iterator over lists of at most size
+        exported nodes.
+
+        :raises ValueError: if size is less than 1
+        """
+        if size < 1:
+            raise ValueError('batch size must be at least 1')
+        return (list(map(export, nodes))
+                for nodes in self._node_batches(size, reverse))
+
+    def iter_batches(self, size: int = _BATCH, reverse: bool = False):
+        """
+        Iterates over the keys by lists of at most size keys, much faster
+        than one key at a time for long scans.
+
+        :param size: the number of keys of a batch, all but the last one
+            being full
+        :param reverse: if True, iterate in descending order
+        :raises RuntimeError: if the tree gets an addition or a removal
+            between two batches
+        """
+        return self._batches(self._key_of, size, reverse)
+
+    def aiter_batches(self, size: int = _BATCH, reverse: bool = False
+                      ) -> 'AsyncBatches':
+        """
+        Asynchronous iterator over the batches of iter_batches, letting
+        the asyncio event loop run between two batches.
+        """
+        return AsyncBatches(self.iter_batches(size, reverse))
+
+    # noinspection PyMethodMayBeStatic
+    def _height(self, node) -> int:
+        height = 0
+        level = [node] if node is not None else []
+        while level:
+            height += 1
+            level = [child for _ in level for child in (_.left, _.right)
+                     if child is not None]
+        return height
+
+    def height(self) -> int:
+        """
+        Returns the height of the tree.
+
+        :return: height of the tree
+        :rtype: int
+        """
+        return self._height(self.root)
+
+    def dump(self, fp=None) -> None:
+        """
+        Writes the elements to a binary file, to be read back by load.
+
+        Int keys and values between -2**63 and 2**63, and float ones, are
+        stored as packed 8 bytes numbers, str and bytes as such, others
+        are pickled one by one. The file of a TreeDict without key
+        function can be memory mapped by FrozenTreeDict.open.
+
+        :param fp: a file opened in binary write mode; if None the tree
+            is printed instead, one level per line, for debugging
+        """
+        if fp is None:
+            self._print()
+            return
+        _write_dump(fp, self._columns(), 0 if self.key is None else _KEYED)
+
+    @classmethod
+    def load(cls, fp, **kwargs) -> 'BinTree':
+        """
+        Reads a tree written by dump.
+
+        The elements are sorted and unique, so they are loaded in O(n).
+        As with pickle, only load trusted files.
+
+        :param fp: a file opened in binary read mode
+        :param kwargs: other parameters of the constructor, such as key
+        :raises ValueError: if the file was not written by a tree of
+            the same kind
+        """
+        read = partial(_read_exact, fp)
+        width, _, count = _read_header(read)
+        if width != len(cls._width):
+            raise ValueError('tree file of another kind')
+        columns = [_read_column(read, count).tolist() for _ in range(width)]
+        return cls(cls._rows(columns), **kwargs)
+
+    # one name per column of the dumps
+    _width = ('keys',)
+
+    def _columns(self) -> list:
+        """Protected method returning the columns of the elements."""
+        return [list(self)]
+
+    @staticmethod
+    def _rows(columns: list) -> list:
+        """Protected method turning columns into constructor elements."""
+        return columns[0] if len(columns) == 1 else list(zip(*columns))
+
+    def __reduce__(self):
+        # pickles the sorted elements, instead of the nodes one by one
+        cls, node_class = self.__class__, self.nodeClass
+        if self._stats is not None:
+            cls, node_class = self._plain_class, self._plain_node_class
+        return cls, (self._rows(self._columns()), node_class,
+                     self.key) + tuple(self._options().values())
+
+    def _print(self) -> None:
+        """Protected debugging method printing the tree."""
+        msgs = [['' for _ in range(len(self))] for _j in range(self.height())]
+
+        def g(node, level):
+            if node.left:
+                for kk, ll in g(node.left, level + 1):
+                    yield kk, ll
+            yield node.key, level
+            if node.right:
+                for kk, ll in g(node.right, level + 1):
+                    yield kk, ll
+        for i, (k, l) in enumerate(g(self.root, 0)):
+            msgs[l][i] = str(k)
+        for lst in msgs:
+            print('\t'.join(lst))
+
+    def is_valid(self) -> bool:
+        if self._len != len(tuple(self)):
+            return False
+        if self.root and not self.root.is_valid():
+            return False
+        return True
+
+    _stats = None  # type: Optional[TreeStats]
+
+    def enable_stats(self, callback=None) -> None:
+        """
+        Starts counting the work done by the tree, until disable_stats.
+
+        The tree switches to an instrumented engine, so that a tree
+        without stats pays nothing for them. Enabling the stats again
+        resets the counters.
+
+        :param callback: called after every insertion, removal or search
+            with the operation name, the key, the depth reached and the
+            number of comparisons
+        """
+        if self._stats is not None:
+            self._stats.reset(callback)
+            return
+        cls = self.__class__
+        engine = _stats_engines.get(cls)
+        if engine is None:
+            engine = type(cls.__name__, (self._stats_mixin(), cls),
+                          {'_plain_class': cls, '__module__': cls.__module__,
+                           '__qualname__': cls.__qualname__})
+            _stats_engines[cls] = engine
+        stats = TreeStats(callback)
+        self.__class__ = engine
+        self._stats = stats
+        self._instrument(stats)
+
+    def disable_stats(self) -> None:
+        """Stops counting and switches back to the plain engine."""
+        if self._stats is None:
+            return
+        self._instrument(None)
+        del self._stats
+        self.__class__ = self._plain_class
+
+    def stats(self) -> Optional[dict]:
+        """
+        Returns a snapshot of the counters, or None if stats are not
+        enabled. See TreeStats.snapshot.
+        """
+        return None if self._stats is None else self._stats.snapshot()
+
+    # noinspection PyMethodMayBeStatic
+    def _stats_mixin(self) -> type:
+        """Protected method returning the mixin of the stats engine."""
+        return StatsEngine
+
+    def _load(self, items) -> None:
+        """
+        Protected method replacing the content with any iterable.
+
+        Already sorted (or reverse sorted) input is not sorted again.
+        When a key is repeated, the last element wins.
+        """
+        if isinstance(items, Mapping):
+            items = items.items()
+        self._load_sorted(_sorted_unique(self._node_items(items),
+                                         self._sort_key))
+
+    def _load_sorted(self, items) -> None:
+        """Protected method replacing the content with a sorted list."""
+        self.root = self._build(items, 0, len(items), 0)[0]
+        self._len = len(items)
+        self._version += 1
+
+    def _prefers_merge(self, count: int) -> bool:
+        """
+        Protected method telling whether a batch of count elements is
+        cheaper to merge and rebuild than to insert one at a time.
+        """
+        n = self._len
+        return count * (n + count).bit_length() >= _MERGE_RATIO * (n + count)
+
+    def clear(self) -> None:
+        """Removes all the elements in O(1)."""
+        self.root = None
+        self._len = 0
+        self._version += 1
+
+    def _build(self, items, lo: int, hi: int, hint: int
+               ) -> Tuple[Optional['Node'], int]:
+        """
+        Protected method building a balanced subtree from items[lo:hi].
+
+        The list is only indexed, never copied.
+
+        :param items: sorted elements with unique keys
+        :param hint: number of levels down to the deepest one, 0 on the
+            first call; used by subclasses
+        :return: the root of the subtree and the value returned by its
+            fix_init method (the height)
+        """
+        nb = hi - lo
+        if nb <= 0:
+            return None, 0
+        elif nb == 1:
+            return self.nodeClass(items[lo]), 1
+        else:
+            split = lo + nb // 2
+            node = self.nodeClass(items[split])
+            left = self._build(items, lo, split, hint - 1)
+            right = self._build(items, split + 1, hi, hint - 1)
+            node.left, node.right = left[0], right[0]
+            return node, node.fix_init(left[1], right[1])
+
+
+class Cursor:
+    """
+    Position on an element of a tree, made by first, last and find.
+
+    The cursor keeps the path from the root and the key bounds of each
+    subtree on it. next and prev cost O(1) amortized, and seek, as well
+    as the insert_near and delete_at methods of the tree, climb only as
+    high as the searched key requires. Any change made to the tree
+    without the cursor invalidates it.
+
+    An empty cursor is on no element: it is false, and it is reached by
+    moving beyond the first or last element.
+    """
+    __slots__ = ('_tree', '_path', '_bounds', '_node', '_pending',
+                 '_version')
+
+    def __init__(self, tree: BinTree):
+        self._tree = tree
+        self._reset()
+
+    def _reset(self) -> None:
+        """Protected method moving the cursor to the root."""
+        root = self._tree.root
+        self._version = self._tree._version
+        self._path = []
+        self._node = root if root else None
+        self._bounds = [(None, None)] if root else []
+        # sort key of the element when the cursor was left on an
+        # ancestor after an insertion, found again only when needed
+        self._pending = _missing
+
+    def _check(self) -> None:
+        if self._version != self._tree._version:
+            raise RuntimeError('tree changed since the cursor was made')
+
+    def _current(self):
+        self._check()
+        if self._node is None:
+            raise ValueError('empty cursor')
+        if self._pending is not _missing:
+            self._descend(self._pending)
+        return self._node
+
+    def _truncate(self, depth: int) -> None:
+        """Protected method moving the cursor up to a depth."""
+        if depth < len(self._path):
+            self._node = self._path[depth][0]
+            del self._path[depth:]
+            del self._bounds[depth + 1:]
+
+    def _descend_last(self, side: int) -> None:
+        """Protected method moving to the first (side 0) or last node."""
+        node = self._node
+        if node is None:
+            return
+        tree = self._tree
+        child_of = tree._node_right if side else tree._node_left
+        key_of = tree._node_key
+        path, bounds = self._path, self._bounds
+        lo, hi = bounds[-1]
+        child = child_of(node)
+        while child:
+            path.append((node, side))
+            if side:
+                lo = key_of(node)
+            else:
+                hi = key_of(node)
+            bounds.append((lo, hi))
+            node = child
+            child = child_of(node)
+        self._node = node
+
+    def _ascend(self, side: int) -> None:
+        """
+        Protected method moving to the nearest ancestor on one side
+        (1 for the next node), or to no node.
+        """
+        path, bounds = self._path, self._bounds
+        while path and path[-1][1] == side:
+            path.pop()
+            bounds.pop()
+        if path:
+            self._node = path.pop()[0]
+            bounds.pop()
+        else:
+            self._node = None
+            self._bounds = []
+
+    def _climb(self, key) -> None:
+        """Protected method climbing to a subtree whose bounds hold key."""
+        self._pending = _missing
+        if self._node is None:
+            self._reset()
+            return
+        path, bounds = self._path, self._bounds
+        while path:
+            lo, hi = bounds[-1]
+            if (lo is None or lo < key) and (hi is None or key < hi):
+                return
+            self._node = path.pop()[0]
+            bounds.pop()
+
+    def _descend(self, key) -> int:
+        """
+        Protected method walking down towards key, with one comparison
+        per level.
+
+        :return: -1 if the cursor reached key, else the side of the
+            missing child of the node where it stopped
+        """
+        self._pending = _missing
+        tree = self._tree
+        key_of, left_of, right_of = (tree._node_key, tree._node_left,
+                                     tree._node_right)
+        path, bounds = self._path, self._bounds
+        lo, hi = bounds[-1]
+        node = self._node
+        found = -1  # depth of the last node whose key is not above key
+        while True:
+            node_key = key_of(node)
+            if key < node_key:
+                child = left_of(node)
+                side = 0
+            else:
+                found = len(path)
+                child = right_of(node)
+                side = 1
+            if not child:
+                break
+            path.append((node, side))
+            if side:
+                lo = node_key
+            else:
+                hi = node_key
+            bounds.append((lo, hi))
+            node = child
+        self._node = node
+        if found >= 0:
+            candidate = path[found][0] if found < len(path) else node
+            if not key_of(candidate) < key and key == key:
+                self._truncate(found)
+                return -1
+        return side
+
+    def _seek(self, key) -> bool:
+        self._climb(key)
+        if self._node is None:
+            return False
+        side = self._descend(key)
+        if side == 1:
+            self._ascend(1)
+        return side < 0
+
+    def seek(self, key) -> bool:
+        """
+        Moves to the least element greater than or equal to key.
+
+        :param key: the searched key
+        :return: True if key is in the tree
+        """
+        self._check()
+        return self._seek(self._tree._search_key(key))
+
+    def next(self) -> None:
+        """Moves to the next element, O(1) amortized."""
+        self._step(1)
+
+    def prev(self) -> None:
+        """Moves to the previous element, O(1) amortized."""
+        self._step(0)
+
+    def _step(self, side: int) -> None:
+        node = self._current()
+        tree = self._tree
+        child = tree._node_right(node) if side else tree._node_left(node)
+        if child:
+            lo, hi = self._bounds[-1]
+            if side:
+                lo = tree._node_key(node)
+            else:
+                hi = tree._node_key(node)
+            self._path.append((node, side))
+            self._bounds.append((lo, hi))
+            self._node = child
+            self._descend_last(1 - side)
+        else:
+            self._ascend(side)
+
+    @property
+    def key(self):
+        """The key of the element."""
+        return self._tree._key_of(self._current())
+
+    @property
+    def value(self):
+        """The value of the element, for a mapping."""
+        return self._tree._value_of(self._current())
+
+    def __bool__(self) -> bool:
+        return self._node is not None
+
+
+class AsyncBatches:
+    """
+    Asynchronous iterator over the batches of a scan: it gives control
+    back to the asyncio event loop before every batch but the first, so
+    that a long scan does not block the other tasks.
+    """
+    __slots__ = ('_batches', '_started')
+
+    def __init__(self, batches):
+        self._batches = batches
+        self._started = False
+
+    def __aiter__(self) -> 'AsyncBatches':
+        return self
+
+    async def __anext__(self) -> list:
+        import asyncio  # only loaded by the asynchronous scans
+        if self._started:
+            await asyncio.sleep(0)
+        self._started = True
+        batch = next(self._batches, None)
+        if batch is None:
+            raise StopAsyncIteration
+        return batch
+
+
+class TreeStats:
+    """
+    Counters of a tree in stats mode.
+
+    The comparisons and the depths are those of the searches made by the
+    insertions, removals, lookups, floor and ceiling: the depth is the
+    number of nodes whose key was compared.
+    """
+    __slots__ = ('comparisons', 'rotations', 'adjusts', 'recolors',
+                 'depths', 'operations', 'callback')
+
+    def __init__(self, callback=None):
+        self.reset(callback)
+
+    def reset(self, callback=None) -> None:
+        """Sets the counters to 0 and changes the callback."""
+        self.comparisons = self.rotations = self.adjusts = 0
+        self.recolors = 0
+        self.depths = {}
+        self.operations = {}
+        self.callback = callback
+
+    def snapshot(self) -> dict:
+        """
+        Returns a copy of the counters.
+
+        :return: a dict with the numbers of ``comparisons``,
+            ``rotations``, ``adjusts`` (re-balancing steps) and
+            ``recolors`` (red-black color changes), the ``depths``
+            histogram as a {depth: count} dict and the count of each
+            kind of ``operations``
+        """
+        return {'comparisons': self.comparisons,
+                'rotations': self.rotations,
+                'adjusts': self.adjusts,
+                'recolors': self.recolors,
+                'depths': dict(sorted(self.depths.items())),
+                'operations': dict(self.operations)}
+
+    def _record(self, operation: str, probe: '_Probe') -> None:
+        depth = len(probe.nodes)
+        self.comparisons += probe.comparisons
+        self.depths[depth] = self.depths.get(depth, 0) + 1
+        self.operations[operation] = self.operations.get(operation, 0) + 1
+        if self.callback is not None:
+            self.callback(operation, probe.key, depth, probe.comparisons)
+
+
+class _Probe:
+    """
+    Search key counting the comparisons it goes through.
+
+    Keys of the tree answer NotImplemented to a probe, which then makes
+    the reflected comparison. Other attributes are read from the key, so
+    that a key class comparing attributes of any operand still gives
+    the right answer, but its comparisons are not counted.
+    """
+    __slots__ = ('key', 'comparisons', 'nodes')
+
+    def __init__(self, key):
+        self.key = key
+        self.comparisons = 0
+        self.nodes = set()
+
+    def __lt__(self, other) -> bool:
+        self.comparisons += 1
+        self.nodes.add(id(other))
+        return self.key < other
+
+    def __gt__(self, other) -> bool:
+        self.comparisons += 1
+        self.nodes.add(id(other))
+        return other < self.key
+
+    # key != key tells the unordered keys such as NaN: not counted
+    def __eq__(self, other) -> bool:
+        return self.key == (other.key if type(other) is _Probe else other)
+
+    def __ne__(self, other) -> bool:
+        return self.key != (other.key if type(other) is _Probe else other)
+
+    __hash__ = None
+
+    def __getattr__(self, name):
+        return getattr(self.key, name)
+
+
+def _counting_node_class(node_class: type, stats: TreeStats) -> type:
+    """
+    Returns a subclass of node_class counting the calls of adjust and
+    _rotate and the changes of color. It adds no slot, so that existing
+    nodes can be switched to it.
+    """
+    def adjust(self, side: int, delta: int):
+        stats.adjusts += 1
+        return super(cls, self).adjust(side, delta)
+
+    def _rotate(self, side: int):
+        stats.rotations += 1
+        return super(cls, self)._rotate(side)
+
+    namespace = {'__slots__': (), 'adjust': adjust, '_rotate': _rotate}
+    slot = getattr(node_class, 'color', None)
+    if isinstance(slot, MemberDescriptorType):
+        def set_color(self, color) -> None:
+            try:
+                if slot.__get__(self) is not color:
+                    stats.recolors += 1
+            except AttributeError:  # a new node
+                pass
+            slot.__set__(self, color)
+
+        namespace['color'] = property(slot.__get__, set_color)
+    cls = type(node_class.__name__, (node_class,), namespace)
+    return cls
+
+
+# plain tree class -> its stats engine
+_stats_engines = {}
+
+
+class StatsEngine:
+    """
+    Mixin of the instrumented trees made by BinTree.enable_stats.
+
+    Searches are given a probe key, and the nodes switched to a subclass
+    counting their re-balancing work. The trees made by split or the set
+    operations share the counters; nodes joined from a plain tree are
+    not switched.
+    """
+    def _instrument(self, stats: Optional[TreeStats]) -> None:
+        """
+        Protected method switching the nodes to counting ones, or back to
+        plain ones when stats is None.
+        """
+        if stats is None:
+            node_class = self._plain_node_class
+            del self._plain_node_class
+        else:
+            self._plain_node_class = self.nodeClass
+            node_class = _counting_node_class(self.nodeClass, stats)
+        self.nodeClass = node_class
+        for node in BinTree._walk(self):
+            node.__class__ = node_class
+
+    def _empty(self) -> BinTree:
+        tree = self._plain_class((), self._plain_node_class, key=self.key,
+                                 **self._options())
+        tree.__class__ = self.__class__
+        tree._stats = self._stats
+        tree._plain_node_class = self._plain_node_class
+        tree.nodeClass = self.nodeClass
+        return tree
+
+    def _insert(self, node, key, *args):
+        probe = _Probe(key)
+        result = super()._insert(node, probe, *args)
+        self._stats._record('insert', probe)
+        return result
+
+    def _link(self, path, key, *args):
+        if type(key) is _Probe:
+            key = key.key
+        return super()._link(path, key, *args)
+
+    def _remove(self, node, key):
+        probe = _Probe(key)
+        try:
+            return super()._remove(node, probe)
+        except KeyError:
+            raise KeyError(key) from None
+        finally:
+            self._stats._record('remove', probe)
+
+    def _find(self, node, key):
+        probe = _Probe(key)
+        result = super()._find(node, probe)
+        self._stats._record('find', probe)
+        return result
+
+    def _floor(self, key, strict: bool):
+        probe = _Probe(key)
+        result = super()._floor(probe, strict)
+        self._stats._record('floor', probe)
+        return result
+
+    def _ceiling(self, key, strict: bool):
+        probe = _Probe(key)
+        result = super()._ceiling(probe, strict)
+        self._stats._record('ceiling', probe)
+        return result
+
+
+class IndexedTree(BinTree):
+    """
+    Tree mixin maintaining subtree sizes for O(log n) order statistics.
+
+    Its nodes must be SizedBase instances. Sizes are updated along the
+    whole path before any re-balancing, and rotations keep them valid.
+    """
+
+    def _fix_path(self, path, child: Optional[Node], delta: int
+                  ) -> Tuple[Optional[Node], int]:
+        if path:
+            parent, side = path[-1]
+            old = parent.right if side else parent.left
+            count = (child.size if child else 0) - (old.size if old else 0)
+            for node, _ in path:
+                node.size += count
+        return super(IndexedTree, self)._fix_path(path, child, delta)
+
+    def _left_len(self, left: Optional[Node], right: Optional[Node],
+                  total: int) -> int:
+        return left.size if left else 0
+
+    def _select_node(self, index: int) -> Node:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('tree index out of range')
+        node = self.root
+        while True:
+            left = node.left.size if node.left else 0
+            if index < left:
+                node = node.left
+            elif index > left:
+                index -= left + 1
+                node = node.right
+            else:
+                return node
+
+    def _rank(self, key: CT) -> int:
+        rank = 0
+        node = self.root
+        while node is not None:
+            if node.key < key:
+                rank += 1 + (node.left.size if node.left else 0)
+                node = node.right
+            else:
+                node = node.left
+        return rank
+
+
+class PersistentTree(BinTree):
+    """
+    Tree mixin with O(1) snapshots, by path copying.
+
+    Its nodes must be PersistentBase instances. The tree owns the nodes
+    whose owner is its token, and changes them in place. snapshot gives
+    the current nodes to a new tree and takes a new token: afterwards,
+    an insertion or a removal copies the nodes it changes which are
+    still shared, that is the O(log n) nodes of its path and the few
+    siblings moved by the re-balancing, and changes the copies. The
+    snapshot and the tree then never see the changes of each other.
+
+    The cursors of insert_near and delete_at are moved from the root,
+    as the nodes on their path may be replaced by copies.
+    """
+
+    def clear(self) -> None:
+        super().clear()
+        # a new token, as nodes joined from other trees are not owned
+        self._owner = object()
+
+    def snapshot(self) -> 'PersistentTree':
+        """
+        Returns a tree of the same kind holding the current elements, in
+        O(1): the nodes are shared until either tree changes them.
+        """
+        self._owner = object()
+        return self._from_root(self.root, self._len)
+
+    def _own_path(self, path) -> None:
+        """
+        Protected method replacing the shared nodes of a path by copies.
+
+        The copies are linked to their parents and stored in path, whose
+        first node is then the root of the changed subtree. The cached
+        paths to the ends may hold the replaced nodes: they are dropped.
+        """
+        owner = self._owner
+        parent = None
+        for i, (node, side) in enumerate(path):
+            if node.owner is not owner:
+                node = node._copy(owner)
+                path[i] = (node, side)
+                if parent is not None:
+                    parent.set_child(path[i - 1][1], node)
+                self._head = self._tail = None
+            parent = node
+
+    def _own(self, node: Optional[Node]) -> Optional[Node]:
+        """Protected method returning node, or a copy if it is shared."""
+        if node is None or node.owner is self._owner:
+            return node
+        return node._copy(self._owner)
+
+    def _fix_path(self, path, child: Optional[Node], delta: int
+                  ) -> Tuple[Optional[Node], int]:
+        self._own_path(path)
+        return super()._fix_path(path, self._own(child), delta)
+
+    def _link(self, path, *args) -> Tuple[Node, int]:
+        self._len += 1
+        self._version += 1
+        node = self.nodeClass(*args)
+        node.owner = self._owner
+        return self._fix_path(path, node, 1)
+
+    def _unlink(self, path, found: int) -> Tuple[Optional[Node], int]:
+        self._own_path(path)
+        return super()._unlink(path, found)
+
+    def _update_value(self, path, found: int, value) -> None:
+        del path[found + 1:]
+        self._own_path(path)
+        super()._update_value(path, found, value)
+
+    def _update_many(self, keys: list, values: list) -> list:
+        """
+        The values of shared nodes are replaced by an insertion, which
+        copies their path.
+        """
+        missing = []
+        for index, node in enumerate(self._find_many(keys)):
+            if node is None:
+                missing.append(index)
+            elif node.owner is self._owner:
+                self._set_value(node, values[index])
+            else:
+                self.root = self._insert(self.root, keys[index],
+                                         values[index])[0]
+        return missing
+
+    def _join(self, left: Optional[Node], hl: int, node: Node,
+              right: Optional[Node], hr: int) -> Tuple[Node, int]:
+        return super()._join(self._own(left), hl, self._own(node),
+                             self._own(right), hr)
+
+    def _build(self, items, lo: int, hi: int, hint: int
+               ) -> Tuple[Optional[Node], int]:
+        node, height = super()._build(items, lo, hi, hint)
+        if node is not None:
+            node.owner = self._owner
+        return node, height
+
+    def _insert_near(self, cursor: Cursor, key, *args) -> Cursor:
+        self._check_cursor(cursor)
+        self.root = self._insert(self.root, *args)[0]
+        cursor._reset()
+        cursor._pending = key
+        return cursor
+
+    def delete_at(self, cursor: Cursor) -> None:
+        self._check_cursor(cursor)
+        key = self._node_key(cursor._current())
+        self.root = self._remove(self.root, key)[0]
+        cursor._reset()
+        cursor._seek(key)
+
+
+class TreeDict(BinTree, MutableMapping):
+    """
+    Simple MutableMapping implemented as a Binary Tree.
+
+    Keys have to be comparable.This class does not attempt to balance
+    its tree. Subclasses are expected to use Node subclasses to provide
+    balancing algorithms.
+    """
+
+    _sort_key = _first
+
+    def __init__(self, items=(), node_class=ValueNode, key=None, **kwargs):
+        """
+        :param items: a mapping or an iterable of (key, value) pairs
+        :param node_class: the class of the nodes
+        :param key: function computing the sort key of a mapping key,
+            None to compare the keys themselves. Its nodes hold
+            (key, value) pairs as values.
+        :param kwargs: additional items
+        """
+        if not issubclass(node_class, ValueNode):
+            raise TypeError('node_class must be a subclass of ValueNode')
+        super().__init__(node_class, key)
+        if isinstance(items, Mapping):
+            items = items.items()
+        self._load(items)
+        if kwargs:
+            self.update(kwargs)
+
+    def _bind_getters(self) -> None:
+        if self.key is None:
+            self._key_of = self._node_key
+            self._value_of = self._node_value
+            self._item_of = self._node_item
+        else:
+            value = self._item_of = self._node_value
+            self._key_of = lambda node: value(node)[0]
+            self._value_of = lambda node: value(node)[1]
+
+    def _node_items(self, elements) -> list:
+        if self.key is None:
+            return list(elements)
+        key = self.key
+        return [(key(k), (k, v)) for k, v in elements]
+
+    def __delitem__(self, key: CT) -> None:
+        if self.key is not None:
+            key = self.key(key)
+        self.root, _ = self._remove(self.root, key)
+
+    def __getitem__(self, key: CT):
+        node = self._find(self.root,
+                          key if self.key is None else self.key(key))
+        if node is None:
+            raise KeyError(key)
+        return self._value_of(node)
+
+    def __setitem__(self, k: CT, v) -> None:
+        if self.key is None:
+            self.root = self._insert(self.root, k, v)[0]
+        else:
+            self.root = self._insert(self.root, self.key(k), (k, v))[0]
+
+    def update(self, other=(), **kwargs) -> None:
+        """
+        Inserts or updates a batch of items, the last value winning.
+
+        Large batches are sorted once and merged with the tree in
+        O(n + m), and the tree is rebuilt balanced. Small batches are
+        inserted one at a time in O(m log n).
+
+        :param other: a mapping, an object with a keys method or an
+            iterable of (key, value) pairs
+        :param kwargs: additional items
+        """
+        if isinstance(other, Mapping):
+            items = list(other.items())
+        elif hasattr(other, 'keys'):
+            items = [(k, other[k]) for k in other.keys()]
+        else:
+            items = [(k, v) for k, v in other]
+        if kwargs:
+            items.extend(kwargs.items())
+        if not self._prefers_merge(len(items)):
+            for k, v in items:
+                self[k] = v
+            return
+        items = self._node_items(items)
+        items.sort(key=_first)
+        self._load_sorted(_merge_items(
+            list(map(self._node_item, self._walk())), items))
+
+    _width = ('keys', 'values')
+
+    def _columns(self) -> list:
+        return [list(self), list(self.values())]
+
+    def insert_near(self, cursor: Cursor, key: CT, value) -> Cursor:
+        """
+        Inserts or updates an item, starting the search from a cursor.
+
+        The cost depends on the distance from the cursor instead of the
+        size of the tree, which suits keys close to each other.
+
+        :param cursor: a cursor on this tree, which may be empty
+        :return: the cursor, moved to the item
+        """
+        if self.key is None:
+            return self._insert_near(cursor, key, key, value)
+        sort_key = self.key(key)
+        return self._insert_near(cursor, sort_key, sort_key, (key, value))
+
+    def _export(self, node: Optional[Node]):
+        """Navigation methods return (key, value) items for a mapping."""
+        return None if node is None else self._item_of(node)
+
+    def irange_values(self, lo: Optional[CT] = None, hi: Optional[CT] = None,
+                      inclusive: Tuple[bool, bool] = (True, False),
+                      reverse: bool = False):
+        """Same as irange but iterates over the values."""
+        return map(self._value_of, self._range(
+            self._search_key(lo), self._search_key(hi), inclusive, reverse))
+
+    def irange_items(self, lo: Optional[CT] = None, hi: Optional[CT] = None,
+                     inclusive: Tuple[bool, bool] = (True, False),
+                     reverse: bool = False):
+        """Same as irange but iterates over the (key, value) pairs."""
+        return map(self._item_of, self._range(
+            self._search_key(lo), self._search_key(hi), inclusive, reverse))
+
+    def items_batches(self, size: int = _BATCH, reverse: bool = False):
+        """Same as iter_batches but iterates over lists of items."""
+        return self._batches(self._item_of, size, reverse)
+
+    def aitems_batches(self, size: int = _BATCH, reverse: bool = False
+                       ) -> AsyncBatches:
+        """Same as aiter_batches but iterates over lists of items."""
+        return AsyncBatches(self.items_batches(size, reverse))
+
+    def get_many(self, keys, default=None):
+        """
+        Returns the value of each key of a batch, found like
+        contains_many in a single walk of the tree.
+
+        :param keys: an iterable of keys, or a NumPy array of numbers
+        :param default: the value returned for the missing keys
+        :return: a list of values in the order of keys, a NumPy array
+            for a NumPy array of keys
+        """
+        if not _is_numeric_array(keys):
+            keys = list(keys)
+        value = self._value_of
+        return _as_array(keys, [default if node is None else value(node)
+                                for node in self._lookup_many(keys)])
+
+    def setmany(self, items) -> None:
+        """
+        Inserts or updates a batch of items, the last value winning.
+
+        The items are sorted, and the values of the keys already in the
+        tree replaced in a single walk of the tree. The new items are
+        then added by update.
+
+        :param items: a mapping or an iterable of (key, value) pairs
+        :raises ValueError: if a key is unordered, such as NaN
+        """
+        if isinstance(items, Mapping):
+            items = items.items()
+        items = list(items)
+        keys = [k for k, _ in items]
+        search, order = _sorted_probes(keys, self.key)
+        if len(order) < len(keys):
+            raise ValueError('unordered key in {!r}'.format(keys))
+        if self.key is None:
+            values = [items[i][1] for i in order]
+        else:
+            values = [(keys[i], items[i][1]) for i in order]
+        missing = self._update_many(search, values)
+        if missing:
+            self.update([items[order[i]] for i in missing])
+
+    def keys(self) -> 'TreeKeysView':
+        return TreeKeysView(self)
+
+    def values(self) -> 'TreeValuesView':
+        return TreeValuesView(self)
+
+    def items(self) -> 'TreeItemsView':
+        return TreeItemsView(self)
+
+
+class TreeKeysView(KeysView):
+    """Keys of a TreeDict, in key order. Supports positional access."""
+    def __reversed__(self):
+        return reversed(self._mapping)
+
+    def __getitem__(self, index):
+        return self._mapping._positional(index, self._mapping._key_of)
+
+
+class TreeValuesView(ValuesView):
+    """Values of a TreeDict, in key order, read directly from the nodes."""
+    def __iter__(self):
+        return map(self._mapping._value_of, self._mapping._walk())
+
+    def __reversed__(self):
+        return map(self._mapping._value_of, self._mapping._walk(True))
+
+    def __getitem__(self, index):
+        return self._mapping._positional(index, self._mapping._value_of)
+
+
+class TreeItemsView(ItemsView):
+    """Items of a TreeDict, in key order, read directly from the nodes."""
+    def __iter__(self):
+        return map(self._mapping._item_of, self._mapping._walk())
+
+    def __reversed__(self):
+        return map(self._mapping._item_of, self._mapping._walk(True))
+
+    def __getitem__(self, index):
+        return self._mapping._positional(index, self._mapping._item_of)
+
+
+class TreeSet(BinTree, MutableSet):
+    """
+    Simple MutableSet implemented as a binary tree.
+
+    Keys have to be comparable.This class does not attempt to balance
+    its tree. Subclasses are expected to use Node subclasses to provide
+    balancing algorithms.
+    """
+    def __init__(self, items=tuple(), node_class=None, key=None):
+        """
+        :param items: an iterable of elements
+        :param node_class: the class of the nodes, Node by default, or
+            ValueNode with a key function
+        :param key: function computing the sort key of an element, None
+            to compare the elements themselves. Its nodes hold the
+            elements as values.
+        """
+        if node_class is None:
+            node_class = Node if key is None else ValueNode
+        if key is not None and not issubclass(node_class, ValueNode):
+            raise TypeError('node_class must be a subclass of ValueNode '
+                            'with a key function')
+        super(TreeSet, self).__init__(node_class, key)
+        if key is not None:
+            self._sort_key = _first
+        self._load(items)
+
+    def _bind_getters(self) -> None:
+        self._key_of = (self._node_key if self.key is None
+                        else self._node_value)
+
+    def _node_items(self, elements) -> list:
+        if self.key is None:
+            return list(elements)
+        key = self.key
+        return [(key(x), x) for x in elements]
+
+    def add(self, key: CT) -> None:
+        """
+        Inserts a new element in the tree
+
+        :param key: new key
+        :type key: a comparable type
+        :return: None
+        :rtype: NoneType
+        """
+        if self.key is None:
+            self.root, _ = self._insert(self.root, key)
+        else:
+            self.root, _ = self._insert(self.root, self.key(key), key)
+
+    def insert_near(self, cursor: Cursor, key: CT) -> Cursor:
+        """
+        Inserts an element, starting the search from a cursor.
+
+        The cost depends on the distance from the cursor instead of the
+        size of the tree, which suits keys close to each other.
+
+        :param cursor: a cursor on this tree, which may be empty
+        :return: the cursor, moved to the element
+        """
+        if self.key is None:
+            return self._insert_near(cursor, key, key)
+        sort_key = self.key(key)
+        return self._insert_near(cursor, sort_key, sort_key, key)
+
+    def discard(self, key: CT) -> None:
+        if self.key is not None:
+            key = self.key(key)
+        self.root, _ = self._remove(self.root, key)
+
+    def __contains__(self, x: CT) -> bool:
+        return self._find(self.root,
+                          x if self.key is None else self.key(x)) is not None
+
+    def __getitem__(self, index):
+        """Positional access and slicing, in key order."""
+        return self._positional(index, self._key_of)
+
+    def _from_sorted(self, items: list) -> 'TreeSet':
+        """
+        Protected method building a tree of the same kind from sorted
+        node items.
+        """
+        tree = self._empty()
+        tree._load_sorted(items)
+        return tree
+
+    def _sorted_keys(self, other):
+        """Protected method returning the sorted unique elements of other."""
+        if isinstance(other, BinTree) and other.key is self.key:
+            return other
+        return _sorted_unique(list(other), self.key)
+
+    def _sort_keys(self, other):
+        """
+        Protected method returning iterables over the sorted sort keys of
+        self and other. Those of self are read from the nodes.
+        """
+        other = self._sorted_keys(other)
+        if self.key is None:
+            return self, other
+        return map(self._node_key, self._walk()), map(self.key, other)
+
+    def _combine(self, other, keep_self: bool, keep_other: bool,
+                 keep_both: bool) -> list:
+        """Protected method merging the elements into sorted node items."""
+        result = _merge(list(self), list(self._sorted_keys(other)),
+                        keep_self, keep_other, keep_both, self.key)
+        return result if self.key is None else self._node_items(result)
+
+    def __le__(self, other):
+        if not isinstance(other, Set):
+            return NotImplemented
+        if len(self) > len(other):
+            return False
+        return _is_subset(*self._sort_keys(other))
+
+    def __ge__(self, other):
+        if not isinstance(other, Set):
+            return NotImplemented
+        if len(self) < len(other):
+            return False
+        mine, others = self._sort_keys(other)
+        return _is_subset(others, mine)
+
+    def isdisjoint(self, other) -> bool:
+        return _is_disjoint(*self._sort_keys(other))
+
+    def __or__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        return self._from_sorted(self._combine(other, True, True, True))
+
+    def __and__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        return self._from_sorted(self._combine(other, False, False, True))
+
+    def __sub__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        return self._from_sorted(self._combine(other, True, False, False))
+
+    def __rsub__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        return self._from_sorted(self._combine(other, False, True, False))
+
+    def __xor__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        return self._from_sorted(self._combine(other, True, True, False))
+
+    __ror__ = __or__
+    __rand__ = __and__
+    __rxor__ = __xor__
+
+    def update(self, *others) -> None:
+        """
+        Adds the elements of all the iterables.
+
+        Large batches are sorted once and merged with the tree in
+        O(n + m), and the tree is rebuilt balanced. Small batches are
+        inserted one at a time in O(m log n).
+        """
+        for other in others:
+            if not isinstance(other, (BinTree, Set, list, tuple)):
+                other = list(other)
+            if self._prefers_merge(len(other)):
+                self._load_sorted(self._combine(other, True, True, True))
+            else:
+                for key in other:
+                    self.add(key)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        self._load_sorted(self._combine(other, False, False, True))
+        return self
+
+    def __isub__(self, other):
+        self._load_sorted(self._combine(other, True, False, False))
+        return self
+
+    def __ixor__(self, other):
+        self._load_sorted(self._combine(other, True, True, False))
+        return self
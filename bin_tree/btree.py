@@ -0,0 +1,766 @@
+#  Copyright (c) 2021  SBA - MIT License
+
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+from .bin_tree import ValueNode, CT, Cursor, _first
+from . import bin_tree
+from typing import List, Optional, Tuple
+
+_second = itemgetter(1)
+
+
+def _identity(x):
+    return x
+
+
+class Leaf:
+    """
+    Leaf of a B-tree: the sorted keys and, for the trees storing values,
+    the parallel list of the values.
+    """
+    __slots__ = ('keys', 'values')
+
+    def __init__(self, keys: list, values: Optional[list] = None):
+        self.keys = keys
+        self.values = values
+
+    def split(self) -> Tuple[CT, 'Leaf']:
+        """
+        Moves the upper half of the elements to a new leaf.
+
+        :return: the first key of the new leaf and the new leaf
+        """
+        half = len(self.keys) // 2
+        right = Leaf(self.keys[half:])
+        del self.keys[half:]
+        if self.values is not None:
+            right.values = self.values[half:]
+            del self.values[half:]
+        return right.keys[0], right
+
+    def merge(self, separator: CT, right: 'Leaf') -> None:
+        """Appends the elements of the next leaf."""
+        self.keys += right.keys
+        if self.values is not None:
+            self.values += right.values
+
+    def shift_right(self, right: 'Leaf', separator: CT) -> CT:
+        """
+        Moves the last element to the front of the next leaf.
+
+        :return: the new separator of the two leaves
+        """
+        right.keys.insert(0, self.keys.pop())
+        if self.values is not None:
+            right.values.insert(0, self.values.pop())
+        return right.keys[0]
+
+    def shift_left(self, right: 'Leaf', separator: CT) -> CT:
+        """
+        Moves the first element of the next leaf to the end of this one.
+
+        :return: the new separator of the two leaves
+        """
+        self.keys.append(right.keys.pop(0))
+        if self.values is not None:
+            self.values.append(right.values.pop(0))
+        return right.keys[0]
+
+
+class Branch:
+    """
+    Inner node of a B-tree: children[i + 1] holds keys greater than or
+    equal to keys[i], and children[i] keys less than it.
+    """
+    __slots__ = ('keys', 'children')
+
+    def __init__(self, keys: list, children: list):
+        self.keys = keys
+        self.children = children
+
+    def split(self) -> Tuple[CT, 'Branch']:
+        """
+        Moves the upper half of the children to a new branch.
+
+        :return: the separator moved up to the parent and the new branch
+        """
+        half = len(self.keys) // 2
+        separator = self.keys[half]
+        right = Branch(self.keys[half + 1:], self.children[half + 1:])
+        del self.keys[half:]
+        del self.children[half + 1:]
+        return separator, right
+
+    def merge(self, separator: CT, right: 'Branch') -> None:
+        """Appends the separator from the parent and the next branch."""
+        self.keys.append(separator)
+        self.keys += right.keys
+        self.children += right.children
+
+    def shift_right(self, right: 'Branch', separator: CT) -> CT:
+        """Moves the last child to the front of the next branch."""
+        right.keys.insert(0, separator)
+        right.children.insert(0, self.children.pop())
+        return self.keys.pop()
+
+    def shift_left(self, right: 'Branch', separator: CT) -> CT:
+        """Moves the first child of the next branch to the end of this one."""
+        self.keys.append(separator)
+        self.children.append(right.children.pop(0))
+        return right.keys.pop(0)
+
+
+class BTree(bin_tree.BinTree):
+    """
+    B+tree: the elements are kept in sorted lists of up to fanout keys,
+    the leaves, all at the same depth below branches searched by bisect.
+
+    A tree of n keys has about n / fanout leaves, and a search makes
+    log(n) / log(fanout) steps instead of log2(n) node visits, most of
+    the comparisons being done by the C bisect. The node_class argument
+    only tells whether values are stored: it is Node for a set and
+    ValueNode for a mapping.
+
+    The elements handed over to the methods common with the binary trees
+    are the node items: keys, or (key, value) pairs when values are
+    stored. Without subtree sizes, rank and select cost O(n / fanout).
+    split, join and join3 copy the elements and cost O(n), cursors
+    insert and delete from the root.
+
+    In stats mode the depths count the distinct keys compared,
+    ``rotations`` the elements moved to a sibling and ``adjusts`` the
+    node splits and merges.
+    """
+
+    # maximum number of keys in a node, a branch having one more child
+    fanout = 64
+
+    @property
+    def _node_key(self):
+        return _first if self._valued else _identity
+
+    @property
+    def _node_value(self):
+        return _second
+
+    @property
+    def _node_item(self):
+        return _identity
+
+    def _set_fanout(self, fanout: Optional[int]) -> None:
+        """Protected method checking and setting the fanout."""
+        if fanout is None:
+            return
+        if fanout < 2:
+            raise ValueError('fanout must be at least 2')
+        self.fanout = fanout
+
+    def _options(self) -> dict:
+        return {'fanout': self.fanout}
+
+    def _item(self, leaf: Leaf, index: int):
+        """Protected method returning the node item at a leaf position."""
+        if leaf.values is None:
+            return leaf.keys[index]
+        return leaf.keys[index], leaf.values[index]
+
+    def _path_to(self, key) -> Tuple[List[Tuple[Branch, int]], Leaf]:
+        """
+        Protected method walking down to the leaf which holds key.
+
+        :return: the (branch, child index) pairs from the root, and the
+            leaf
+        """
+        path = []
+        node = self.root
+        for _ in range(self._levels):
+            index = bisect_right(node.keys, key)
+            path.append((node, index))
+            node = node.children[index]
+        return path, node
+
+    def _edge(self, side: int) -> Tuple[List[Tuple[Branch, int]], Leaf]:
+        """
+        Protected method walking down to the first (side 0) or last leaf.
+        """
+        path = []
+        node = self.root
+        for _ in range(self._levels):
+            index = len(node.keys) if side else 0
+            path.append((node, index))
+            node = node.children[index]
+        return path, node
+
+    def _next_leaf(self, path, side: int) -> Optional[Leaf]:
+        """
+        Protected method moving a path to the next (side 1) or previous
+        leaf.
+
+        :return: the leaf, or None past the ends
+        """
+        while path:
+            node, index = path.pop()
+            index += 1 if side else -1
+            if 0 <= index <= len(node.keys):
+                break
+        else:
+            return None
+        while True:
+            path.append((node, index))
+            node = node.children[index]
+            if len(path) == self._levels:
+                return node
+            index = 0 if side else len(node.keys)
+
+    def _insert(self, node, *args) -> Tuple[Leaf, int]:
+        key = args[0]
+        path = []
+        for _ in range(self._levels):
+            index = bisect_right(node.keys, key)
+            path.append((node, index))
+            node = node.children[index]
+        keys = node.keys
+        index = bisect_left(keys, key)
+        if index < len(keys) and not key < keys[index]:
+            if key != key:  # NaN: less than no key, but equal to none
+                raise ValueError('unordered key: {!r}'.format(key))
+            if len(args) > 1:
+                node.values[index] = args[1]
+            return self.root, 0
+        if not keys and key != key:
+            raise ValueError('unordered key: {!r}'.format(key))
+        path.append((node, index))
+        return self._link(path, *args)
+
+    def _link(self, path, *args) -> Tuple[Leaf, int]:
+        """
+        Protected method adding an element and splitting the nodes which
+        get more than fanout keys.
+
+        :param path: the (node, index) pairs from the root down to the
+            leaf and the position of the new element in it
+        :param *args: new key or new key value
+        :return: the root of the tree and 1
+        """
+        leaf, index = path.pop()
+        leaf.keys.insert(index, args[0])
+        if leaf.values is not None:
+            leaf.values.insert(index, args[1])
+        self._len += 1
+        self._version += 1
+        node = leaf
+        while len(node.keys) > self.fanout:
+            separator, right = self._divide(node)
+            if not path:
+                self.root = Branch([separator], [node, right])
+                self._levels += 1
+                break
+            node, index = path.pop()
+            node.keys.insert(index, separator)
+            node.children.insert(index + 1, right)
+        return self.root, 1
+
+    # noinspection PyMethodMayBeStatic
+    def _divide(self, node):
+        """Protected method splitting a node, see Leaf.split."""
+        return node.split()
+
+    def _remove(self, node, key: CT) -> Tuple[Leaf, int]:
+        path = []
+        for _ in range(self._levels):
+            index = bisect_right(node.keys, key)
+            path.append((node, index))
+            node = node.children[index]
+        keys = node.keys
+        index = bisect_left(keys, key)
+        if index == len(keys) or key < keys[index] or key != key:
+            raise KeyError(key)
+        self._unlink(path, node, index)
+        return self.root, -1
+
+    def _unlink(self, path, leaf: Leaf, index: int) -> None:
+        """
+        Protected method removing an element from a leaf and re-balancing
+        the tree.
+
+        A node left with less than fanout // 2 keys takes one from a
+        sibling which has more, else it is merged with it, which removes
+        a key from the parent.
+
+        :param path: the (branch, child index) pairs from the root down
+            to the leaf
+        """
+        del leaf.keys[index]
+        if leaf.values is not None:
+            del leaf.values[index]
+        self._len -= 1
+        self._version += 1
+        least = self.fanout // 2
+        node = leaf
+        while path and len(node.keys) < least:
+            parent, index = path.pop()
+            children = parent.children
+            if index:
+                left = children[index - 1]
+                if len(left.keys) > least:
+                    parent.keys[index - 1] = self._shift(
+                        left, node, parent.keys[index - 1], 1)
+                    return
+                self._merge(parent, index - 1)
+            else:
+                right = children[1]
+                if len(right.keys) > least:
+                    parent.keys[0] = self._shift(node, right,
+                                                 parent.keys[0], 0)
+                    return
+                self._merge(parent, 0)
+            node = parent
+        if self._levels and not self.root.keys:
+            self.root = self.root.children[0]
+            self._levels -= 1
+
+    # noinspection PyMethodMayBeStatic
+    def _shift(self, left, right, separator: CT, side: int) -> CT:
+        """
+        Protected method moving an element from left to its next sibling
+        right (side 1), or back.
+
+        :return: the new separator of the two nodes
+        """
+        if side:
+            return left.shift_right(right, separator)
+        return left.shift_left(right, separator)
+
+    # noinspection PyMethodMayBeStatic
+    def _merge(self, parent: Branch, index: int) -> None:
+        """Protected method merging the children index and index + 1."""
+        separator = parent.keys.pop(index)
+        right = parent.children.pop(index + 1)
+        parent.children[index].merge(separator, right)
+
+    def first(self) -> 'BTreeCursor':
+        cursor = BTreeCursor(self)
+        cursor._descend_last(0)
+        return cursor
+
+    def last(self) -> 'BTreeCursor':
+        cursor = BTreeCursor(self)
+        cursor._descend_last(1)
+        return cursor
+
+    def find(self, key: CT) -> Optional['BTreeCursor']:
+        cursor = BTreeCursor(self)
+        return cursor if cursor.seek(key) else None
+
+    def _insert_near(self, cursor: 'BTreeCursor', key, *args
+                     ) -> 'BTreeCursor':
+        """
+        Protected method inserting or updating an element and moving the
+        cursor to it. The search starts from the root, which is only a
+        few levels above the leaves.
+        """
+        self._check_cursor(cursor)
+        self.root = self._insert(self.root, *args)[0]
+        cursor._version = self._version
+        cursor._seek(key)
+        return cursor
+
+    def delete_at(self, cursor: 'BTreeCursor') -> None:
+        self._check_cursor(cursor)
+        key = self._node_key(cursor._current())
+        self.root = self._remove(self.root, key)[0]
+        cursor._version = self._version
+        cursor._seek(key)
+
+    def _find(self, node, key: CT):
+        for _ in range(self._levels):
+            node = node.children[bisect_right(node.keys, key)]
+        keys = node.keys
+        index = bisect_left(keys, key)
+        if index < len(keys) and not key < keys[index] and key == key:
+            if node.values is None:
+                return keys[index]
+            return keys[index], node.values[index]
+        return None
+
+    def _leaves_of(self, keys: list):
+        """
+        Protected generator over the leaves where sorted keys belong, in
+        one walk of the tree.
+
+        :return: (leaf, lo, hi) triples, keys[lo:hi] belonging to leaf
+        """
+        stack = [(self.root, 0, len(keys), self._levels)]
+        while stack:
+            node, lo, hi, depth = stack.pop()
+            if not depth:
+                yield node, lo, hi
+                continue
+            separators = node.keys
+            while lo < hi:
+                index = bisect_right(separators, keys[lo])
+                stop = hi if index == len(separators) else bisect_left(
+                    keys, separators[index], lo, hi)
+                stack.append((node.children[index], lo, stop, depth - 1))
+                lo = stop
+
+    def _find_many(self, keys: list) -> list:
+        found = [None] * len(keys)
+        for leaf, lo, hi in self._leaves_of(keys):
+            leaf_keys, values = leaf.keys, leaf.values
+            index = 0
+            for position in range(lo, hi):
+                key = keys[position]
+                index = bisect_left(leaf_keys, key, index)
+                if index < len(leaf_keys) and not key < leaf_keys[index] \
+                        and key == key:
+                    found[position] = leaf_keys[index] if values is None \
+                        else (leaf_keys[index], values[index])
+        return found
+
+    def _update_many(self, keys: list, values: list) -> list:
+        missing = []
+        for leaf, lo, hi in self._leaves_of(keys):
+            leaf_keys = leaf.keys
+            index = 0
+            for position in range(lo, hi):
+                key = keys[position]
+                index = bisect_left(leaf_keys, key, index)
+                if index < len(leaf_keys) and not key < leaf_keys[index]:
+                    leaf.values[index] = values[position]
+                else:
+                    missing.append(position)
+        return missing
+
+    def _floor(self, key: CT, strict: bool):
+        path, leaf = self._path_to(key)
+        index = (bisect_left if strict else bisect_right)(leaf.keys, key)
+        if index:
+            return self._item(leaf, index - 1)
+        # the keys of the previous leaf are all less than key
+        leaf = self._next_leaf(path, 0)
+        return None if leaf is None else self._item(leaf, -1)
+
+    def _ceiling(self, key: CT, strict: bool):
+        path, leaf = self._path_to(key)
+        index = (bisect_right if strict else bisect_left)(leaf.keys, key)
+        if index < len(leaf.keys):
+            return self._item(leaf, index)
+        leaf = self._next_leaf(path, 1)
+        return None if leaf is None else self._item(leaf, 0)
+
+    def _end_node(self, side: int):
+        return self._item(self._edge(side)[1], -1 if side else 0)
+
+    def _pop_last(self, side: int):
+        if not self._len:
+            raise KeyError('pop from an empty tree')
+        path, leaf = self._edge(side)
+        index = len(leaf.keys) - 1 if side else 0
+        element = self._item(leaf, index)
+        self._unlink(path, leaf, index)
+        return element
+
+    def _leaves(self):
+        """Protected generator over the leaves, in key order."""
+        path, leaf = self._edge(0)
+        while leaf is not None:
+            yield leaf
+            leaf = self._next_leaf(path, 1)
+
+    def _select_node(self, index: int):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('tree index out of range')
+        for leaf in self._leaves():
+            if index < len(leaf.keys):
+                return self._item(leaf, index)
+            index -= len(leaf.keys)
+
+    def _rank(self, key: CT) -> int:
+        count = 0
+        for leaf in self._leaves():
+            keys = leaf.keys
+            if not keys or not keys[-1] < key:
+                return count + bisect_left(keys, key)
+            count += len(keys)
+        return count
+
+    def split(self, key: CT) -> Tuple['BTree', 'BTree']:
+        index = self._rank(self._search_key(key))
+        elements = list(self._walk())
+        self.clear()
+        left, right = self._empty(), self._empty()
+        left._load_sorted(elements[:index])
+        right._load_sorted(elements[index:])
+        return left, right
+
+    def _join_elements(self, pivot: list, other: 'BTree') -> None:
+        """
+        Protected method appending pivot and the elements of other.
+
+        :raises ValueError: if the keys are not in increasing order
+        """
+        keys = []
+        if self._len:
+            keys.append(self._node_key(self._end_node(1)))
+        keys.extend(map(self._sort_key, pivot) if self._sort_key else pivot)
+        if other._len:
+            keys.append(other._node_key(other._end_node(0)))
+        if any(not x < y for x, y in zip(keys, keys[1:])):
+            raise ValueError('keys of joined trees must be increasing')
+        self._load_sorted(list(self._walk()) + pivot + list(other._walk()))
+        other.clear()
+
+    def join(self, other: 'BTree') -> None:
+        self._check_join(other)
+        self._join_elements([], other)
+
+    def join3(self, pivot, other: 'BTree') -> None:
+        self._check_join(other)
+        self._join_elements(self._node_items([pivot]), other)
+
+    def _graft(self, items: list, side: int) -> None:
+        """
+        The items are inserted one at a time, each in one short descent
+        to the last (or first) leaf.
+        """
+        if side == 0:
+            items = reversed(items)
+        if self._valued:
+            for key, value in items:
+                self.root = self._insert(self.root, key, value)[0]
+        else:
+            for key in items:
+                self.root = self._insert(self.root, key)[0]
+
+    def _walk(self, reverse: bool = False):
+        return self._range(None, None, (True, True), reverse)
+
+    def _range(self, lo, hi, inclusive, reverse):
+        version = self._version
+        inc_lo, inc_hi = inclusive
+        if reverse:
+            path, leaf = self._edge(1) if hi is None else self._path_to(hi)
+        else:
+            path, leaf = self._edge(0) if lo is None else self._path_to(lo)
+        while leaf is not None:
+            keys = leaf.keys
+            start = 0 if lo is None else (
+                bisect_left if inc_lo else bisect_right)(keys, lo)
+            stop = len(keys) if hi is None else (
+                bisect_right if inc_hi else bisect_left)(keys, hi)
+            values = leaf.values
+            for index in (range(stop - 1, start - 1, -1) if reverse
+                          else range(start, stop)):
+                yield keys[index] if values is None else (keys[index],
+                                                          values[index])
+                if self._version != version:
+                    raise RuntimeError('tree changed during iteration')
+            if start if reverse else stop < len(keys):
+                return
+            leaf = self._next_leaf(path, 0 if reverse else 1)
+
+    def _node_batches(self, size: int, reverse: bool):
+        """The node items are copied a leaf at a time."""
+        version = self._version
+        path, leaf = self._edge(1 if reverse else 0)
+        batch = []
+        while leaf is not None:
+            items = leaf.keys if leaf.values is None else list(
+                zip(leaf.keys, leaf.values))
+            batch += reversed(items) if reverse else items
+            while len(batch) >= size:
+                yield batch[:size]
+                if self._version != version:
+                    raise RuntimeError('tree changed during iteration')
+                del batch[:size]
+            leaf = self._next_leaf(path, 0 if reverse else 1)
+        if batch:
+            yield batch
+
+    def _height(self, node) -> int:
+        return self._levels + 1 if self._len else 0
+
+    def _print(self) -> None:
+        """Protected debugging method printing the nodes by levels."""
+        level = [self.root] if self._len else []
+        for depth in range(self._levels + 1 if level else 0):
+            print('\t'.join(' '.join(map(str, node.keys)) for node in level))
+            if depth < self._levels:
+                level = [child for node in level for child in node.children]
+
+    def _stats_mixin(self) -> type:
+        return BTreeStatsEngine
+
+    def is_valid(self) -> bool:
+        fanout, least = self.fanout, self.fanout // 2
+        count = 0
+
+        def valid(node, depth: int, lo, hi) -> bool:
+            nonlocal count
+            keys = node.keys
+            if len(keys) > fanout or (node is not self.root
+                                      and len(keys) < least):
+                return False
+            if any(not x < y for x, y in zip(keys, keys[1:])) or (keys and (
+                    (lo is not None and keys[0] < lo)
+                    or (hi is not None and not keys[-1] < hi))):
+                return False
+            if depth == self._levels:
+                count += len(keys)
+                return isinstance(node, Leaf) and (
+                    (node.values is None) != self._valued
+                    and (node.values is None
+                         or len(node.values) == len(keys)))
+            bounds = [lo] + keys + [hi]
+            return (isinstance(node, Branch)
+                    and len(node.children) == len(keys) + 1 and keys
+                    and all(valid(child, depth + 1, bounds[i], bounds[i + 1])
+                            for i, child in enumerate(node.children)))
+
+        return bool(valid(self.root, 0, None, None)) and count == self._len
+
+    def _load_sorted(self, items) -> None:
+        """
+        Protected method replacing the content with a sorted list.
+
+        The elements are spread evenly over full leaves, and the leaves
+        over full branches.
+        """
+        n = len(items)
+        fanout = self.fanout
+        self._valued = issubclass(self.nodeClass, ValueNode)
+        if self._valued:
+            keys = [key for key, _ in items]
+            values = [value for _, value in items]
+        else:
+            keys, values = list(items), None
+        count = max(1, -(-n // fanout))
+        bounds = [i * n // count for i in range(count + 1)]
+        level = [Leaf(keys[lo:hi], None if values is None else values[lo:hi])
+                 for lo, hi in zip(bounds, bounds[1:])]
+        # separators[i] is the least key under level[i + 1]
+        separators = [keys[lo] for lo in bounds[1:-1]]
+        levels = 0
+        while len(level) > 1:
+            n = len(level)
+            count = -(-n // (fanout + 1))
+            bounds = [i * n // count for i in range(count + 1)]
+            level = [Branch(separators[lo:hi - 1], level[lo:hi])
+                     for lo, hi in zip(bounds, bounds[1:])]
+            separators = [separators[lo - 1] for lo in bounds[1:-1]]
+            levels += 1
+        self.root = level[0]
+        self._levels = levels
+        self._len = len(items)
+        self._version += 1
+
+    def clear(self) -> None:
+        self._load_sorted([])
+
+
+class BTreeCursor(Cursor):
+    """
+    Cursor of a B-tree: the path of (branch, child index) pairs down to
+    a leaf, the leaf and the position of the element in it.
+    """
+    __slots__ = ('_index',)
+
+    def _reset(self) -> None:
+        self._version = self._tree._version
+        self._path = []
+        self._node = None
+        self._index = 0
+
+    def _current(self):
+        self._check()
+        if self._node is None:
+            raise ValueError('empty cursor')
+        return self._tree._item(self._node, self._index)
+
+    def _descend_last(self, side: int) -> None:
+        tree = self._tree
+        if len(tree):
+            self._path, self._node = tree._edge(side)
+            self._index = len(self._node.keys) - 1 if side else 0
+
+    def _seek(self, key) -> bool:
+        tree = self._tree
+        self._path, leaf = tree._path_to(key)
+        index = bisect_left(leaf.keys, key)
+        if index == len(leaf.keys):
+            leaf, index = tree._next_leaf(self._path, 1), 0
+        self._node, self._index = leaf, index
+        return leaf is not None and not key < leaf.keys[index] \
+            and key == key
+
+    def _step(self, side: int) -> None:
+        self._current()
+        index = self._index + (1 if side else -1)
+        if 0 <= index < len(self._node.keys):
+            self._index = index
+            return
+        leaf = self._tree._next_leaf(self._path, side)
+        self._node = leaf
+        self._index = 0 if side or leaf is None else len(leaf.keys) - 1
+
+
+class BTreeStatsEngine(bin_tree.StatsEngine):
+    """
+    Stats engine of the B-trees, counting the splits, merges and moves
+    of elements between siblings.
+    """
+    def _instrument(self, stats) -> None:
+        if stats is None:
+            del self._plain_node_class
+        else:
+            self._plain_node_class = self.nodeClass
+
+    def _divide(self, node):
+        self._stats.adjusts += 1
+        return super()._divide(node)
+
+    def _merge(self, parent: Branch, index: int) -> None:
+        self._stats.adjusts += 1
+        super()._merge(parent, index)
+
+    def _shift(self, left, right, separator: CT, side: int) -> CT:
+        self._stats.rotations += 1
+        return super()._shift(left, right, separator, side)
+
+
+class TreeSet(BTree, bin_tree.TreeSet):
+    """B-tree TreeSet, see BTree."""
+
+    def __init__(self, items=tuple(), node_class=None, key=None,
+                 fanout: Optional[int] = None):
+        """
+        :param items: an iterable of elements
+        :param node_class: Node, or ValueNode with a key function
+        :param key: function computing the sort key of an element
+        :param fanout: the maximum number of keys in a node, 64 by
+            default
+        :raises ValueError: if fanout is less than 2
+        """
+        self._set_fanout(fanout)
+        super().__init__(items, node_class, key)
+
+
+class TreeDict(BTree, bin_tree.TreeDict):
+    """B-tree TreeDict, see BTree."""
+
+    def __init__(self, items=(), node_class=ValueNode, key=None,
+                 fanout: Optional[int] = None, **kwargs):
+        """
+        :param items: a mapping or an iterable of (key, value) pairs
+        :param node_class: ValueNode or a subclass
+        :param key: function computing the sort key of a mapping key
+        :param fanout: the maximum number of keys in a node, 64 by
+            default
+        :param kwargs: additional items
+        :raises ValueError: if fanout is less than 2
+        """
+        self._set_fanout(fanout)
+        super().__init__(items, node_class, key, **kwargs)
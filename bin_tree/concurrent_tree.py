@@ -0,0 +1,432 @@
+#  Copyright (c) 2021  SBA - MIT License
+
+"""
+Thread-safe sorted mapping: a tree shared by threads behind a
+readers-writer lock.
+"""
+
+import threading
+from collections.abc import MutableMapping, ItemsView, ValuesView
+from contextlib import contextmanager
+from itertools import islice
+from typing import Optional, Tuple
+
+from .bin_tree import CT, _BATCH, AsyncBatches, PersistentTree, _missing
+from . import avl_tree
+
+# number of elements read under one read lock by the checked iterators
+_CHUNK = 64
+
+
+class RWLock:
+    """
+    Readers-writer lock: any number of readers, or a single writer.
+
+    Writers have priority: a new reader waits while a writer waits, so
+    that a steady flow of readers cannot starve them. A thread holding
+    the lock may take it again, and the writer may also read. A reader
+    cannot take the write lock, as two readers doing so would wait for
+    each other.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._condition = threading.Condition(self._mutex)
+        self._readers = 0  # number of reading threads
+        self._waiting = 0  # number of waiting writers
+        self._writer = None  # ident of the writing thread
+        self._depth = 0  # nested acquisitions by the writer
+        self._local = threading.local()  # .reads: nested reads of a thread
+
+    def acquire_read(self) -> None:
+        if self._writer == threading.get_ident():
+            self._depth += 1
+            return
+        local = self._local
+        reads = getattr(local, 'reads', 0)
+        if not reads:
+            with self._mutex:
+                while self._writer is not None or self._waiting:
+                    self._condition.wait()
+                self._readers += 1
+        local.reads = reads + 1
+
+    def release_read(self) -> None:
+        if self._writer == threading.get_ident():
+            self._depth -= 1
+            return
+        local = self._local
+        local.reads -= 1
+        if not local.reads:
+            with self._mutex:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    def acquire_write(self) -> None:
+        """
+        :raises RuntimeError: if the thread holds the read lock
+        """
+        me = threading.get_ident()
+        if self._writer == me:
+            self._depth += 1
+            return
+        if getattr(self._local, 'reads', 0):
+            raise RuntimeError('cannot write while holding the read lock')
+        with self._condition:
+            self._waiting += 1
+            while self._writer is not None or self._readers:
+                self._condition.wait()
+            self._waiting -= 1
+            self._writer = me
+            self._depth = 1
+
+    def release_write(self) -> None:
+        if self._writer != threading.get_ident():
+            raise RuntimeError('release of a write lock not held')
+        self._depth -= 1
+        if not self._depth:
+            with self._condition:
+                self._writer = None
+                self._condition.notify_all()
+
+    @contextmanager
+    def read(self):
+        """Context manager holding the read lock."""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        """Context manager holding the write lock."""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class ConcurrentTreeDict(MutableMapping):
+    """
+    Sorted mapping which threads can share.
+
+    It wraps a TreeDict: lookups hold a read lock, so that they run side
+    by side, and changes hold the write lock. A batch of changes is made
+    under a single write lock with writing.
+
+    By default the tree is an AVL PersistentTreeDict, whose iterators
+    (iter, irange, the views...) walk an O(1) snapshot: they see the
+    elements of when they started and never hold the lock. Other trees
+    are walked by chunks read under the read lock, and the iterators
+    raise RuntimeError after a change of the tree. A splay tree which
+    splays on lookups is read under the write lock.
+    """
+
+    def __init__(self, items=(), tree_class: Optional[type] = None,
+                 **kwargs):
+        """
+        :param items: a mapping or an iterable of (key, value) pairs
+        :param tree_class: class of the wrapped tree, an AVL
+            PersistentTreeDict by default
+        :param kwargs: other parameters of the tree class, such as key
+        """
+        self._tree = (tree_class or avl_tree.PersistentTreeDict)(
+            items, **kwargs)
+        self._lock = RWLock()
+        if getattr(self._tree, 'splay_lookups', False):
+            # the lookups of a splay tree restructure it: they must not
+            # run side by side
+            self._acquire_read = self._lock.acquire_write
+            self._release_read = self._lock.release_write
+        else:
+            self._acquire_read = self._lock.acquire_read
+            self._release_read = self._lock.release_read
+
+    @contextmanager
+    def reading(self):
+        """
+        Holds the read lock for a batch of lookups, made on the yielded
+        tree without further locking. The tree must not be changed.
+        """
+        self._acquire_read()
+        try:
+            yield self._tree
+        finally:
+            self._release_read()
+
+    @contextmanager
+    def writing(self):
+        """
+        Holds the write lock for a batch of changes, made on the yielded
+        tree without further locking. The methods of this mapping can
+        also be used by the thread.
+        """
+        with self._lock.write():
+            yield self._tree
+
+    def snapshot(self):
+        """
+        Returns a copy of the wrapped tree, in O(1) for persistent trees
+        and O(n) for others, that can be read without lock.
+        """
+        self._acquire_read()
+        try:
+            # a persistent snapshot only renews the token of the tree,
+            # which concurrent readers may do in any order
+            if isinstance(self._tree, PersistentTree):
+                return self._tree.snapshot()
+            tree = self._tree._empty()
+            tree._load_sorted(list(map(self._tree._node_item,
+                                       self._tree._walk())))
+            return tree
+        finally:
+            self._release_read()
+
+    def _iterate(self, walk, chunk: int = _CHUNK):
+        """
+        Protected method returning walk(tree), an iterator over the
+        tree, safe to use while other threads change the mapping.
+
+        :param chunk: number of elements read under one read lock
+        """
+        self._acquire_read()
+        try:
+            if isinstance(self._tree, PersistentTree):
+                return walk(self._tree.snapshot())
+            iterator = walk(self._tree)
+        finally:
+            self._release_read()
+        return self._chunks(iterator, chunk)
+
+    def _chunks(self, iterator, size: int):
+        """Protected generator reading iterator by chunks under lock."""
+        while True:
+            self._acquire_read()
+            try:
+                chunk = list(islice(iterator, size))
+            finally:
+                self._release_read()
+            yield from chunk
+            if len(chunk) < size:
+                return
+
+    def __len__(self) -> int:
+        return len(self._tree)
+
+    def __iter__(self):
+        return self._iterate(iter)
+
+    def __reversed__(self):
+        return self._iterate(reversed)
+
+    def __contains__(self, key) -> bool:
+        self._acquire_read()
+        try:
+            return key in self._tree
+        finally:
+            self._release_read()
+
+    def __getitem__(self, key: CT):
+        self._acquire_read()
+        try:
+            return self._tree[key]
+        finally:
+            self._release_read()
+
+    def __setitem__(self, key: CT, value) -> None:
+        self._lock.acquire_write()
+        try:
+            self._tree[key] = value
+        finally:
+            self._lock.release_write()
+
+    def __delitem__(self, key: CT) -> None:
+        self._lock.acquire_write()
+        try:
+            del self._tree[key]
+        finally:
+            self._lock.release_write()
+
+    def _read(self, name: str, *args):
+        """Protected method calling a method of the tree under read lock."""
+        self._acquire_read()
+        try:
+            return getattr(self._tree, name)(*args)
+        finally:
+            self._release_read()
+
+    def _write(self, name: str, *args):
+        """Protected method calling a method of the tree under write lock."""
+        self._lock.acquire_write()
+        try:
+            return getattr(self._tree, name)(*args)
+        finally:
+            self._lock.release_write()
+
+    def contains_many(self, keys):
+        """
+        Tells whether each key of a batch is in the mapping, under one
+        read lock, see BinTree.contains_many.
+        """
+        return self._read('contains_many', keys)
+
+    def get_many(self, keys, default=None):
+        """
+        Returns the value of each key of a batch, under one read lock,
+        see TreeDict.get_many.
+        """
+        return self._read('get_many', keys, default)
+
+    def setmany(self, items) -> None:
+        """
+        Inserts or updates a batch of items under one write lock, see
+        TreeDict.setmany.
+        """
+        self._write('setmany', items)
+
+    def floor(self, key: CT) -> Optional[Tuple]:
+        """Returns the item with the greatest key at most key, or None."""
+        return self._read('floor', key)
+
+    def lower(self, key: CT) -> Optional[Tuple]:
+        """Returns the item with the greatest key less than key, or None."""
+        return self._read('lower', key)
+
+    def ceiling(self, key: CT) -> Optional[Tuple]:
+        """Returns the item with the least key at least key, or None."""
+        return self._read('ceiling', key)
+
+    def higher(self, key: CT) -> Optional[Tuple]:
+        """Returns the item with the least key greater than key, or None."""
+        return self._read('higher', key)
+
+    def min(self) -> Tuple:
+        """
+        Returns the item with the least key.
+
+        :raises ValueError: if the mapping is empty
+        """
+        return self._read('min')
+
+    def max(self) -> Tuple:
+        """
+        Returns the item with the greatest key.
+
+        :raises ValueError: if the mapping is empty
+        """
+        return self._read('max')
+
+    def pop_min(self) -> Tuple:
+        """
+        Removes and returns the item with the least key.
+
+        :raises KeyError: if the mapping is empty
+        """
+        return self._write('pop_min')
+
+    def pop_max(self) -> Tuple:
+        """
+        Removes and returns the item with the greatest key.
+
+        :raises KeyError: if the mapping is empty
+        """
+        return self._write('pop_max')
+
+    def pop(self, key: CT, default=_missing):
+        self._lock.acquire_write()
+        try:
+            if default is _missing:
+                return self._tree.pop(key)
+            return self._tree.pop(key, default)
+        finally:
+            self._lock.release_write()
+
+    def popitem(self) -> Tuple:
+        return self._write('popitem')
+
+    def setdefault(self, key: CT, default=None):
+        return self._write('setdefault', key, default)
+
+    def update(self, other=(), **kwargs) -> None:
+        """Inserts or updates a batch of items under one write lock."""
+        self._lock.acquire_write()
+        try:
+            self._tree.update(other, **kwargs)
+        finally:
+            self._lock.release_write()
+
+    def clear(self) -> None:
+        self._write('clear')
+
+    def irange(self, lo: Optional[CT] = None, hi: Optional[CT] = None,
+               inclusive: Tuple[bool, bool] = (True, False),
+               reverse: bool = False):
+        """
+        Iterates over the keys between two bounds, see BinTree.irange.
+        """
+        return self._iterate(
+            lambda tree: tree.irange(lo, hi, inclusive, reverse))
+
+    def irange_values(self, lo: Optional[CT] = None, hi: Optional[CT] = None,
+                      inclusive: Tuple[bool, bool] = (True, False),
+                      reverse: bool = False):
+        """Same as irange but iterates over the values."""
+        return self._iterate(
+            lambda tree: tree.irange_values(lo, hi, inclusive, reverse))
+
+    def irange_items(self, lo: Optional[CT] = None, hi: Optional[CT] = None,
+                     inclusive: Tuple[bool, bool] = (True, False),
+                     reverse: bool = False):
+        """Same as irange but iterates over the (key, value) pairs."""
+        return self._iterate(
+            lambda tree: tree.irange_items(lo, hi, inclusive, reverse))
+
+    def iter_batches(self, size: int = _BATCH, reverse: bool = False):
+        """
+        Iterates over the keys by lists of at most size keys, see
+        BinTree.iter_batches. Without snapshot, every batch is read under
+        one read lock.
+        """
+        if size < 1:
+            raise ValueError('batch size must be at least 1')
+        return self._iterate(
+            lambda tree: tree.iter_batches(size, reverse), 1)
+
+    def items_batches(self, size: int = _BATCH, reverse: bool = False):
+        """Same as iter_batches but iterates over lists of items."""
+        if size < 1:
+            raise ValueError('batch size must be at least 1')
+        return self._iterate(
+            lambda tree: tree.items_batches(size, reverse), 1)
+
+    def aiter_batches(self, size: int = _BATCH, reverse: bool = False
+                      ) -> AsyncBatches:
+        """
+        Asynchronous iterator over the batches of iter_batches, letting
+        the asyncio event loop run between two batches.
+        """
+        return AsyncBatches(self.iter_batches(size, reverse))
+
+    def aitems_batches(self, size: int = _BATCH, reverse: bool = False
+                       ) -> AsyncBatches:
+        """Same as aiter_batches but iterates over lists of items."""
+        return AsyncBatches(self.items_batches(size, reverse))
+
+    def values(self) -> 'ConcurrentValuesView':
+        return ConcurrentValuesView(self)
+
+    def items(self) -> 'ConcurrentItemsView':
+        return ConcurrentItemsView(self)
+
+
+class ConcurrentValuesView(ValuesView):
+    def __iter__(self):
+        return self._mapping._iterate(lambda tree: iter(tree.values()))
+
+
+class ConcurrentItemsView(ItemsView):
+    def __iter__(self):
+        return self._mapping._iterate(lambda tree: iter(tree.items()))
@@ -0,0 +1,398 @@
+#  Copyright (c) 2021  SBA - MIT License
+
+import io
+import mmap
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping, Set, ValuesView, ItemsView
+from functools import partial
+from typing import Optional, Tuple
+
+from .bin_tree import (CT, _BATCH, _KEYED, AsyncBatches, _Column,
+                       _as_array, _first, _is_numeric_array, _read_exact,
+                       _read_header, _read_column, _sorted_probes,
+                       _sorted_unique, _write_dump, numpy)
+from . import bin_tree, avl_tree
+
+
+class FrozenTree:
+    """
+    Read-only sorted container searched by bisection in packed columns.
+
+    The keys are kept sorted in one flat column, and the values of a
+    mapping in a parallel one, using the binary format of BinTree.dump.
+    Int and float columns are arrays of 8 bytes numbers that the C
+    bisection walks without building any node, str, bytes and other
+    objects are decoded on each access.
+
+    When opened from a file, the file is memory mapped: nothing is
+    loaded at open, and the processes opening the same file share its
+    pages through the OS page cache.
+    """
+    _width = 1  # number of columns
+    _tree_class = bin_tree.BinTree  # trees whose columns can be copied
+    _thaw_class = avl_tree.TreeSet
+
+    def __init__(self, items=()):
+        """
+        :param items: a tree, or an iterable of elements in any order,
+            the last one winning for a repeated key
+        """
+        if isinstance(items, self._tree_class) and items.key is None:
+            columns = items._columns()
+        else:
+            columns = self._sorted_columns(items)
+        fd = io.BytesIO()
+        _write_dump(fd, columns, 0)
+        self._mmap = None
+        self._map(memoryview(fd.getvalue()))
+
+    # noinspection PyMethodMayBeStatic
+    def _sorted_columns(self, items) -> list:
+        """Protected method returning the columns of any elements."""
+        return [_sorted_unique(list(items))]
+
+    @classmethod
+    def open(cls, path) -> 'FrozenTree':
+        """
+        Memory maps a file written by the dump method of a tree of the
+        same kind, or of a frozen tree.
+
+        :param path: path of the file
+        :raises ValueError: if the file was not written by a tree of the
+            same kind without key function
+        """
+        with open(path, 'rb') as fd:
+            cls._check_header(partial(_read_exact, fd))
+            mapped = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        tree = cls.__new__(cls)
+        tree._mmap = mapped
+        tree._map(memoryview(mapped))
+        return tree
+
+    @classmethod
+    def _check_header(cls, read) -> int:
+        """
+        Protected method reading the header of a dump.
+
+        :return: the number of rows
+        """
+        width, flags, count = _read_header(read)
+        if width != cls._width:
+            raise ValueError('tree file of another kind')
+        if flags & _KEYED:
+            raise ValueError('tree file sorted by a key function')
+        return count
+
+    def _map(self, buffer: memoryview) -> None:
+        """Protected method reading the columns from a dump."""
+        position = 0
+
+        def read(size: int) -> memoryview:
+            nonlocal position
+            if position + size > len(buffer):
+                raise ValueError('truncated tree file')
+            position += size
+            return buffer[position - size:position]
+
+        self._buffer = buffer
+        count = self._check_header(read)
+        self._columns = [_read_column(read, count)
+                         for _ in range(self._width)]
+        self._keys = self._columns[0]
+
+    def close(self) -> None:
+        """Unmaps the file of an opened tree, which can no longer be used."""
+        self._columns = [()] * self._width
+        self._keys = ()
+        self._buffer = memoryview(b'')
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self) -> 'FrozenTree':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def dump(self, fp) -> None:
+        """Writes the tree to a binary file, in the format of dump."""
+        fp.write(self._buffer)
+
+    def _rows(self) -> list:
+        """Protected method returning the elements as a list."""
+        return self._keys.tolist()
+
+    def thaw(self, tree_class: Optional[type] = None) -> bin_tree.BinTree:
+        """
+        Returns a mutable copy, built in O(n).
+
+        :param tree_class: class of the copy, by default the AVL one
+        """
+        return (tree_class or self._thaw_class)(self._rows())
+
+    def __reduce__(self):
+        return self.__class__, (self._rows(),)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __reversed__(self):
+        return reversed(self._keys)
+
+    def __contains__(self, key) -> bool:
+        keys = self._keys
+        index = bisect_left(keys, key)
+        return index < len(keys) and not key < keys[index] and key == key
+
+    def select(self, index: int):
+        """
+        Returns the element at a position.
+
+        :raises IndexError: if index is out of range
+        """
+        return self._keys[index]
+
+    def _export(self, index: int):
+        return self.select(index) if 0 <= index < len(self._keys) else None
+
+    def floor(self, key: CT):
+        """Returns the greatest element at most key, or None."""
+        return self._export(bisect_right(self._keys, key) - 1)
+
+    def lower(self, key: CT):
+        """Returns the greatest element less than key, or None."""
+        return self._export(bisect_left(self._keys, key) - 1)
+
+    def ceiling(self, key: CT):
+        """Returns the least element at least key, or None."""
+        return self._export(bisect_left(self._keys, key))
+
+    def higher(self, key: CT):
+        """Returns the least element greater than key, or None."""
+        return self._export(bisect_right(self._keys, key))
+
+    def min(self):
+        """
+        Returns the least element.
+
+        :raises ValueError: if the tree is empty
+        """
+        if not self._keys:
+            raise ValueError('min() of an empty tree')
+        return self.select(0)
+
+    def max(self):
+        """
+        Returns the greatest element.
+
+        :raises ValueError: if the tree is empty
+        """
+        if not self._keys:
+            raise ValueError('max() of an empty tree')
+        return self.select(-1)
+
+    def rank(self, key: CT) -> int:
+        """Returns the number of keys less than key."""
+        return bisect_left(self._keys, key)
+
+    def _indexes(self, lo, hi, inclusive, reverse) -> range:
+        keys = self._keys
+        start = 0 if lo is None else (
+            bisect_left if inclusive[0] else bisect_right)(keys, lo)
+        stop = len(keys) if hi is None else (
+            bisect_right if inclusive[1] else bisect_left)(keys, hi)
+        indexes = range(start, max(start, stop))
+        return indexes[::-1] if reverse else indexes
+
+    def irange(self, lo: Optional[CT] = None, hi: Optional[CT] = None,
+               inclusive: Tuple[bool, bool] = (True, False),
+               reverse: bool = False):
+        """
+        Iterates over the keys between two bounds.
+
+        :param lo: lower bound, None for no lower bound
+        :param hi: upper bound, None for no upper bound
+        :param inclusive: whether lo and hi are part of the range
+        :param reverse: if True, iterate in descending order
+        """
+        return map(self._keys.__getitem__,
+                   self._indexes(lo, hi, inclusive, reverse))
+
+    def _rows_of(self, keys) -> list:
+        """
+        Protected method finding a batch of keys, sorted then bisected
+        each from the row of the previous one. A NumPy array of numbers
+        is searched in a numeric column by numpy.searchsorted.
+
+        :return: the row of each key or -1, in the order of keys
+        """
+        column = self._keys
+        if _is_numeric_array(keys) and not isinstance(column, _Column):
+            if not len(column):
+                return [-1] * len(keys)
+            rows = numpy.asarray(column)
+            found = numpy.searchsorted(rows, keys)
+            matches = rows[numpy.minimum(found, len(rows) - 1)] == keys
+            return numpy.where(matches, found, -1).tolist()
+        search, order = _sorted_probes(keys)
+        result = [-1] * len(keys)
+        row, count = 0, len(column)
+        for position, key in zip(order, search):
+            row = bisect_left(column, key, row)
+            if row < count and not key < column[row]:
+                result[position] = row
+        return result
+
+    def contains_many(self, keys):
+        """
+        Tells whether each key of a batch is in the tree.
+
+        :param keys: an iterable of keys, or a NumPy array of numbers
+        :return: a list of booleans in the order of keys, a NumPy array
+            for a NumPy array of keys
+        """
+        if not _is_numeric_array(keys):
+            keys = list(keys)
+        return _as_array(keys, [row >= 0 for row in self._rows_of(keys)],
+                         bool)
+
+    def _batches(self, columns: list, size: int, reverse: bool):
+        """
+        Protected method returning an iterator over tuples of lists of at
+        most size rows of the columns, sliced from the columns.
+
+        :raises ValueError: if size is less than 1
+        """
+        if size < 1:
+            raise ValueError('batch size must be at least 1')
+        count = len(self._keys)
+        if reverse:
+            return (tuple(column[max(0, stop - size):stop].tolist()[::-1]
+                          for column in columns)
+                    for stop in range(count, 0, -size))
+        return (tuple(column[start:start + size].tolist()
+                      for column in columns)
+                for start in range(0, count, size))
+
+    def iter_batches(self, size: int = _BATCH, reverse: bool = False):
+        """
+        Iterates over the keys by lists of at most size keys.
+
+        :param size: the number of keys of a batch, all but the last one
+            being full
+        :param reverse: if True, iterate in descending order
+        """
+        return map(_first, self._batches([self._keys], size, reverse))
+
+    def aiter_batches(self, size: int = _BATCH, reverse: bool = False
+                      ) -> AsyncBatches:
+        """
+        Asynchronous iterator over the batches of iter_batches, letting
+        the asyncio event loop run between two batches.
+        """
+        return AsyncBatches(self.iter_batches(size, reverse))
+
+
+class FrozenTreeSet(FrozenTree, Set):
+    """Read-only sorted set. Set operations return frozen sets."""
+
+    _tree_class = bin_tree.TreeSet
+
+    def __hash__(self):
+        return self._hash()
+
+
+class FrozenTreeDict(FrozenTree, Mapping):
+    """
+    Read-only sorted mapping. The navigation methods return (key, value)
+    pairs.
+    """
+    _width = 2
+    _tree_class = bin_tree.TreeDict
+    _thaw_class = avl_tree.TreeDict
+
+    def _sorted_columns(self, items) -> list:
+        if isinstance(items, Mapping):
+            items = items.items()
+        rows = _sorted_unique(list(items), _first)
+        return [[k for k, _ in rows], [v for _, v in rows]]
+
+    def _map(self, buffer: memoryview) -> None:
+        super()._map(buffer)
+        self._values = self._columns[1]
+
+    def close(self) -> None:
+        self._values = ()
+        super().close()
+
+    def _rows(self) -> list:
+        return list(zip(self._keys, self._values))
+
+    def __getitem__(self, key: CT):
+        keys = self._keys
+        index = bisect_left(keys, key)
+        if index < len(keys) and not key < keys[index] and key == key:
+            return self._values[index]
+        raise KeyError(key)
+
+    def select(self, index: int) -> Tuple:
+        return self._keys[index], self._values[index]
+
+    def irange_values(self, lo: Optional[CT] = None, hi: Optional[CT] = None,
+                      inclusive: Tuple[bool, bool] = (True, False),
+                      reverse: bool = False):
+        """Same as irange but iterates over the values."""
+        return map(self._values.__getitem__,
+                   self._indexes(lo, hi, inclusive, reverse))
+
+    def irange_items(self, lo: Optional[CT] = None, hi: Optional[CT] = None,
+                     inclusive: Tuple[bool, bool] = (True, False),
+                     reverse: bool = False):
+        """Same as irange but iterates over the (key, value) pairs."""
+        return map(self.select, self._indexes(lo, hi, inclusive, reverse))
+
+    def get_many(self, keys, default=None):
+        """
+        Returns the value of each key of a batch, found like
+        contains_many.
+
+        :param keys: an iterable of keys, or a NumPy array of numbers
+        :param default: the value returned for the missing keys
+        :return: a list of values in the order of keys, a NumPy array
+            for a NumPy array of keys
+        """
+        if not _is_numeric_array(keys):
+            keys = list(keys)
+        values = self._values
+        return _as_array(keys, [default if row < 0 else values[row]
+                                for row in self._rows_of(keys)])
+
+    def items_batches(self, size: int = _BATCH, reverse: bool = False):
+        """Same as iter_batches but iterates over lists of items."""
+        return (list(zip(keys, values)) for keys, values in self._batches(
+            [self._keys, self._values], size, reverse))
+
+    def aitems_batches(self, size: int = _BATCH, reverse: bool = False
+                       ) -> AsyncBatches:
+        """Same as aiter_batches but iterates over lists of items."""
+        return AsyncBatches(self.items_batches(size, reverse))
+
+    def values(self) -> 'FrozenValuesView':
+        return FrozenValuesView(self)
+
+    def items(self) -> 'FrozenItemsView':
+        return FrozenItemsView(self)
+
+
+class FrozenValuesView(ValuesView):
+    def __iter__(self):
+        return iter(self._mapping._values)
+
+
+class FrozenItemsView(ItemsView):
+    def __iter__(self):
+        return zip(self._mapping._keys, self._mapping._values)
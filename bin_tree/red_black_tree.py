@@ -1,6 +1,6 @@
 #  Copyright (c) 2021  SBA - MIT License
 
-from .bin_tree import Node  # , ValueNode
+from .bin_tree import Node, SizedBase, PersistentBase
 from . import bin_tree
 from enum import Enum
 from typing import Optional, Tuple, cast
@@ -11,28 +11,39 @@ class Color(Enum):
     BLACK = 1
 
 
-class RBNode(Node):
+class RBBase(Node):
+    """
+    Red-black balancing logic.
+
+    This class declares no slot of its own so that it can be combined
+    with ValueNode. Concrete classes must provide a ``color`` slot, which
+    holds one of the two shared Color members.
+    """
+    __slots__ = ()
+
     def __init__(self, key):
         super().__init__(key)
         self.color = Color.RED
 
-    def adjust(self, child: Optional['RBNode'], delta) -> Tuple['RBNode', int]:
+    def adjust(self, side: int, delta) -> Tuple['RBBase', int]:
         if delta == 1:  # RED addition
             return self, 2 if self.color == Color.RED else 0
+        if side:
+            child, other = self.right, self.left
+        else:
+            child, other = self.left, self.right
         if delta == 2:  # RED violation on child
-            other = self._other_child(child)
             if other and (other.color == Color.RED):
                 self.color = Color.RED
                 self.left.color = self.right.color = Color.BLACK
-                return self, 0
+                return self, 1
             else:
-                side = child is self.right
                 if not child.child[side] or child.child[side].color == Color.BLACK:
-                    self.child[side] = child = child._rotate(side)
+                    child = child._rotate(side)
+                    self.set_child(side, child)
                 self._rotate(1 - side)
                 child.child[side].color = Color.BLACK
-                return child, 0
-        other = self._other_child(child)
+                return child, 1
         if delta == -1:  # child removal
             if child is not None and child.color == Color.RED:
                 # was black with red child
@@ -48,13 +59,13 @@ class RBNode(Node):
                 node = self._paint_red(other)
                 return node, 0
             if other.color == Color.RED:  # sibling is red
-                side = int(child is self.right)
                 other = self._rotate(side)
                 other.color = Color.BLACK
-                other.child[side] = self._paint_red(cast(
-                    'RBNode', self.child[1 - side]))
+                other.set_child(side, self._paint_red(cast(
+                    'RBBase', self.child[1 - side])))
                 return other, 0
-            if any(_ and _.color == Color.RED for _ in other.child):
+            if ((other.left and other.left.color == Color.RED)
+                    or (other.right and other.right.color == Color.RED)):
                 # sibling is black with at least a red child
                 other = self._paint_red(other)
                 other.color = Color.BLACK
@@ -62,15 +73,15 @@ class RBNode(Node):
             # sibling is black with 2 black children
             other.color = Color.RED
             return self, -2
-        return self, 2 if (self.color == Color.RED
-                           and child.color == Color.RED) else 0
+        return self, 0
 
-    def _paint_red(self, child: 'RBNode') -> 'RBNode':
+    def _paint_red(self, child: 'RBBase') -> 'RBBase':
         child.color = Color.RED
         side = int(child is self.right)
         if child.child[side] is None or child.child[side].color == Color.BLACK:
             if child.child[1 - side] and child.child[1 - side].color == Color.RED:
-                self.child[side] = child = child._rotate(side)
+                child = child._rotate(side)
+                self.set_child(side, child)
             else:
                 return self
         child.child[side].color = Color.BLACK
@@ -79,39 +90,80 @@ class RBNode(Node):
     def side(self) -> int:
         return 1 if self.right and self.right.color == Color.RED else -1
 
-    def _other_child(self, child) -> 'RBNode':
-        return self.child[child is self.left]
-
     def is_valid(self) -> bool:
         def black_height(node):
             if node is None:
                 return 0
-            child_height = black_height(node.child[0])
+            child_height = black_height(node.left)
             return int(node.color is Color.BLACK) + child_height
-        
+
         if self.color == Color.RED:
-            for _ in self.child:
+            for _ in (self.left, self.right):
                 if _ and _.color == Color.RED:
                     return False
-        return black_height(self.child[0]) == black_height(self.child[1])
+        return black_height(self.left) == black_height(self.right)
 
 
 class RBTree(bin_tree.BinTree):
-    def _insert(self, node: RBNode, *args) -> Tuple['RBNode', int]:
-        root = node is self.root
-        node, delta = super(RBTree, self)._insert(node, *args)
-        if root:
-            node.color = Color.BLACK
-        return cast('RBNode', node), delta
+    def _fix_path(self, path, child: Optional[RBBase], delta: int
+                  ) -> Tuple[Optional['RBBase'], int]:
+        node, delta = super(RBTree, self)._fix_path(path, child, delta)
+        if node is not None:
+            node.color = Color.BLACK  # the root is always black
+        return cast('RBBase', node), delta
 
     def black_height(self) -> int:
+        return self._tree_height(self.root)
+
+    def _tree_height(self, node: Optional[RBBase]) -> int:
         h = 0
-        node = self.root
         while node is not None:
             if Color.BLACK == node.color:
                 h += 1
             node = node.left
         return h
+
+    def _child_height(self, node: RBBase, height: int, side: int) -> int:
+        return height - 1 if node.color == Color.BLACK else height
+
+    def _join(self, left: Optional[RBBase], hl: int, node: RBBase,
+              right: Optional[RBBase], hr: int) -> Tuple[RBBase, int]:
+        # subtrees from a split may have a red root
+        if left is not None and left.color == Color.RED:
+            left.color = Color.BLACK
+            hl += 1
+        if right is not None and right.color == Color.RED:
+            right.color = Color.BLACK
+            hr += 1
+        if hl == hr:
+            node.left, node.right = left, right
+            node.color = Color.BLACK
+            node.fix_init(0, 0)
+            return node, hl + 1
+        # graft the lower tree as a red node on the spine of the higher one
+        # under a black node of the same black height, and fix as after an
+        # insertion
+        path = []
+        if hl > hr:
+            child, height = left, hl
+            while child is not None and (child.color == Color.RED
+                                         or height != hr):
+                path.append((child, 1))
+                height = self._child_height(child, height, 1)
+                child = child.right
+            node.left, node.right = child, right
+        else:
+            child, height = right, hr
+            while child is not None and (child.color == Color.RED
+                                         or height != hl):
+                path.append((child, 0))
+                height = self._child_height(child, height, 0)
+                child = child.left
+            node.left, node.right = left, child
+        node.color = Color.RED
+        node.fix_init(0, 0)
+        root, delta = self._fix_path(path, node, 1)
+        return root, max(hl, hr) + (delta == 1)
     
     def is_valid(self) -> bool:
         if self.root and (not self.root.is_valid()
@@ -119,26 +171,110 @@ class RBTree(bin_tree.BinTree):
             return False
         return super(RBTree, self).is_valid()
 
-    def _build(self, items, hint) -> Tuple[Optional['Node'], int]:
+    def _build(self, items, lo: int, hi: int, hint: int
+               ) -> Tuple[Optional['Node'], int]:
         if hint == 0:
-            hint = int.bit_length(len(items))
-            if len(items) == 1:
+            hint = int.bit_length(hi - lo)
+            if hi - lo == 1:
                 hint = 2
-        node, cr = super()._build(items, hint)
+        node, cr = super()._build(items, lo, hi, hint)
         if hint != 1 and node is not None:
             node.color = Color.BLACK
         return node, cr
 
 
+class RBNode(RBBase):
+    __slots__ = ('color',)
+
+
 class TreeSet(RBTree, bin_tree.TreeSet):
-    def __init__(self, items=tuple(), node_class=RBNode):
-        super(TreeSet, self).__init__(items, node_class)
+    def __init__(self, items=tuple(), node_class=None, key=None):
+        if node_class is None:
+            node_class = RBNode if key is None else RBValueNode
+        super(TreeSet, self).__init__(items, node_class, key)
 
 
-class RBValueNode(bin_tree.ValueNode, RBNode):
-    pass
+class RBValueNode(bin_tree.ValueNode, RBBase):
+    __slots__ = ('color',)
 
 
 class TreeDict(RBTree, bin_tree.TreeDict):
-    def __init__(self, items=(), node_class=RBValueNode, **kwargs):
-        super(TreeDict, self).__init__(items, node_class, **kwargs)
+    def __init__(self, items=(), node_class=RBValueNode, key=None,
+                 **kwargs):
+        super(TreeDict, self).__init__(items, node_class, key, **kwargs)
+
+
+class RBSizedNode(SizedBase, RBBase):
+    __slots__ = ('color', 'size')
+
+
+class RBSizedValueNode(bin_tree.ValueNode, SizedBase, RBBase):
+    __slots__ = ('color', 'size')
+
+
+class IndexedTreeSet(bin_tree.IndexedTree, TreeSet):
+    """Red-black TreeSet with O(log n) rank, select and positional access."""
+    def __init__(self, items=tuple(), node_class=None, key=None):
+        if node_class is None:
+            node_class = RBSizedNode if key is None else RBSizedValueNode
+        super().__init__(items, node_class, key)
+
+
+class IndexedTreeDict(bin_tree.IndexedTree, TreeDict):
+    """Red-black TreeDict with O(log n) rank, select and positional access."""
+    def __init__(self, items=(), node_class=RBSizedValueNode, key=None,
+                 **kwargs):
+        super().__init__(items, node_class, key, **kwargs)
+
+
+class RBPersistentBase(PersistentBase, RBBase):
+    """
+    Red-black balancing of copy-on-write nodes.
+
+    The nodes which the balancing may recolor or rotate are copied first
+    if they are shared: on a red violation the uncle, the child and its
+    children, which may be out of the path when a subtree is grafted by
+    a join; on a removal the sibling and its children, and the children
+    of the inner one when the sibling is red.
+    """
+    __slots__ = ()
+
+    def adjust(self, side: int, delta) -> Tuple['RBBase', int]:
+        if delta == 2:
+            self._owned_child(1 - side)
+            child = self._owned_child(side)
+            child._owned_child(0)
+            child._owned_child(1)
+        elif delta < 0:
+            other = self._owned_child(1 - side)
+            if other is not None:
+                inner = other._owned_child(side)
+                other._owned_child(1 - side)
+                if inner is not None and other.color == Color.RED:
+                    inner._owned_child(0)
+                    inner._owned_child(1)
+        return super().adjust(side, delta)
+
+
+class RBPersistentNode(RBPersistentBase):
+    __slots__ = ('color', 'owner')
+
+
+class RBPersistentValueNode(bin_tree.ValueNode, RBPersistentBase):
+    __slots__ = ('color', 'owner')
+
+
+class PersistentTreeSet(bin_tree.PersistentTree, TreeSet):
+    """Red-black TreeSet with O(1) snapshots, see PersistentTree."""
+    def __init__(self, items=tuple(), node_class=None, key=None):
+        if node_class is None:
+            node_class = (RBPersistentNode if key is None
+                          else RBPersistentValueNode)
+        super().__init__(items, node_class, key)
+
+
+class PersistentTreeDict(bin_tree.PersistentTree, TreeDict):
+    """Red-black TreeDict with O(1) snapshots, see PersistentTree."""
+    def __init__(self, items=(), node_class=RBPersistentValueNode,
+                 key=None, **kwargs):
+        super().__init__(items, node_class, key, **kwargs)
@@ -0,0 +1,269 @@
+#  Copyright (c) 2021  SBA - MIT License
+
+from .bin_tree import Node, ValueNode, CT
+from . import bin_tree
+from typing import List, Optional, Tuple
+
+
+class SplayTree(bin_tree.BinTree):
+    """
+    Self-adjusting tree: every insertion, removal and lookup rotates the
+    node it reached up to the root (splaying), so that frequently used
+    keys stay near the top. Any sequence of operations costs O(log n)
+    amortized per operation, and much less when the accesses are skewed.
+
+    The nodes are plain Node or ValueNode objects, moved with
+    Node._rotate. The searches stop as soon as they meet the key, which
+    is likely to be high in the tree.
+
+    With semi_splay, a zig-zig step only rotates the grandparent and
+    goes on from the parent: the accessed node climbs half as fast, but
+    the path is still halved, with half the rotations. With
+    splay_lookups False, the lookups (in, [], floor, ceiling...) leave
+    the tree unchanged; otherwise a lookup is a change of the tree for
+    the iterators and cursors, which it invalidates.
+    """
+
+    # bring an accessed node only halfway up in zig-zig steps
+    semi_splay = False
+    # whether the lookups splay the tree
+    splay_lookups = True
+
+    def _set_options(self, semi_splay: Optional[bool],
+                     splay_lookups: Optional[bool]) -> None:
+        """Protected method setting the options which are not None."""
+        if semi_splay is not None:
+            self.semi_splay = semi_splay
+        if splay_lookups is not None:
+            self.splay_lookups = splay_lookups
+
+    def _options(self) -> dict:
+        return {'semi_splay': self.semi_splay,
+                'splay_lookups': self.splay_lookups}
+
+    def _splay(self, path: List[Tuple[Node, int]], node: Node) -> Node:
+        """
+        Protected method moving a node up towards the root.
+
+        :param path: the (node, side) pairs from the root down to the
+            parent of node, consumed
+        :return: the new root of the tree
+        """
+        if not path:
+            return node
+        self._version += 1
+        semi = self.semi_splay
+        while len(path) > 1:
+            parent, side = path.pop()
+            grand, grand_side = path.pop()
+            if side == grand_side:  # zig-zig
+                grand._rotate(1 - side)
+                node = parent if semi else parent._rotate(1 - side)
+            else:  # zig-zag
+                grand.set_child(grand_side, parent._rotate(1 - side))
+                node = grand._rotate(1 - grand_side)
+            if path:
+                ancestor, ancestor_side = path[-1]
+                ancestor.set_child(ancestor_side, node)
+        if path:  # zig
+            parent, side = path.pop()
+            node = parent._rotate(1 - side)
+        return node
+
+    def _search(self, key: CT) -> Tuple[List[Tuple[Node, int]],
+                                        Optional[Node]]:
+        """
+        Protected method looking for key, with an early exit.
+
+        :return: the (node, side) pairs from the root down to the parent
+            of the found node, or to the last node compared, and the
+            found node or None
+        """
+        path = []
+        node = self.root
+        while node is not None:
+            if key < node.key:
+                path.append((node, 0))
+                node = node.left
+            elif node.key < key:
+                path.append((node, 1))
+                node = node.right
+            elif key != key:  # NaN: less than no key, but equal to none
+                break
+            else:
+                return path, node
+        return path, None
+
+    def _access(self, path: List[Tuple[Node, int]],
+                node: Optional[Node]) -> None:
+        """
+        Protected method splaying the node found by a search, or the last
+        node compared.
+        """
+        if node is None:
+            if not path:
+                return
+            node = path.pop()[0]
+        self.root = self._splay(path, node)
+
+    def _insert(self, node: Node, *args) -> Tuple[Node, int]:
+        key = args[0]
+        path, found = self._search(key)
+        if found is not None:
+            if len(args) > 1:
+                found.value = args[1]
+            self._access(path, found)
+            return self.root, 0
+        if not path and key != key:
+            raise ValueError('unordered key: {!r}'.format(key))
+        return self._link(path, *args)
+
+    def _link(self, path, *args) -> Tuple[Node, int]:
+        self._len += 1
+        self._version += 1
+        node = self.nodeClass(*args)
+        if path:
+            parent, side = path[-1]
+            parent.set_child(side, node)
+        return self._splay(path, node), 1
+
+    def _remove(self, node: Node, key: CT) -> Tuple[Optional[Node], int]:
+        """
+        The node is replaced by its predecessor if it has two children,
+        and the parent of the node is splayed.
+        """
+        path, found = self._search(key)
+        if found is None:
+            self._access(path, None)
+            raise KeyError(key)
+        if found.left is None or found.right is None:
+            child = found.left if found.right is None else found.right
+        else:
+            parent, child = found, found.left
+            while child.right is not None:
+                parent, child = child, child.right
+            if parent is not found:
+                parent.right = child.left
+                child.left = found.left
+            child.right = found.right
+        self._len -= 1
+        self._version += 1
+        if not path:
+            return child, -1
+        parent, side = path[-1]
+        parent.set_child(side, child)
+        path.pop()
+        return self._splay(path, parent), -1
+
+    def _find(self, node, key: CT) -> Optional[Node]:
+        if not self.splay_lookups:
+            return super()._find(node, key)
+        path, found = self._search(key)
+        self._access(path, found)
+        return found
+
+    def _floor(self, key: CT, strict: bool) -> Optional[Node]:
+        if not self.splay_lookups:
+            return super()._floor(key, strict)
+        path = []
+        node = self.root
+        found, depth = None, 0
+        while node is not None:
+            if (not node.key < key) if strict else key < node.key:
+                path.append((node, 0))
+                node = node.left
+            else:
+                found, depth = node, len(path)
+                path.append((node, 1))
+                node = node.right
+        if found is not None:
+            self._access(path[:depth], found)
+        return found
+
+    def _ceiling(self, key: CT, strict: bool) -> Optional[Node]:
+        if not self.splay_lookups:
+            return super()._ceiling(key, strict)
+        path = []
+        node = self.root
+        found, depth = None, 0
+        while node is not None:
+            if (not key < node.key) if strict else node.key < key:
+                path.append((node, 1))
+                node = node.right
+            else:
+                found, depth = node, len(path)
+                path.append((node, 0))
+                node = node.left
+        if found is not None:
+            self._access(path[:depth], found)
+        return found
+
+    def _pop_last(self, side: int) -> Node:
+        """
+        The parent of the removed node is splayed, so that popping all
+        the elements costs O(n).
+        """
+        node = self.root
+        if node is None:
+            raise KeyError('pop from an empty tree')
+        path = []
+        while True:
+            child = node.right if side else node.left
+            if child is None:
+                break
+            path.append((node, side))
+            node = child
+        child = node.left if side else node.right
+        self._len -= 1
+        self._version += 1
+        if path:
+            parent = path.pop()[0]
+            parent.set_child(side, child)
+            self.root = self._splay(path, parent)
+        else:
+            self.root = child
+        return node
+
+    def is_valid(self) -> bool:
+        keys = list(map(self._node_key, self._walk()))
+        return super().is_valid() and all(
+            x < y for x, y in zip(keys, keys[1:]))
+
+
+class TreeSet(SplayTree, bin_tree.TreeSet):
+    """Splay TreeSet, see SplayTree."""
+
+    def __init__(self, items=tuple(), node_class=None, key=None,
+                 semi_splay: Optional[bool] = None,
+                 splay_lookups: Optional[bool] = None):
+        """
+        :param items: an iterable of elements
+        :param node_class: Node, or ValueNode with a key function
+        :param key: function computing the sort key of an element
+        :param semi_splay: if True, zig-zig steps only move the
+            accessed node halfway up
+        :param splay_lookups: if False, the lookups do not change the
+            tree
+        """
+        self._set_options(semi_splay, splay_lookups)
+        super().__init__(items, node_class, key)
+
+
+class TreeDict(SplayTree, bin_tree.TreeDict):
+    """Splay TreeDict, see SplayTree."""
+
+    def __init__(self, items=(), node_class=ValueNode, key=None,
+                 semi_splay: Optional[bool] = None,
+                 splay_lookups: Optional[bool] = None, **kwargs):
+        """
+        :param items: a mapping or an iterable of (key, value) pairs
+        :param node_class: ValueNode or a subclass
+        :param key: function computing the sort key of a mapping key
+        :param semi_splay: if True, zig-zig steps only move the
+            accessed node halfway up
+        :param splay_lookups: if False, the lookups do not change the
+            tree
+        :param kwargs: additional items
+        """
+        self._set_options(semi_splay, splay_lookups)
+        super().__init__(items, node_class, key, **kwargs)
@@ -0,0 +1,164 @@
+#  Copyright (c) 2021  SBA - MIT License
+
+import unittest
+import io
+import pickle
+from bin_tree.array_tree import TreeSet, TreeDict
+from bin_tree import avl_tree
+import itertools
+
+
+class Inserts(unittest.TestCase):
+    def test_7(self):
+        for i in itertools.permutations(range(1, 8)):
+            tree = TreeSet()
+            for _ in i:
+                tree.add(_)
+            expected = avl_tree.TreeSet()
+            for _ in i:
+                expected.add(_)
+            self.assertEqual(expected.root.key, tree._keys[tree.root])
+            self.assertEqual(expected.height(), tree.height())
+            self.assertEqual((1, 2, 3, 4, 5, 6, 7), tuple(tree))
+            self.assertTrue(tree.is_valid())
+
+    def test_load(self):
+        for n in range(20):
+            tree = TreeSet(range(n))
+            self.assertEqual(avl_tree.TreeSet(range(n)).height(),
+                             tree.height())
+            self.assertEqual(list(range(n)), list(tree))
+            self.assertTrue(tree.is_valid())
+
+
+class Delete(unittest.TestCase):
+    def test_rotate_shrink(self):
+        tree = TreeSet()
+        for _ in (5, 2, 8, 1, 3, 7, 9, 4, 6, 10, 11):
+            tree.add(_)
+        for _ in (6, 1):
+            tree.discard(_)
+        self.assertEqual((2, 3, 4, 5, 7, 8, 9, 10, 11), tuple(tree))
+        self.assertTrue(tree.is_valid())
+
+    def test_free_list(self):
+        tree = TreeDict((i, -i) for i in range(10))
+        for i in range(0, 10, 2):
+            del tree[i]
+        self.assertEqual(11, len(tree._keys))
+        self.assertTrue(tree.is_valid())
+        for i in range(20, 25):
+            tree[i] = -i
+        self.assertEqual(11, len(tree._keys))
+        tree[25] = -25
+        self.assertEqual(12, len(tree._keys))
+        self.assertEqual([1, 3, 5, 7, 9, 20, 21, 22, 23, 24, 25], list(tree))
+        self.assertEqual(-21, tree[21])
+        self.assertTrue(tree.is_valid())
+
+    def test_pop(self):
+        tree = TreeDict((i, str(i)) for i in range(20))
+        self.assertEqual((19, '19'), tree.pop_max())
+        self.assertEqual((0, '0'), tree.pop_min())
+        while tree:
+            tree.pop_min()
+            self.assertTrue(tree.is_valid())
+        self.assertRaises(KeyError, tree.pop_min)
+
+
+class Mapping(unittest.TestCase):
+    def test_api(self):
+        tree = TreeDict({3: 'c', 1: 'a'})
+        tree[2] = 'b'
+        self.assertEqual([(1, 'a'), (2, 'b'), (3, 'c')], list(tree.items()))
+        self.assertEqual((2, 'b'), tree.floor(2.5))
+        self.assertEqual(['b', 'c'], list(tree.irange_values(2, 4)))
+        self.assertEqual('a', tree.values()[0])
+        self.assertRaises(KeyError, tree.__getitem__, 4)
+
+    def test_nan(self):
+        nan = float('nan')
+        tree = TreeDict({1: 'a', 2: 'b', 3: 'c'})
+        self.assertRaises(KeyError, tree.__getitem__, nan)
+        self.assertNotIn(nan, tree)
+        self.assertRaises(ValueError, tree.__setitem__, nan, 'z')
+        self.assertRaises(KeyError, tree.__delitem__, nan)
+        self.assertEqual([None, 'b'], tree.get_many([nan, 2]))
+        self.assertRaises(ValueError, TreeDict().__setitem__, nan, 'z')
+        self.assertEqual([(1, 'a'), (2, 'b'), (3, 'c')], list(tree.items()))
+
+    def test_split_join(self):
+        tree = TreeDict((i, -i) for i in range(50))
+        left, right = tree.split(20)
+        self.assertEqual(0, len(tree))
+        self.assertEqual(list(range(20)), list(left))
+        self.assertEqual(list(range(20, 50)), list(right))
+        self.assertRaises(ValueError, right.join, left)
+        left.join3((19.5, 0), right)
+        self.assertEqual(51, len(left))
+        self.assertEqual((19.5, 0), left.select(20))
+        self.assertEqual(0, len(right))
+        self.assertTrue(left.is_valid())
+
+
+class Set(unittest.TestCase):
+    def test_algebra(self):
+        first, second = TreeSet(range(0, 20, 2)), TreeSet(range(0, 20, 3))
+        self.assertEqual(list(range(0, 20, 6)), list(first & second))
+        self.assertIsInstance(first | second, TreeSet)
+        first -= second
+        self.assertEqual([2, 4, 8, 10, 14, 16], list(first))
+        self.assertTrue(first.is_valid())
+
+
+class Append(unittest.TestCase):
+    def test_extend(self):
+        tree = TreeDict()
+        for i in range(100):
+            tree[i] = i
+        tree.extend((i, -i) for i in range(-1, -100, -1))
+        tree.extend((i, -i) for i in range(100, 200))
+        self.assertEqual(list(range(-99, 200)), list(tree))
+        self.assertEqual(((-99, 99), (199, -199)), (tree.min(), tree.max()))
+        self.assertTrue(tree.is_valid())
+
+    def test_batches(self):
+        tree = TreeDict((i, -i) for i in range(10))
+        del tree[5]
+        self.assertEqual([[9, 8, 7, 6], [4, 3, 2, 1], [0]],
+                         list(tree.iter_batches(4, reverse=True)))
+        self.assertEqual([[(0, 0), (1, -1)]],
+                         list(tree.items_batches(2))[:1])
+
+    def test_many(self):
+        tree = TreeDict((i, str(i)) for i in range(0, 300, 3))
+        probes = list(range(100, 0, -7))
+        self.assertEqual([str(k) if k % 3 == 0 else 'no' for k in probes],
+                         tree.get_many(probes, 'no'))
+        tree.setmany((k, k) for k in probes)
+        self.assertEqual(probes, tree.get_many(probes))
+        self.assertTrue(tree.is_valid())
+
+
+class Stats(unittest.TestCase):
+    def test_rotations(self):
+        tree = TreeSet()
+        tree.enable_stats()
+        for i in (1, 2, 3, 5, 4):
+            tree.add(i)
+        self.assertEqual(3, tree.stats()['rotations'])
+        tree.disable_stats()
+        self.assertIs(TreeSet, type(tree))
+        self.assertTrue(tree.is_valid())
+
+
+class Serialization(unittest.TestCase):
+    def test_pickle_dump(self):
+        tree = TreeDict((i, float(i)) for i in range(100))
+        copy = pickle.loads(pickle.dumps(tree))
+        self.assertEqual(list(tree.items()), list(copy.items()))
+        fd = io.BytesIO()
+        tree.dump(fd)
+        self.assertEqual(16 + 2 * (8 + 800), len(fd.getvalue()))
+        fd.seek(0)
+        self.assertEqual(tree, TreeDict.load(fd))
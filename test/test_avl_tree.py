@@ -1,8 +1,16 @@
 #  Copyright (c) 2021  SBA - MIT License
 
 import unittest
-from bin_tree.avl_tree import AVLNode, TreeSet  # , TreeDict
+import asyncio
+import pickle
+from bin_tree.avl_tree import (AVLNode, TreeSet, IndexedTreeSet,
+                               IndexedTreeDict, PersistentTreeSet,
+                               PersistentTreeDict)
 import itertools
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class RotateLeft(unittest.TestCase):
@@ -139,6 +147,15 @@ class Inserts(unittest.TestCase):
             self.assertTrue(tree.is_valid())
 
 
+class Pop(unittest.TestCase):
+    def test_pop(self):
+        tree = TreeSet(range(20))
+        self.assertEqual(19, tree.pop_max())
+        while tree:
+            tree.pop_max()
+            self.assertTrue(tree.is_valid())
+
+
 class Delete(unittest.TestCase):
     def test_low_left(self):
         tree = TreeSet()
@@ -184,6 +201,22 @@ class Delete(unittest.TestCase):
         self.assertEqual(0, tree.root.weight)
         self.assertTrue(tree.is_valid())
 
+    def test_single_child(self):
+        tree = TreeSet((1, 2))
+        tree.discard(2)
+        self.assertEqual(0, tree.root.weight)
+        self.assertEqual((1,), tuple(tree))
+        self.assertTrue(tree.is_valid())
+
+    def test_rotate_shrink(self):
+        tree = TreeSet()
+        for _ in (5, 2, 8, 1, 3, 7, 9, 4, 6, 10, 11):
+            tree.add(_)
+        for _ in (6, 1):
+            tree.discard(_)
+        self.assertEqual((2, 3, 4, 5, 7, 8, 9, 10, 11), tuple(tree))
+        self.assertTrue(tree.is_valid())
+
     def test_rotate_right(self):
         tree = TreeSet()
         for _ in (5, 3, 6, 2, 4, 7, 1):
@@ -195,5 +228,281 @@ class Delete(unittest.TestCase):
         self.assertTrue(tree.is_valid())
 
 
+class Indexed(unittest.TestCase):
+    def test_set(self):
+        tree = IndexedTreeSet(range(0, 40, 2))
+        for _ in range(1, 40, 4):
+            tree.add(_)
+        for _ in range(0, 40, 6):
+            tree.discard(_)
+        keys = sorted(tree)
+        self.assertTrue(tree.is_valid())
+        self.assertEqual(len(keys), tree.root.size)
+        self.assertEqual(keys, [tree.select(i) for i in range(len(keys))])
+        self.assertEqual([keys.index(k) for k in keys],
+                         [tree.rank(k) for k in keys])
+        self.assertEqual(keys[3:-2:3], tree[3:-2:3])
+
+    def test_dict(self):
+        tree = IndexedTreeDict((i, -i) for i in range(10))
+        del tree[4]
+        tree.pop_max()
+        self.assertTrue(tree.is_valid())
+        self.assertEqual((5, -5), tree.select(4))
+        self.assertEqual(5, tree.keys()[4])
+        self.assertEqual([-3, -5], tree.values()[3:5])
+        self.assertEqual(4, tree.rank(4))
+
+
+class SplitJoin(unittest.TestCase):
+    def test_split(self):
+        tree = TreeSet(range(100))
+        left, right = tree.split(37)
+        self.assertEqual(0, len(tree))
+        self.assertEqual(list(range(37)), list(left))
+        self.assertEqual(list(range(37, 100)), list(right))
+        self.assertEqual((37, 63), (len(left), len(right)))
+        self.assertTrue(left.is_valid() and right.is_valid())
+
+    def test_join(self):
+        left, right = TreeSet(range(3)), TreeSet(range(10, 200))
+        left.join(right)
+        self.assertEqual(0, len(right))
+        self.assertEqual(193, len(left))
+        self.assertTrue(left.is_valid())
+        right = TreeSet(range(300, 302))
+        left.join3(250, right)
+        self.assertEqual(196, len(left))
+        self.assertEqual([199, 250, 300, 301], list(left)[-4:])
+        self.assertTrue(left.is_valid())
+        with self.assertRaises(ValueError):
+            left.join(TreeSet((5,)))
+
+    def test_indexed(self):
+        tree = IndexedTreeDict((i, -i) for i in range(50))
+        left, right = tree.split(20.5)
+        self.assertEqual((21, 29), (len(left), len(right)))
+        left.join3((20.7, 0), right)
+        self.assertEqual(51, left.root.size)
+        self.assertEqual((20.7, 0), left.select(21))
+        self.assertTrue(left.is_valid())
+
+
+class KeyFunction(unittest.TestCase):
+    def test_indexed(self):
+        for cls in (TreeSet, IndexedTreeSet):
+            tree = cls(range(50), key=lambda x: -x)
+            self.assertEqual(list(range(49, -1, -1)), list(tree))
+            self.assertEqual(10, tree.rank(39))
+            self.assertEqual(39, tree[10])
+            left, right = tree.split(20)
+            self.assertEqual(list(range(49, 20, -1)), list(left))
+            self.assertTrue(left.is_valid() and right.is_valid())
+        tree = IndexedTreeDict(((i, -i) for i in range(50)),
+                               key=lambda x: -x)
+        tree[60] = -60
+        self.assertEqual((60, -60), tree.select(0))
+        self.assertEqual(-49, tree.values()[1])
+        self.assertTrue(tree.is_valid())
+
+
+class Cursors(unittest.TestCase):
+    def test_sequential(self):
+        tree = TreeSet(range(0, 1000, 10))
+        cursor = tree.first()
+        for i in range(1000):
+            cursor = tree.insert_near(cursor, i)
+            if i % 100 == 0:
+                self.assertTrue(tree.is_valid())
+        self.assertEqual(list(range(1000)), list(tree))
+        cursor = tree.find(500)
+        for i in range(500, 1000):
+            self.assertEqual(i, cursor.key)
+            tree.delete_at(cursor)
+        self.assertFalse(cursor)
+        self.assertEqual(list(range(500)), list(tree))
+        self.assertTrue(tree.is_valid())
+
+    def test_indexed(self):
+        tree = IndexedTreeDict((i, i) for i in range(100))
+        cursor = tree.find(50)
+        tree.insert_near(cursor, 50.5, 0)
+        tree.delete_at(tree.find(10))
+        self.assertEqual(50, tree.rank(50.5))
+        self.assertTrue(tree.is_valid())
+
+
+class Append(unittest.TestCase):
+    def test_ends(self):
+        tree = TreeSet()
+        for i in range(300):
+            tree.add(i)
+            tree.add(-i)
+            self.assertEqual((-i, i), (tree.min(), tree.max()))
+            if i % 50 == 0:
+                self.assertTrue(tree.is_valid())
+        tree.add(299)
+        tree.discard(299)
+        self.assertEqual(298, tree.max())
+        self.assertEqual(list(range(-299, 299)), list(tree))
+        self.assertTrue(tree.is_valid())
+
+    def test_extend(self):
+        tree = IndexedTreeDict((i, i) for i in range(10, 20))
+        tree.extend((i, -i) for i in range(20, 200))
+        tree.extend({i: -i for i in range(9, -1, -1)})
+        tree.extend([(5, 5), (250, 250), (200, 200)])
+        self.assertEqual(list(range(201)) + [250], list(tree))
+        self.assertEqual((5, 5), tree.select(5))
+        self.assertEqual(-199, tree[199])
+        self.assertTrue(tree.is_valid())
+
+
+class Stats(unittest.TestCase):
+    def test_rotations(self):
+        tree = TreeSet()
+        tree.enable_stats()
+        for i in (1, 2, 3, 5, 4):
+            tree.add(i)
+        stats = tree.stats()
+        self.assertEqual(3, stats['rotations'])
+        # appends only compare with the last node
+        self.assertEqual({0: 1, 1: 3, 3: 1}, stats['depths'])
+        tree.disable_stats()
+        self.assertIs(AVLNode, type(tree.root))
+        self.assertTrue(tree.is_valid())
+
+
+class Serialization(unittest.TestCase):
+    def test_pickle(self):
+        tree = IndexedTreeDict(((str(i), i) for i in range(100)), key=int)
+        tree.enable_stats()
+        copy = pickle.loads(pickle.dumps(tree))
+        self.assertIs(IndexedTreeDict, type(copy))
+        self.assertEqual(list(tree.items()), list(copy.items()))
+        self.assertEqual(('10', 10), copy.select(10))
+        self.assertTrue(copy.is_valid())
+
+
+class Persistent(unittest.TestCase):
+    def test_snapshot(self):
+        tree = PersistentTreeDict((i, -i) for i in range(100))
+        snapshot = tree.snapshot()
+        self.assertIs(tree.root, snapshot.root)
+        for i in range(0, 100, 3):
+            del tree[i]
+        for i in range(1, 100, 6):
+            tree[i] = i
+        tree[100] = -100
+        tree.pop_min()
+        self.assertEqual({i: -i for i in range(100)}, dict(snapshot))
+        self.assertEqual([(98, -98), (99, -99)],
+                         list(snapshot.irange_items(98)))
+        self.assertTrue(snapshot.is_valid() and tree.is_valid())
+        self.assertEqual(66, len(tree))
+        self.assertEqual((2, -2), tree.min())
+
+    def test_path_copy(self):
+        tree = PersistentTreeSet(range(1000))
+        snapshot = tree.snapshot()
+        tree.add(1000.5)
+        shared = set(map(id, snapshot.root)) & set(map(id, tree.root))
+        self.assertLessEqual(1000 - len(shared), tree.height())
+        snapshot.discard(0)
+        self.assertEqual(0, tree.min())
+        self.assertEqual((999, 1001), (len(snapshot), len(tree)))
+
+    def test_split_cursor(self):
+        tree = PersistentTreeSet(range(50))
+        snapshot = tree.snapshot()
+        left, right = tree.split(20)
+        left.join3(19.5, right)
+        cursor = left.find(30)
+        left.delete_at(cursor)
+        self.assertEqual(31, cursor.key)
+        left.insert_near(cursor, 30.5)
+        self.assertEqual(30.5, cursor.key)
+        self.assertEqual(51, len(left))
+        self.assertEqual(list(range(50)), list(snapshot))
+        self.assertTrue(left.is_valid() and snapshot.is_valid())
+        self.assertIs(PersistentTreeSet,
+                      type(pickle.loads(pickle.dumps(snapshot))))
+
+
+class Batches(unittest.TestCase):
+    def test_batches(self):
+        tree = IndexedTreeDict((i, -i) for i in range(100))
+        batches = list(tree.iter_batches(30))
+        self.assertEqual([30, 30, 30, 10], list(map(len, batches)))
+        self.assertEqual(list(range(100)), sum(batches, []))
+        self.assertEqual([(99, -99), (98, -98)],
+                         next(tree.items_batches(2, reverse=True)))
+        self.assertEqual([], list(TreeSet().iter_batches()))
+        self.assertRaises(ValueError, tree.iter_batches, 0)
+        batches = tree.iter_batches(50)
+        next(batches)
+        tree[100] = -100
+        self.assertRaises(RuntimeError, next, batches)
+
+    def test_async(self):
+        tree = TreeSet(range(10))
+        ticks = []
+
+        async def tick():
+            for i in range(3):
+                ticks.append(i)
+                await asyncio.sleep(0)
+
+        async def scan():
+            task = asyncio.ensure_future(tick())
+            batches = []
+            async for batch in tree.aiter_batches(4):
+                batches.append((batch, list(ticks)))
+            await task
+            return batches
+
+        loop = asyncio.new_event_loop()
+        try:
+            batches = loop.run_until_complete(scan())
+        finally:
+            loop.close()
+        self.assertEqual([([0, 1, 2, 3], []), ([4, 5, 6, 7], [0]),
+                          ([8, 9], [0, 1])], batches)
+
+
+class Many(unittest.TestCase):
+    def test_lookups(self):
+        tree = IndexedTreeDict((i, -i) for i in range(0, 200, 2))
+        probes = [51, 4, 198, 4, -2, 0, 199]
+        self.assertEqual([None, -4, -198, -4, None, 0, None],
+                         tree.get_many(probes))
+        self.assertEqual([False, True, True, True, False, True, False],
+                         tree.contains_many(iter(probes)))
+        self.assertEqual([], tree.get_many([]))
+        self.assertEqual([True, False],
+                         TreeSet(range(5)).contains_many([3, 5]))
+
+    def test_setmany(self):
+        tree = PersistentTreeDict((i, -i) for i in range(100))
+        snapshot = tree.snapshot()
+        tree.setmany([(5, 'a'), (500, 'b'), (5, 'c'), (-1, 'd')])
+        tree.setmany({7: 'e'})
+        self.assertEqual(['c', 'b', 'd', 'e'], tree.get_many([5, 500, -1, 7]))
+        self.assertEqual([-5, None], snapshot.get_many([5, 500]))
+        self.assertTrue(tree.is_valid())
+        self.assertTrue(snapshot.is_valid())
+
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test_numpy(self):
+        tree = IndexedTreeDict((i, i / 2) for i in range(10))
+        values = tree.get_many(numpy.array([3, 12, 0]), -1.0)
+        self.assertEqual('f', values.dtype.kind)
+        self.assertEqual([1.5, -1.0, 0.0], values.tolist())
+        found = tree.contains_many(numpy.array([3.0, 3.5]))
+        self.assertEqual([True, False], found.tolist())
+        tree[20] = 'x'
+        self.assertEqual(object, tree.get_many(numpy.array([20, 1])).dtype)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,69 @@
+#  Copyright (c) 2021  SBA - MIT License
+
+import unittest
+import io
+import json
+import os.path
+import tempfile
+from contextlib import redirect_stdout
+from bin_tree import bench
+
+
+class Keys(unittest.TestCase):
+    def test_distributions(self):
+        self.assertEqual(list(range(0, 40, 4)), bench.make_keys('sorted', 10))
+        keys = bench.make_keys('random', 100, 1)
+        self.assertEqual(keys, bench.make_keys('random', 100, 1))
+        self.assertEqual(100, len(set(keys)))
+        keys = bench.make_keys('zipf', 1000)
+        self.assertGreater(len(keys), len(set(keys)))
+        self.assertRaises(ValueError, bench.make_keys, 'normal', 10)
+
+
+class Baseline(unittest.TestCase):
+    def test_bisect_dict(self):
+        d = bench.BisectDict({3: 'c', 1: 'a'})
+        d[2] = 'b'
+        d[2] = 'B'
+        del d[1]
+        self.assertEqual([2, 3], list(d))
+        self.assertEqual([3], list(d.irange(2.5)))
+        self.assertEqual([[2], [3]], list(d.iter_batches(1)))
+        self.assertEqual(['B', None], d.get_many([2, 1]))
+        self.assertEqual('B', d[2])
+
+
+class Run(unittest.TestCase):
+    def test_run_compare(self):
+        results = bench.run(sizes=[50], repeat=1)
+        self.assertEqual(len(bench.FLAVORS) * len(bench.DISTRIBUTIONS)
+                         * (len(bench.OPERATIONS) + 1), len(results))
+        compared = bench.compare(results, results)
+        self.assertEqual(len(results), len(compared))
+        self.assertFalse(any(r['regression'] for r in compared))
+        slower = [dict(r, ops_per_sec=r['ops_per_sec'] * 2)
+                  for r in results if r['operation'] == 'insert']
+        compared = bench.compare(slower, results)
+        self.assertTrue(all(r['regression'] for r in compared))
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'bench.json')
+            args = ['--sizes', '1e2', '--flavors', 'avl', 'btree', 'dict',
+                    '--distributions', 'random', '--repeat', '1',
+                    '--fanout', '8']
+            with redirect_stdout(io.StringIO()) as out:
+                self.assertEqual(0, bench.main(args + ['--json', path]))
+                self.assertEqual(0, bench.main(
+                    args + ['--compare', path, '--threshold', '1']))
+            self.assertIn('avl', out.getvalue())
+            with open(path) as fd:
+                self.assertEqual(27, len(json.load(fd)['results']))
+
+    def test_readers(self):
+        results = bench.run(['avl', 'concurrent'], [100], ['random'],
+                            ['lookup'], 1, threads=[1, 3])
+        self.assertEqual([None, 1, 3, None] * 2,
+                         [r.get('threads') for r in results])
+        self.assertIn('readers/3', bench._row(results[2]))
+        self.assertEqual(len(results), len(bench.compare(results, results)))
@@ -1,4 +1,6 @@
 import unittest
+import io
+import pickle
 from bin_tree import bin_tree
 
 
@@ -55,6 +57,122 @@ class TestBTree(unittest.TestCase):
     def test_not_in(self):
         self.assertFalse(9 in self.tree)
 
+    def test_reversed(self):
+        self.assertEqual(list(range(7, 0, -1)), list(reversed(self.tree)))
+
+    def test_changed(self):
+        it = iter(self.tree)
+        next(it)
+        self.tree.add(8)
+        with self.assertRaises(RuntimeError):
+            next(it)
+
+    def test_irange(self):
+        self.assertEqual([2, 3], list(self.tree.irange(2, 4)))
+        self.assertEqual([3, 4], list(self.tree.irange(2, 4, (False, True))))
+        self.assertEqual([4, 3, 2], list(self.tree.irange(
+            2, 4, (True, True), reverse=True)))
+        self.assertEqual([6, 7], list(self.tree.irange(5.5)))
+        self.assertEqual([2, 1], list(self.tree.irange(
+            hi=2.5, reverse=True)))
+        self.assertEqual([], list(self.tree.irange(3, 3)))
+        self.assertEqual([3], list(self.tree.irange(3, 3, (True, True))))
+
+    def test_navigation(self):
+        self.tree.discard(4)
+        self.assertEqual(3, self.tree.floor(4))
+        self.assertEqual(5, self.tree.floor(5))
+        self.assertEqual(3, self.tree.lower(5))
+        self.assertEqual(5, self.tree.ceiling(4))
+        self.assertEqual(5, self.tree.ceiling(5))
+        self.assertEqual(6, self.tree.higher(5))
+        self.assertIsNone(self.tree.lower(1))
+        self.assertIsNone(self.tree.higher(7))
+        self.assertEqual((1, 7), (self.tree.min(), self.tree.max()))
+
+    def test_pop(self):
+        self.assertEqual(1, self.tree.pop_min())
+        self.assertEqual(7, self.tree.pop_max())
+        self.assertEqual([2, 3, 4, 5, 6], list(self.tree))
+        empty = bin_tree.TreeSet()
+        with self.assertRaises(KeyError):
+            empty.pop_min()
+        with self.assertRaises(ValueError):
+            empty.max()
+
+    def test_positional(self):
+        self.assertEqual(3, self.tree[2])
+        self.assertEqual(7, self.tree[-1])
+        self.assertEqual([2, 4, 6], self.tree[1::2])
+        self.assertEqual([7, 6], self.tree[:-3:-1])
+        self.assertEqual(4, self.tree.rank(4.5))
+        self.assertEqual(5, self.tree.select(4))
+        with self.assertRaises(IndexError):
+            self.tree.select(7)
+
+    def test_split_join(self):
+        left, right = self.tree.split(3)
+        self.assertEqual([1, 2], list(left))
+        self.assertEqual(5, len(right))
+        left.join(right)
+        self.assertEqual(list(range(1, 8)), list(left))
+        self.assertEqual(7, len(left))
+
+    def test_sorted_insert(self):
+        tree = bin_tree.TreeSet()
+        for i in range(2000):
+            tree.add(i)
+        self.assertEqual(2000, tree.height())
+        self.assertTrue(1999 in tree)
+        tree.discard(1999)
+        self.assertEqual(1999, len(tree))
+
+
+class SetAlgebra(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tree = bin_tree.TreeSet((1, 2, 3, 4))
+        self.other = bin_tree.TreeSet((3, 4, 5))
+
+    def test_operators(self):
+        self.assertEqual([1, 2, 3, 4, 5], list(self.tree | self.other))
+        self.assertEqual([3, 4], list(self.tree & self.other))
+        self.assertEqual([1, 2], list(self.tree - self.other))
+        self.assertEqual([1, 2, 5], list(self.tree ^ self.other))
+        self.assertEqual([5], list({3, 5} - self.tree))
+        self.assertIsInstance(self.tree | {7}, bin_tree.TreeSet)
+
+    def test_in_place(self):
+        tree = self.tree
+        tree |= [6, 5, 6]
+        self.assertIs(self.tree, tree)
+        self.assertEqual([1, 2, 3, 4, 5, 6], list(tree))
+        tree &= self.other
+        self.assertEqual([3, 4, 5], list(tree))
+        tree -= {4}
+        self.assertEqual([3, 5], list(tree))
+        tree ^= self.other
+        self.assertEqual([4], list(tree))
+        self.assertTrue(tree.is_valid())
+
+    def test_comparisons(self):
+        self.assertTrue(bin_tree.TreeSet((3, 4)) < self.tree)
+        self.assertFalse(self.other <= self.tree)
+        self.assertTrue(self.tree >= {1, 4})
+        self.assertEqual(self.tree, {1, 2, 3, 4})
+        self.assertFalse(self.tree.isdisjoint(self.other))
+        self.assertTrue(self.tree.isdisjoint((0, 5)))
+
+    def test_update(self):
+        self.tree.update([0], range(10, 100))
+        self.assertEqual(95, len(self.tree))
+        self.assertEqual([0, 1, 2, 3, 4, 10], list(self.tree)[:6])
+        self.assertTrue(self.tree.is_valid())
+
+    def test_clear(self):
+        self.tree.clear()
+        self.assertEqual(0, len(self.tree))
+        self.assertIsNone(self.tree.root)
+
 
 class TestDictTree(unittest.TestCase):
     def setUp(self) -> None:
@@ -63,6 +181,31 @@ class TestDictTree(unittest.TestCase):
     def test_valid(self):
         self.assertTrue(self.tree.is_valid())
 
+    def test_nan(self):
+        nan = float('nan')
+        self.assertRaises(KeyError, self.tree.__getitem__, nan)
+        self.assertNotIn(nan, self.tree)
+        self.assertRaises(ValueError, self.tree.__setitem__, nan, 'z')
+        self.assertIsNone(self.tree[7])
+        self.assertEqual(['x', None], self.tree.get_many([nan, 7], 'x'))
+        self.assertEqual([False, True], self.tree.contains_many([nan, 7]))
+        self.assertRaises(ValueError, self.tree.setmany, [(nan, 'z')])
+        self.assertRaises(ValueError, bin_tree.TreeDict().__setitem__,
+                          nan, 'z')
+        self.assertEqual(7, len(self.tree))
+
+    def test_nan_remove(self):
+        nan = float('nan')
+        self.assertRaises(KeyError, self.tree.__delitem__, nan)
+        self.assertEqual('z', self.tree.pop(nan, 'z'))
+        self.assertRaises(KeyError, self.tree.pop, nan)
+        self.assertIsNone(self.tree.find(nan))
+        cursor = self.tree.find(4)
+        self.assertRaises(ValueError, self.tree.insert_near, cursor, nan,
+                          'z')
+        self.assertEqual(list(range(1, 8)), list(self.tree))
+        self.assertTrue(self.tree.is_valid())
+
     def test_len(self):
         self.assertEqual(7, len(self.tree))
         self.assertTrue(3, self.tree.height())
@@ -116,6 +259,53 @@ class TestDictTree(unittest.TestCase):
         with self.assertRaises(KeyError):
             del self.tree[9]
 
+    def test_irange(self):
+        for i in range(1, 8):
+            self.tree[i] = 2 * i
+        self.assertEqual([6, 8], list(self.tree.irange_values(3, 5)))
+        self.assertEqual([(5, 10), (4, 8)], list(self.tree.irange_items(
+            3.5, 5, (True, True), True)))
+
+    def test_navigation(self):
+        self.assertEqual((4, None), self.tree.floor(4.5))
+        self.assertEqual((5, None), self.tree.higher(4))
+        self.assertIsNone(self.tree.ceiling(8))
+        self.assertEqual((7, None), self.tree.pop_max())
+        self.assertEqual(6, len(self.tree))
+
+    def test_update(self):
+        self.tree.update([(8, 1), (2, 1), (8, 2)])
+        self.assertEqual(8, len(self.tree))
+        self.assertEqual(2, self.tree[8])
+        self.tree.update((i, i) for i in range(0, 100, 3))
+        self.assertEqual(40, len(self.tree))
+        self.assertEqual(6, self.tree[6])
+        self.assertEqual(None, self.tree[7])
+        self.assertTrue(self.tree.is_valid())
+
+    def test_views(self):
+        self.tree[2] = 4
+        self.assertEqual([None, 4, None], list(self.tree.values())[:3])
+        self.assertEqual([(7, None), (6, None)],
+                         list(reversed(self.tree.items()))[:2])
+        self.assertEqual([7, 6], list(reversed(self.tree.keys()))[:2])
+        self.assertTrue((2, 4) in self.tree.items())
+
+
+class NodeLayout(unittest.TestCase):
+    def test_slots(self):
+        from bin_tree import avl_tree, red_black_tree
+        for cls in (bin_tree.Node, bin_tree.ValueNode, avl_tree.AVLNode,
+                    avl_tree.AVLValueNode, red_black_tree.RBNode,
+                    red_black_tree.RBValueNode):
+            self.assertFalse(hasattr(cls(1), '__dict__'), cls.__name__)
+
+    def test_child(self):
+        node = bin_tree.Node(2)
+        node.set_child(0, bin_tree.Node(1))
+        node.set_child(1, bin_tree.Node(3))
+        self.assertEqual((1, 3), tuple(_.key for _ in node.child))
+
 
 class DictTreeInit(unittest.TestCase):
     def setUp(self) -> None:
@@ -131,10 +321,201 @@ class DictTreeInit(unittest.TestCase):
         d = dict(self.tree)
         self.assertEqual(self.tree, bin_tree.TreeDict(d))
 
+    def test_duplicates(self):
+        tree = bin_tree.TreeDict([('b', 1), ('a', 2), ('b', 3), ('a', 4)])
+        self.assertEqual([('a', 4), ('b', 3)], list(tree.items()))
+        self.assertEqual(2, len(tree))
+        self.assertTrue(tree.is_valid())
+
+    def test_reversed_input(self):
+        tree = bin_tree.TreeDict((i, -i) for i in range(10, 0, -1))
+        self.assertEqual(list(range(1, 11)), list(tree))
+        self.assertEqual(4, tree.height())
+
+    def test_set_duplicates(self):
+        tree = bin_tree.TreeSet(iter((3, 1, 3, 2, 1)))
+        self.assertEqual([1, 2, 3], list(tree))
+        self.assertEqual(3, len(tree))
+
     def test_node_type(self):
         with self.assertRaises(TypeError):
             bin_tree.TreeDict(a=1, b=2, c=3, node_class=bin_tree.Node)
 
 
+class KeyFunction(unittest.TestCase):
+    def test_set(self):
+        calls = []
+
+        def key(x):
+            calls.append(x)
+            return x.lower()
+
+        tree = bin_tree.TreeSet(('b', 'C', 'a'), key=key)
+        self.assertEqual(['a', 'b', 'C'], list(tree))
+        self.assertEqual(3, len(calls))
+        tree.add('B')
+        self.assertEqual(['a', 'B', 'C'], list(tree))
+        self.assertIn('c', tree)
+        self.assertEqual('B', tree.floor('bb'))
+        self.assertEqual(['B', 'C'], list(tree.irange('b', 'z')))
+        self.assertEqual(8, len(calls))
+        tree.discard('A')
+        self.assertEqual(['B', 'C'], list(tree))
+        self.assertEqual(['B'], list(tree & ['b', 'd']))
+        self.assertTrue(tree.is_valid())
+
+    def test_dict(self):
+        tree = bin_tree.TreeDict({'b': 1, 'C': 2}, key=str.lower)
+        tree['a'] = 0
+        self.assertEqual([('a', 0), ('b', 1), ('C', 2)], list(tree.items()))
+        self.assertEqual(2, tree['c'])
+        self.assertEqual(['b', 'C'], list(tree.keys()[1:]))
+        tree.update((k, 9) for k in 'DEFGHIJ')
+        self.assertEqual(9, tree['d'])
+        del tree['B']
+        self.assertEqual('aCDEFGHIJ', ''.join(tree))
+        self.assertTrue(tree.is_valid())
+
+    def test_errors(self):
+        self.assertRaises(TypeError, bin_tree.TreeDict, key=5)
+        self.assertRaises(TypeError, bin_tree.TreeSet, key=abs,
+                          node_class=bin_tree.Node)
+        self.assertRaises(TypeError, bin_tree.TreeSet((1,)).join,
+                          bin_tree.TreeSet((2,), key=abs))
+
+
+class Cursors(unittest.TestCase):
+    def test_walk(self):
+        tree = bin_tree.TreeSet((4, 2, 1, 3, 6, 5, 7))
+        cursor = tree.first()
+        keys = []
+        while cursor:
+            keys.append(cursor.key)
+            cursor.next()
+        self.assertEqual([1, 2, 3, 4, 5, 6, 7], keys)
+        cursor = tree.last()
+        cursor.prev()
+        self.assertEqual(6, cursor.key)
+        self.assertFalse(bin_tree.TreeSet().first())
+
+    def test_seek(self):
+        tree = bin_tree.TreeDict((i, -i) for i in range(0, 20, 2))
+        cursor = tree.find(6)
+        self.assertEqual((6, -6), (cursor.key, cursor.value))
+        self.assertIsNone(tree.find(7))
+        self.assertFalse(cursor.seek(7))
+        self.assertEqual(8, cursor.key)
+        self.assertTrue(cursor.seek(2))
+        self.assertEqual(2, cursor.key)
+        self.assertFalse(cursor.seek(19))
+        self.assertFalse(cursor)
+        self.assertRaises(ValueError, cursor.next)
+
+    def test_insert_delete(self):
+        tree = bin_tree.TreeDict()
+        cursor = tree.first()
+        for i in range(10):
+            cursor = tree.insert_near(cursor, i, str(i))
+            self.assertEqual(i, cursor.key)
+        tree.insert_near(cursor, 5, 'five')
+        self.assertEqual('five', cursor.value)
+        tree.delete_at(cursor)
+        self.assertEqual(6, cursor.key)
+        cursor = tree.last()
+        tree.delete_at(cursor)
+        self.assertFalse(cursor)
+        self.assertEqual([0, 1, 2, 3, 4, 6, 7, 8], list(tree))
+        self.assertTrue(tree.is_valid())
+
+    def test_invalidated(self):
+        tree = bin_tree.TreeSet(range(10))
+        cursor = tree.find(3)
+        tree.add(20)
+        self.assertRaises(RuntimeError, cursor.next)
+        self.assertRaises(ValueError, tree.delete_at,
+                          bin_tree.TreeSet(range(3)).first())
+
+
+class Stats(unittest.TestCase):
+    def test_counters(self):
+        tree = bin_tree.TreeDict((i, -i) for i in range(7))
+        self.assertIsNone(tree.stats())
+        events = []
+        tree.enable_stats(lambda *args: events.append(args))
+        self.assertEqual(-3, tree[3])
+        # the descent goes on down to a leaf: 3, 5, 4 and 3 again
+        self.assertEqual(('find', 3, 3, 4), events[-1])
+        self.assertEqual(-6, tree[6])
+        self.assertEqual(('find', 6, 3, 4), events[-1])
+        tree[7] = -7
+        del tree[0]
+        self.assertRaises(KeyError, tree.__delitem__, 10)
+        self.assertEqual((5, -5), tree.floor(5.5))
+        stats = tree.stats()
+        self.assertEqual({'find': 2, 'insert': 1, 'remove': 2, 'floor': 1},
+                         stats['operations'])
+        self.assertEqual(6, sum(stats['depths'].values()))
+        self.assertEqual(sum(e[3] for e in events), stats['comparisons'])
+        self.assertEqual(0, stats['rotations'])
+        tree.enable_stats()
+        self.assertEqual(0, tree.stats()['comparisons'])
+
+    def test_disable(self):
+        tree = bin_tree.TreeSet(range(10))
+        cls, node_class = type(tree), tree.nodeClass
+        tree.enable_stats()
+        self.assertIsInstance(tree, cls)
+        tree.add(10)
+        left, right = tree.split(5)
+        self.assertIs(tree._stats, left._stats)
+        left.join(right)
+        left.disable_stats()
+        self.assertIs(cls, type(left))
+        self.assertIsNone(left.stats())
+        self.assertTrue(all(type(node) is node_class for node in left._walk()))
+        self.assertEqual(list(range(11)), list(left))
+
+
+class Serialization(unittest.TestCase):
+    def test_pickle_deep(self):
+        tree = bin_tree.TreeSet()
+        for i in range(5000):
+            tree.add(i)
+        self.assertEqual(5000, tree.height())
+        copy = pickle.loads(pickle.dumps(tree))
+        self.assertEqual(13, copy.height())
+        self.assertEqual(list(tree), list(copy))
+
+    def test_dump_load(self):
+        for items in ({i: i / 2 for i in range(-5, 5)},
+                      {-2 ** 63: 'a', 2 ** 63 - 1: True},
+                      {2 ** 64: b'', 2 ** 65: None},
+                      {'\xe9t\xe9': b'summer', 'a': (1, 2)}, {}):
+            tree = bin_tree.TreeDict(items)
+            fd = io.BytesIO()
+            tree.dump(fd)
+            fd.seek(0)
+            copy = bin_tree.TreeDict.load(fd)
+            self.assertEqual(list(tree.items()), list(copy.items()))
+            self.assertEqual([type(v) for v in tree.values()],
+                             [type(v) for v in copy.values()])
+        self.assertEqual(b'BTRE\x01\x02' + bytes(10) + (b'q' + bytes(7)) * 2,
+                         fd.getvalue())
+
+    def test_load_errors(self):
+        fd = io.BytesIO()
+        bin_tree.TreeSet(range(10)).dump(fd)
+        data = fd.getvalue()
+        self.assertEqual(16 + 8 + 80, len(data))
+        self.assertEqual(list(range(10)),
+                         list(bin_tree.TreeSet.load(io.BytesIO(data))))
+        self.assertRaises(ValueError, bin_tree.TreeDict.load,
+                          io.BytesIO(data))
+        self.assertRaises(ValueError, bin_tree.TreeSet.load,
+                          io.BytesIO(data[:-1]))
+        self.assertRaises(ValueError, bin_tree.TreeSet.load,
+                          io.BytesIO(b'XXXX' + data[4:]))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,192 @@
+#  Copyright (c) 2021  SBA - MIT License
+
+import unittest
+import io
+import pickle
+import random
+from bin_tree.btree import TreeSet, TreeDict
+
+
+class Inserts(unittest.TestCase):
+    def test_random(self):
+        for fanout in (2, 3, 4, 16):
+            rng = random.Random(fanout)
+            tree = TreeSet(fanout=fanout)
+            expected = set()
+            for _ in range(500):
+                key = rng.randrange(200)
+                if rng.random() < 0.6:
+                    tree.add(key)
+                    expected.add(key)
+                elif key in expected:
+                    tree.discard(key)
+                    expected.discard(key)
+                self.assertTrue(tree.is_valid())
+            self.assertEqual(sorted(expected), list(tree))
+            self.assertEqual(sorted(expected, reverse=True),
+                             list(reversed(tree)))
+
+    def test_load(self):
+        for n in range(0, 100, 7):
+            tree = TreeSet(range(n), fanout=4)
+            self.assertEqual(list(range(n)), list(tree))
+            self.assertTrue(tree.is_valid())
+        self.assertEqual(3, TreeSet(range(100), fanout=4).height())
+        self.assertRaises(ValueError, TreeSet, fanout=1)
+
+
+class Delete(unittest.TestCase):
+    def test_pop(self):
+        tree = TreeDict(((i, str(i)) for i in range(50)), fanout=3)
+        self.assertEqual((49, '49'), tree.pop_max())
+        self.assertEqual((0, '0'), tree.pop_min())
+        while tree:
+            tree.pop_min()
+            self.assertTrue(tree.is_valid())
+        self.assertRaises(KeyError, tree.pop_min)
+        self.assertRaises(KeyError, tree.__delitem__, 0)
+
+
+class Mapping(unittest.TestCase):
+    def test_nan(self):
+        nan = float('nan')
+        tree = TreeDict({1: 'a', 2: 'b', 3: 'c'}, fanout=2)
+        self.assertRaises(KeyError, tree.__getitem__, nan)
+        self.assertNotIn(nan, tree)
+        self.assertIsNone(tree.find(nan))
+        self.assertRaises(ValueError, tree.__setitem__, nan, 'z')
+        self.assertRaises(KeyError, tree.__delitem__, nan)
+        self.assertEqual([None, 'b'], tree.get_many([nan, 2]))
+        self.assertRaises(ValueError, TreeDict().__setitem__, nan, 'z')
+        self.assertEqual([(1, 'a'), (2, 'b'), (3, 'c')], list(tree.items()))
+
+    def test_api(self):
+        tree = TreeDict({3: 'c', 1: 'a'}, fanout=2)
+        tree[2] = 'b'
+        self.assertEqual([(1, 'a'), (2, 'b'), (3, 'c')], list(tree.items()))
+        self.assertEqual((2, 'b'), tree.floor(2.5))
+        self.assertEqual((1, 'a'), tree.lower(2))
+        self.assertEqual((3, 'c'), tree.higher(2))
+        self.assertIsNone(tree.ceiling(4))
+        self.assertEqual(['b', 'c'], list(tree.irange_values(2, 4)))
+        self.assertEqual('a', tree.values()[0])
+        self.assertEqual(2, tree.rank(2.5))
+        self.assertRaises(KeyError, tree.__getitem__, 4)
+
+    def test_range(self):
+        tree = TreeDict(((i, -i) for i in range(0, 100, 2)), fanout=4)
+        self.assertEqual(list(range(10, 21, 2)),
+                         list(tree.irange(9, 20, (True, True))))
+        self.assertEqual(list(range(18, 11, -2)),
+                         list(tree.irange(10, 20, (False, False), True)))
+        self.assertEqual([(96, -96), (98, -98)],
+                         list(tree.irange_items(95)))
+        self.assertEqual([0, 2], tree.keys()[:2])
+
+    def test_key(self):
+        tree = TreeDict({'b': 1, 'A': 2}, key=str.lower, fanout=2)
+        tree['a'] = 3
+        self.assertEqual([('a', 3), ('b', 1)], list(tree.items()))
+        self.assertEqual(('b', 1), tree.ceiling('B'))
+        self.assertTrue(tree.is_valid())
+
+    def test_split_join(self):
+        tree = TreeDict(((i, -i) for i in range(50)), fanout=4)
+        left, right = tree.split(20)
+        self.assertEqual(0, len(tree))
+        self.assertEqual(list(range(20)), list(left))
+        self.assertEqual(4, right.fanout)
+        self.assertRaises(ValueError, right.join, left)
+        left.join3((19.5, 0), right)
+        self.assertEqual((19.5, 0), left.select(20))
+        self.assertEqual(51, len(left))
+        self.assertTrue(left.is_valid())
+
+
+class Set(unittest.TestCase):
+    def test_algebra(self):
+        first = TreeSet(range(0, 20, 2), fanout=3)
+        second = TreeSet(range(0, 20, 3), fanout=3)
+        self.assertEqual(list(range(0, 20, 6)), list(first & second))
+        self.assertEqual(3, (first | second).fanout)
+        first -= second
+        self.assertEqual([2, 4, 8, 10, 14, 16], list(first))
+        self.assertTrue(first.is_valid())
+
+
+class Cursors(unittest.TestCase):
+    def test_walk(self):
+        tree = TreeSet(range(0, 40, 2), fanout=3)
+        cursor = tree.find(10)
+        cursor.next()
+        self.assertEqual(12, cursor.key)
+        tree.delete_at(cursor)
+        self.assertEqual(14, cursor.key)
+        tree.insert_near(cursor, 13)
+        cursor.prev()
+        self.assertEqual(10, cursor.key)
+        self.assertIsNone(tree.find(11))
+        cursor = tree.last()
+        cursor.next()
+        self.assertFalse(cursor)
+        self.assertEqual(0, tree.first().key)
+        self.assertFalse(TreeSet().first())
+        self.assertTrue(tree.is_valid())
+
+
+class Append(unittest.TestCase):
+    def test_extend(self):
+        tree = TreeDict(fanout=4)
+        tree.extend((i, -i) for i in range(100))
+        tree.extend((i, -i) for i in range(-1, -100, -1))
+        self.assertEqual(list(range(-99, 100)), list(tree))
+        self.assertEqual(((-99, 99), (99, -99)), (tree.min(), tree.max()))
+        self.assertTrue(tree.is_valid())
+
+    def test_batches(self):
+        tree = TreeDict(((i, -i) for i in range(50)), fanout=4)
+        batches = list(tree.items_batches(7, reverse=True))
+        self.assertEqual([7] * 7 + [1], list(map(len, batches)))
+        self.assertEqual(list(tree.items())[::-1], sum(batches, []))
+        self.assertEqual(list(range(10)), next(tree.iter_batches(10)))
+        self.assertEqual([], list(TreeSet(fanout=2).iter_batches()))
+
+    def test_many(self):
+        tree = TreeDict(((i, -i) for i in range(0, 100, 2)), fanout=3)
+        probes = list(range(-1, 102, 3))
+        self.assertEqual([-k if k % 2 == 0 else None for k in probes],
+                         tree.get_many(probes))
+        tree.setmany((k, 'x') for k in probes)
+        self.assertEqual(len(probes), list(tree.values()).count('x'))
+        self.assertEqual(68, len(tree))
+        self.assertTrue(tree.is_valid())
+        self.assertEqual([True, False],
+                         TreeSet([1, 2], fanout=2).contains_many([2, 3]))
+
+
+class Stats(unittest.TestCase):
+    def test_splits(self):
+        tree = TreeSet(fanout=2)
+        tree.enable_stats()
+        for i in range(5):
+            tree.add(i)
+        tree.discard(2)
+        stats = tree.stats()
+        self.assertEqual(4, stats['adjusts'])
+        self.assertEqual(1, stats['rotations'])
+        left, right = tree.split(2)
+        self.assertEqual(2, right.fanout)
+        tree.disable_stats()
+        self.assertIs(TreeSet, type(tree))
+
+
+class Serialization(unittest.TestCase):
+    def test_pickle_dump(self):
+        tree = TreeDict(((i, float(i)) for i in range(100)), fanout=8)
+        copy = pickle.loads(pickle.dumps(tree))
+        self.assertEqual(8, copy.fanout)
+        self.assertEqual(list(tree.items()), list(copy.items()))
+        fd = io.BytesIO()
+        tree.dump(fd)
+        fd.seek(0)
+        self.assertEqual(tree, TreeDict.load(fd, fanout=16))
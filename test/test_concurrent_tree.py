@@ -0,0 +1,169 @@
+#  Copyright (c) 2021  SBA - MIT License
+
+import unittest
+import random
+import threading
+from bin_tree import avl_tree, splay_tree
+from bin_tree.concurrent_tree import ConcurrentTreeDict, RWLock
+
+
+class Lock(unittest.TestCase):
+    def test_reentrant(self):
+        lock = RWLock()
+        with lock.write():
+            with lock.read(), lock.write():
+                pass
+        with lock.read():
+            with lock.read():
+                self.assertRaises(RuntimeError, lock.acquire_write)
+        self.assertRaises(RuntimeError, lock.release_write)
+
+    def test_exclusion(self):
+        lock = RWLock()
+        entered = threading.Event()
+        events = []
+
+        def write():
+            with lock.write():
+                events.append('write')
+
+        def read():
+            with lock.read():
+                entered.set()
+
+        with lock.read():
+            writer = threading.Thread(target=write)
+            writer.start()
+            writer.join(0.05)
+            self.assertEqual([], events)
+            reader = threading.Thread(target=read)
+            reader.start()
+            # a waiting writer goes before new readers
+            self.assertFalse(entered.wait(0.05))
+        writer.join()
+        reader.join()
+        self.assertEqual(['write'], events)
+        self.assertTrue(entered.is_set())
+
+
+class Mapping(unittest.TestCase):
+    def test_api(self):
+        d = ConcurrentTreeDict({3: 'c', 1: 'a'})
+        d[2] = 'b'
+        self.assertEqual([(1, 'a'), (2, 'b'), (3, 'c')], list(d.items()))
+        self.assertEqual(['c', 'b', 'a'], list(reversed(list(d.values()))))
+        self.assertEqual((2, 'b'), d.floor(2.5))
+        self.assertEqual((3, 'c'), d.higher(2))
+        self.assertEqual([2, 1], list(d.irange(1, 3, reverse=True)))
+        self.assertEqual('d', d.setdefault(4, 'd'))
+        self.assertEqual((4, 'd'), d.pop_max())
+        self.assertEqual('z', d.pop(5, 'z'))
+        self.assertRaises(KeyError, d.pop, 5)
+        with d.writing() as tree:
+            tree[0] = '0'
+            d[-1] = '-1'
+        d.setmany([(4, 'd'), (1, 'A')])
+        self.assertEqual(['A', 'd', None], d.get_many([1, 4, 5]))
+        self.assertEqual([True, False], d.contains_many([4, 5]))
+        del d[4]
+        d[1] = 'a'
+        self.assertEqual((-1, '-1'), d.min())
+        self.assertEqual({-1: '-1', 0: '0', 1: 'a', 2: 'b', 3: 'c'}, d)
+
+    def test_iterators(self):
+        d = ConcurrentTreeDict((i, i) for i in range(200))
+        iterator = iter(d)
+        self.assertEqual(0, next(iterator))
+        d.clear()
+        self.assertEqual(list(range(1, 200)), list(iterator))
+        d = ConcurrentTreeDict(((i, i) for i in range(200)),
+                               tree_class=avl_tree.TreeDict)
+        iterator = d.irange_items(10)
+        self.assertEqual((10, 10), next(iterator))
+        del d[100]
+        self.assertRaises(RuntimeError, list, iterator)
+        snapshot = d.snapshot()
+        d[100] = 100
+        self.assertEqual(199, len(snapshot))
+        self.assertTrue(snapshot.is_valid())
+
+    def test_batches(self):
+        d = ConcurrentTreeDict((i, i) for i in range(100))
+        batches = d.items_batches(60)
+        d.clear()
+        self.assertEqual([60, 40], [len(batch) for batch in batches])
+        d = ConcurrentTreeDict(((i, i) for i in range(100)),
+                               tree_class=avl_tree.TreeDict)
+        batches = d.iter_batches(60)
+        self.assertEqual(list(range(60)), next(batches))
+        d[100] = 100
+        self.assertRaises(RuntimeError, next, batches)
+
+
+class Threads(unittest.TestCase):
+    def test_readers_writers(self):
+        for tree_class in (None, avl_tree.TreeDict):
+            d = ConcurrentTreeDict(((i, i) for i in range(500)),
+                                   tree_class=tree_class)
+            stop = threading.Event()
+            errors = []
+
+            def write(seed):
+                rng = random.Random(seed)
+                for _ in range(1000):
+                    k = rng.randrange(1000)
+                    if rng.random() < 0.5:
+                        d[k] = k
+                    else:
+                        d.pop(k, None)
+
+            def read():
+                while not stop.is_set():
+                    try:
+                        items = list(d.items())
+                    except RuntimeError:
+                        continue
+                    if items != sorted(items) or \
+                            any(k != v for k, v in items):
+                        errors.append(items)
+
+            readers = [threading.Thread(target=read) for _ in range(3)]
+            writers = [threading.Thread(target=write, args=(i,))
+                       for i in range(2)]
+            for thread in readers + writers:
+                thread.start()
+            for thread in writers:
+                thread.join()
+            stop.set()
+            for thread in readers:
+                thread.join()
+            self.assertEqual([], errors)
+            with d.reading() as tree:
+                self.assertTrue(tree.is_valid())
+                self.assertEqual(len(tree), len(list(d)))
+
+    def test_splay_readers(self):
+        d = ConcurrentTreeDict(((i, i) for i in range(2000)),
+                               tree_class=splay_tree.TreeDict)
+        errors = []
+
+        def read(seed):
+            rng = random.Random(seed)
+            for _ in range(2000):
+                k = rng.randrange(2000)
+                try:
+                    if d[k] != k:
+                        errors.append(k)
+                except Exception as error:
+                    errors.append(error)
+
+        readers = [threading.Thread(target=read, args=(i,))
+                   for i in range(8)]
+        for thread in readers:
+            thread.start()
+        for thread in readers:
+            thread.join()
+        self.assertEqual([], errors)
+        self.assertEqual(list(range(2000)), list(d))
+        with d.reading() as tree:
+            self.assertTrue(tree.is_valid())
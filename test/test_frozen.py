@@ -0,0 +1,142 @@
+#  Copyright (c) 2021  SBA - MIT License
+
+import unittest
+import os.path
+import pickle
+import tempfile
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from bin_tree import array_tree, avl_tree, red_black_tree
+from bin_tree.frozen import FrozenTreeDict, FrozenTreeSet
+
+
+class Mapped(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'tree.bin')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def write(self, tree):
+        with open(self.path, 'wb') as fd:
+            tree.dump(fd)
+
+    def test_open(self):
+        tree = avl_tree.TreeDict((2 * i, i / 2) for i in range(100))
+        self.write(tree)
+        with FrozenTreeDict.open(self.path) as frozen:
+            self.assertEqual(tree, frozen)
+            self.assertEqual(5.0, frozen[20])
+            self.assertNotIn(21, frozen)
+            self.assertRaises(KeyError, frozen.__getitem__, 21)
+            self.assertEqual((20, 5.0), frozen.floor(21))
+            self.assertEqual((22, 5.5), frozen.ceiling(21))
+            self.assertEqual((18, 4.5), frozen.lower(20))
+            self.assertEqual((22, 5.5), frozen.higher(20))
+            self.assertIsNone(frozen.lower(0))
+            self.assertIsNone(frozen.ceiling(199))
+            self.assertEqual([6, 4], list(frozen.irange(3, 6, (True, True),
+                                                         reverse=True)))
+            self.assertEqual([(4, 1.0)], list(frozen.irange_items(3, 6)))
+            self.assertEqual(list(tree.values()), list(frozen.values()))
+            self.assertEqual(10, frozen.rank(20))
+            self.assertEqual((198, 49.5), frozen.select(-1))
+        self.assertEqual(0, len(frozen))
+
+    def test_objects(self):
+        tree = avl_tree.TreeDict({'b': (1, 2), 'a': b'x', '\xe9': None})
+        self.write(tree)
+        frozen = FrozenTreeDict.open(self.path)
+        self.assertEqual(['a', 'b', '\xe9'], list(frozen))
+        self.assertEqual(list(tree.items()), list(frozen.items()))
+        self.assertEqual(('b', (1, 2)), frozen.floor('c'))
+        frozen.close()
+
+    def test_set(self):
+        self.write(red_black_tree.TreeSet(range(0, 30, 3)))
+        with FrozenTreeSet.open(self.path) as frozen:
+            self.assertEqual((0, 27), (frozen.min(), frozen.max()))
+            self.assertIn(9, frozen)
+            self.assertEqual(12, frozen.ceiling(10))
+            thawed = frozen.thaw(red_black_tree.TreeSet)
+        self.assertIsInstance(thawed, red_black_tree.TreeSet)
+        self.assertEqual(list(range(0, 30, 3)), list(thawed))
+        self.assertTrue(thawed.is_valid())
+
+    def test_errors(self):
+        self.write(avl_tree.TreeSet(range(10)))
+        self.assertRaises(ValueError, FrozenTreeDict.open, self.path)
+        self.write(avl_tree.TreeDict({'a': 1}, key=str.upper))
+        self.assertRaises(ValueError, FrozenTreeDict.open, self.path)
+        self.assertRaises(ValueError, FrozenTreeSet.open, self.path)
+
+
+class Memory(unittest.TestCase):
+    def test_build(self):
+        frozen = FrozenTreeDict([(3, 'c'), (1, 'a'), (3, 'C')])
+        self.assertEqual({1: 'a', 3: 'C'}, frozen)
+        self.assertEqual(frozen, pickle.loads(pickle.dumps(frozen)))
+        with tempfile.TemporaryFile() as fd:
+            frozen.dump(fd)
+            fd.seek(0)
+            self.assertEqual(frozen, avl_tree.TreeDict.load(fd))
+
+    def test_set_algebra(self):
+        first = FrozenTreeSet(avl_tree.TreeSet(range(0, 20, 2)))
+        second = FrozenTreeSet([9, 3, 0, 6, 18, 15, 12, 3])
+        self.assertEqual([0, 3, 6, 9, 12, 15, 18], list(second))
+        self.assertIsInstance(first & second, FrozenTreeSet)
+        self.assertEqual([0, 6, 12, 18], list(first & second))
+        self.assertEqual(hash(first), hash(FrozenTreeSet(range(0, 20, 2))))
+        self.assertEqual({0, 2}, set(first.irange(hi=4)))
+        self.assertRaises(ValueError, FrozenTreeSet().min)
+
+    def test_thaw(self):
+        frozen = FrozenTreeDict(array_tree.TreeDict((i, str(i))
+                                                    for i in range(10)))
+        self.assertEqual('7', frozen[7])
+        thawed = frozen.thaw()
+        self.assertIsInstance(thawed, avl_tree.TreeDict)
+        self.assertEqual(frozen, thawed)
+        thawed[10] = '10'
+        self.assertEqual(10, len(frozen))
+
+    def test_batches(self):
+        frozen = FrozenTreeDict((str(i), i / 2) for i in range(10))
+        batches = list(frozen.items_batches(4))
+        self.assertEqual([4, 4, 2], list(map(len, batches)))
+        self.assertEqual(list(frozen.items()), sum(batches, []))
+        self.assertEqual([['9', '8', '7'], ['6', '5', '4'], ['3', '2', '1'],
+                          ['0']], list(frozen.iter_batches(3, reverse=True)))
+        frozen = FrozenTreeSet(range(5))
+        self.assertEqual([[0, 1, 2], [3, 4]], list(frozen.iter_batches(3)))
+        self.assertRaises(ValueError, frozen.iter_batches, 0)
+
+    def test_many(self):
+        frozen = FrozenTreeDict((str(i), i) for i in range(10))
+        self.assertEqual([3, None, 0], frozen.get_many(['3', '33', '0']))
+        frozen = FrozenTreeSet(range(0, 10, 2))
+        self.assertEqual([True, False, True],
+                         frozen.contains_many([8, 7, 0]))
+
+    def test_nan(self):
+        nan = float('nan')
+        frozen = FrozenTreeDict({1: 'a', 2: 'b'})
+        self.assertRaises(KeyError, frozen.__getitem__, nan)
+        self.assertNotIn(nan, frozen)
+        self.assertEqual([None], frozen.get_many([nan]))
+        self.assertNotIn(nan, FrozenTreeSet([1, 2]))
+        self.assertEqual([False], FrozenTreeSet([1, 2]).contains_many([nan]))
+
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test_numpy(self):
+        frozen = FrozenTreeDict((2 * i, i / 2) for i in range(100))
+        keys = numpy.array([198, 3, 0, 200, -4])
+        self.assertEqual([True, False, True, False, False],
+                         frozen.contains_many(keys).tolist())
+        self.assertEqual([49.5, None, 0.0, None, None],
+                         frozen.get_many(keys).tolist())
+        self.assertFalse(FrozenTreeSet().contains_many(keys).any())
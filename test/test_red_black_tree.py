@@ -1,5 +1,7 @@
 import unittest
-from bin_tree.red_black_tree import TreeSet, TreeDict, Color
+import pickle
+from bin_tree.red_black_tree import (TreeSet, TreeDict, Color, IndexedTreeSet,
+                                     IndexedTreeDict, PersistentTreeDict)
 
 
 class Insert(unittest.TestCase):
@@ -71,6 +73,14 @@ class Delete(unittest.TestCase):
         self.assertEqual((1, 2, 5), tuple(tree))
         self.assertTrue(tree.is_valid())
 
+    def test_root_single_child(self):
+        tree = TreeSet()
+        for _ in (2, 1):
+            tree.add(_)
+        tree.discard(2)
+        self.assertEqual(Color.BLACK, tree.root.color)
+        self.assertTrue(tree.is_valid())
+
     def test_root_right(self):
         tree = TreeSet()
         for _ in (2, 1, 4, 3, 5, 6):
@@ -232,6 +242,16 @@ class TestDictTree(unittest.TestCase):
         self.assertTrue(self.tree.is_valid())
 
 
+class Pop(unittest.TestCase):
+    def test_pop(self):
+        tree = TreeSet(range(20))
+        self.assertEqual(0, tree.pop_min())
+        self.assertEqual(19, tree.pop_max())
+        while tree:
+            tree.pop_min()
+            self.assertTrue(tree.is_valid())
+
+
 class Load(unittest.TestCase):
     def test_set(self):
         trees = (TreeSet(range(i)) for i in range(127))
@@ -249,5 +269,180 @@ class Load(unittest.TestCase):
         self.assertTrue(all(t.is_valid() for t in trees))
 
 
+class Indexed(unittest.TestCase):
+    def test_set(self):
+        tree = IndexedTreeSet(range(0, 40, 2))
+        for _ in range(1, 40, 4):
+            tree.add(_)
+        for _ in range(0, 40, 6):
+            tree.discard(_)
+        keys = sorted(tree)
+        self.assertTrue(tree.is_valid())
+        self.assertEqual(len(keys), tree.root.size)
+        self.assertEqual(keys, [tree.select(i) for i in range(len(keys))])
+        self.assertEqual([keys.index(k) for k in keys],
+                         [tree.rank(k) for k in keys])
+        self.assertEqual(keys[::-4], tree[::-4])
+
+    def test_dict(self):
+        tree = IndexedTreeDict({i: -i for i in range(10)})
+        tree.pop_min()
+        self.assertTrue(tree.is_valid())
+        self.assertEqual((9, -9), tree.select(-1))
+        self.assertEqual([(1, -1), (2, -2)], tree.items()[:2])
+
+
+class SplitJoin(unittest.TestCase):
+    def test_split(self):
+        tree = TreeSet(range(100))
+        left, right = tree.split(37)
+        self.assertEqual(0, len(tree))
+        self.assertEqual(list(range(37)), list(left))
+        self.assertEqual(list(range(37, 100)), list(right))
+        self.assertEqual((37, 63), (len(left), len(right)))
+        self.assertTrue(left.is_valid() and right.is_valid())
+
+    def test_join(self):
+        left, right = TreeSet(range(3)), TreeSet(range(10, 200))
+        left.join(right)
+        self.assertEqual(0, len(right))
+        self.assertEqual(193, len(left))
+        self.assertTrue(left.is_valid())
+        right = TreeSet(range(300, 302))
+        left.join3(250, right)
+        self.assertEqual(196, len(left))
+        self.assertEqual([199, 250, 300, 301], list(left)[-4:])
+        self.assertTrue(left.is_valid())
+        with self.assertRaises(ValueError):
+            left.join(TreeSet((5,)))
+
+    def test_indexed(self):
+        tree = IndexedTreeDict((i, -i) for i in range(50))
+        left, right = tree.split(20.5)
+        self.assertEqual((21, 29), (len(left), len(right)))
+        left.join3((20.7, 0), right)
+        self.assertEqual(51, left.root.size)
+        self.assertEqual((20.7, 0), left.select(21))
+        self.assertTrue(left.is_valid())
+
+
+class KeyFunction(unittest.TestCase):
+    def test_indexed(self):
+        for cls in (TreeSet, IndexedTreeSet):
+            tree = cls(range(50), key=lambda x: -x)
+            self.assertEqual(list(range(49, -1, -1)), list(tree))
+            self.assertEqual(10, tree.rank(39))
+            self.assertEqual(39, tree[10])
+            left, right = tree.split(20)
+            self.assertEqual(list(range(49, 20, -1)), list(left))
+            self.assertTrue(left.is_valid() and right.is_valid())
+        tree = IndexedTreeDict(((i, -i) for i in range(50)),
+                               key=lambda x: -x)
+        tree[60] = -60
+        self.assertEqual((60, -60), tree.select(0))
+        self.assertEqual(-49, tree.values()[1])
+        self.assertTrue(tree.is_valid())
+
+
+class Cursors(unittest.TestCase):
+    def test_sequential(self):
+        tree = TreeSet(range(0, 1000, 10))
+        cursor = tree.first()
+        for i in range(1000):
+            cursor = tree.insert_near(cursor, i)
+            if i % 100 == 0:
+                self.assertTrue(tree.is_valid())
+        self.assertEqual(list(range(1000)), list(tree))
+        cursor = tree.find(500)
+        for i in range(500, 1000):
+            self.assertEqual(i, cursor.key)
+            tree.delete_at(cursor)
+        self.assertFalse(cursor)
+        self.assertEqual(list(range(500)), list(tree))
+        self.assertTrue(tree.is_valid())
+
+    def test_indexed(self):
+        tree = IndexedTreeDict((i, i) for i in range(100))
+        cursor = tree.find(50)
+        tree.insert_near(cursor, 50.5, 0)
+        tree.delete_at(tree.find(10))
+        self.assertEqual(50, tree.rank(50.5))
+        self.assertTrue(tree.is_valid())
+
+
+class Append(unittest.TestCase):
+    def test_ends(self):
+        tree = TreeSet()
+        for i in range(300):
+            tree.add(i)
+            tree.add(-i)
+            self.assertEqual((-i, i), (tree.min(), tree.max()))
+            if i % 50 == 0:
+                self.assertTrue(tree.is_valid())
+        tree.add(299)
+        tree.discard(299)
+        self.assertEqual(298, tree.max())
+        self.assertEqual(list(range(-299, 299)), list(tree))
+        self.assertTrue(tree.is_valid())
+
+    def test_extend(self):
+        tree = IndexedTreeDict((i, i) for i in range(10, 20))
+        tree.extend((i, -i) for i in range(20, 200))
+        tree.extend({i: -i for i in range(9, -1, -1)})
+        tree.extend([(5, 5), (250, 250), (200, 200)])
+        self.assertEqual(list(range(201)) + [250], list(tree))
+        self.assertEqual((5, 5), tree.select(5))
+        self.assertEqual(-199, tree[199])
+        self.assertTrue(tree.is_valid())
+
+
+class Stats(unittest.TestCase):
+    def test_recolors(self):
+        tree = TreeSet()
+        tree.enable_stats()
+        for i in range(4):
+            tree.add(i)
+        stats = tree.stats()
+        # the root 0 is painted black, then 2 rotates 1 up, is painted
+        # black and so is the new root 1
+        self.assertEqual(1, stats['rotations'])
+        self.assertEqual(3, stats['recolors'])
+        tree.disable_stats()
+        self.assertTrue(tree.is_valid())
+
+
+class Serialization(unittest.TestCase):
+    def test_pickle(self):
+        tree = TreeSet(range(100))
+        copy = pickle.loads(pickle.dumps(tree))
+        self.assertEqual(list(tree), list(copy))
+        self.assertTrue(copy.is_valid())
+
+
+class Persistent(unittest.TestCase):
+    def test_snapshot(self):
+        tree = PersistentTreeDict((i, -i) for i in range(200))
+        snapshots = []
+        for i in range(0, 200, 2):
+            snapshots.append((tree.snapshot(), dict(tree)))
+            del tree[i]
+            tree[i + 0.5] = i
+        tree.extend((i, i) for i in range(300, 310))
+        for snapshot, expected in snapshots:
+            self.assertEqual(expected, dict(snapshot))
+            self.assertTrue(snapshot.is_valid())
+        self.assertEqual(210, len(tree))
+        self.assertTrue(tree.is_valid())
+
+    def test_join(self):
+        left = PersistentTreeDict((i, i) for i in range(40))
+        right = PersistentTreeDict((i, i) for i in range(50, 53))
+        snapshot = left.snapshot()
+        left.join(right)
+        self.assertEqual(list(range(40)), list(snapshot))
+        self.assertEqual(43, len(left))
+        self.assertTrue(left.is_valid() and snapshot.is_valid())
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,137 @@
+#  Copyright (c) 2021  SBA - MIT License
+
+import unittest
+import io
+import pickle
+import random
+from bin_tree.splay_tree import TreeSet, TreeDict
+
+
+class Inserts(unittest.TestCase):
+    def test_random(self):
+        for semi_splay in (False, True):
+            rng = random.Random(int(semi_splay))
+            tree = TreeSet(semi_splay=semi_splay)
+            expected = set()
+            for _ in range(500):
+                key = rng.randrange(200)
+                if rng.random() < 0.6:
+                    tree.add(key)
+                    expected.add(key)
+                elif key in expected:
+                    tree.discard(key)
+                    expected.discard(key)
+                self.assertEqual(key in expected, key in tree)
+                self.assertTrue(tree.is_valid())
+            self.assertEqual(sorted(expected), list(tree))
+
+    def test_sequential(self):
+        tree = TreeSet()
+        for i in range(100):
+            tree.add(i)
+            self.assertEqual(i, tree.root.key)
+        self.assertEqual(100, tree.height())
+        self.assertEqual(0, tree.pop_min())
+        self.assertTrue(tree.is_valid())
+
+
+class Lookups(unittest.TestCase):
+    def test_splay(self):
+        tree = TreeDict((i, -i) for i in range(100))
+        self.assertEqual(-37, tree[37])
+        self.assertEqual(37, tree.root.key)
+        self.assertEqual((50, -50), tree.floor(50.5))
+        self.assertEqual(50, tree.root.key)
+        self.assertEqual((51, -51), tree.higher(50))
+        self.assertEqual(51, tree.root.key)
+        self.assertNotIn(100.5, tree)
+        self.assertEqual(99, tree.root.key)
+        self.assertTrue(tree.is_valid())
+
+    def test_invalidation(self):
+        tree = TreeSet(range(10))
+        iterator = iter(tree)
+        next(iterator)
+        self.assertIn(7, tree)
+        self.assertRaises(RuntimeError, next, iterator)
+        tree = TreeSet(range(10), splay_lookups=False)
+        root, iterator = tree.root, iter(tree)
+        next(iterator)
+        self.assertIn(7, tree)
+        self.assertEqual(3, tree.ceiling(2.5))
+        self.assertIs(root, tree.root)
+        self.assertEqual(1, next(iterator))
+
+    def test_nan(self):
+        nan = float('nan')
+        for splay_lookups in (True, False):
+            tree = TreeDict({1: 'a', 2: 'b', 3: 'c'},
+                            splay_lookups=splay_lookups)
+            self.assertEqual('b', tree[2])
+            self.assertRaises(KeyError, tree.__getitem__, nan)
+            self.assertNotIn(nan, tree)
+            self.assertRaises(ValueError, tree.__setitem__, nan, 'z')
+            self.assertRaises(KeyError, tree.__delitem__, nan)
+            self.assertEqual([(1, 'a'), (2, 'b'), (3, 'c')],
+                             list(tree.items()))
+            self.assertTrue(tree.is_valid())
+        self.assertRaises(ValueError, TreeDict().__setitem__, nan, 'z')
+
+
+class Delete(unittest.TestCase):
+    def test_pop(self):
+        tree = TreeDict((i, str(i)) for i in range(50))
+        self.assertEqual((49, '49'), tree.pop_max())
+        self.assertEqual((0, '0'), tree.pop_min())
+        while tree:
+            tree.pop_min()
+            self.assertTrue(tree.is_valid())
+        self.assertRaises(KeyError, tree.pop_min)
+        self.assertRaises(KeyError, tree.__delitem__, 0)
+
+    def test_missing(self):
+        tree = TreeSet(range(0, 20, 2))
+        self.assertRaises(KeyError, tree.discard, 7)
+        self.assertIn(tree.root.key, (6, 8))
+        tree.discard(8)
+        self.assertEqual([0, 2, 4, 6, 10, 12, 14, 16, 18], list(tree))
+        self.assertTrue(tree.is_valid())
+
+
+class Cursors(unittest.TestCase):
+    def test_walk(self):
+        tree = TreeSet(range(0, 40, 2), semi_splay=True)
+        cursor = tree.find(10)
+        cursor.next()
+        self.assertEqual(12, cursor.key)
+        tree.delete_at(cursor)
+        self.assertEqual(14, cursor.key)
+        tree.insert_near(cursor, 13)
+        cursor.prev()
+        self.assertEqual(10, cursor.key)
+        self.assertTrue(tree.is_valid())
+
+
+class Stats(unittest.TestCase):
+    def test_rotations(self):
+        tree = TreeSet(range(7))
+        tree.enable_stats()
+        tree.add(-1)
+        self.assertEqual(3, tree.stats()['rotations'])
+        tree.disable_stats()
+        self.assertIs(TreeSet, type(tree))
+        self.assertEqual(-1, tree.root.key)
+
+
+class Serialization(unittest.TestCase):
+    def test_pickle_dump(self):
+        tree = TreeDict(((i, float(i)) for i in range(100)), semi_splay=True,
+                        splay_lookups=False)
+        copy = pickle.loads(pickle.dumps(tree))
+        self.assertEqual((True, False), (copy.semi_splay, copy.splay_lookups))
+        self.assertEqual(list(tree.items()), list(copy.items()))
+        self.assertFalse(copy.split(50)[1].splay_lookups)
+        fd = io.BytesIO()
+        tree.dump(fd)
+        fd.seek(0)
+        self.assertEqual(tree, TreeDict.load(fd))